@@ -0,0 +1,250 @@
+"""
+Admission control for LLM calls.
+
+A ConcurrencyLimiter is a semaphore with a bounded wait queue and a deadline: a
+caller that cannot get a slot in time, or finds the queue full, gets Overloaded
+instead of piling onto an LLM provider that is already saturated. Slots are shared
+by threads and event loops, so the Flask routes, the async routes, the scheduler
+and the deep analysis workers of a process all draw from the same limits.
+
+Two kinds of limiters are used:
+- request_limiter admits the LLM-backed HTTP requests; the routes answer
+  Overloaded with 429 and a Retry-After header.
+- One limiter per model bounds the concurrent calls to it. Agents wrap their LLM
+  with with_concurrency_limit(llm, model).
+"""
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from langchain_core.runnables import RunnableLambda
+
+from config import (
+    LLM_REQUEST_CONCURRENCY, LLM_REQUEST_QUEUE_SIZE, LLM_REQUEST_QUEUE_TIMEOUT_SECONDS,
+    LLM_CONCURRENCY_LIMITS, LLM_DEFAULT_CONCURRENCY, LLM_CALL_QUEUE_SIZE, LLM_CALL_QUEUE_TIMEOUT_SECONDS
+)
+from metrics import ADMISSION_REJECTIONS, register_callback_gauge
+
+class Overloaded(Exception):
+    """Raised when no slot of a ConcurrencyLimiter became free in time."""
+
+class _Waiter:
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class ConcurrencyLimiter:
+    """
+    A semaphore with a bounded, first-come first-served wait queue and a deadline.
+    """
+
+    def __init__(self, name, limit, max_waiting, timeout):
+        """
+        Args:
+            name (str): The limiter's name, used in errors and metrics
+            limit (int): The number of slots
+            max_waiting (int): How many callers may wait for a slot
+            timeout (float): How long a caller waits for a slot, in seconds
+        """
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, waiter):
+        """
+        Takes a free slot, or queues the waiter. Returns True if a slot was taken.
+        """
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return True
+            if len(self._waiters) >= self.max_waiting:
+                ADMISSION_REJECTIONS.labels(self.name, "queue_full").inc()
+                raise Overloaded(f"Too many requests waiting for {self.name}; try again later")
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter):
+        """
+        Removes a waiter that gave up. Returns True if it was granted a slot meanwhile.
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def _timed_out(self):
+        ADMISSION_REJECTIONS.labels(self.name, "timeout").inc()
+        return Overloaded(f"Timed out waiting for {self.name}; try again later")
+
+    def acquire(self):
+        """
+        Waits for a slot.
+
+        Returns:
+            A function that releases the slot; calling it more than once has no effect
+
+        Raises:
+            Overloaded: If the wait queue is full or no slot became free within the timeout
+        """
+        waiter = _Waiter()
+        if not self._try_acquire(waiter):
+            if not waiter.event.wait(self.timeout) and not self._abandon(waiter):
+                raise self._timed_out()
+        return self._releaser()
+
+    async def aacquire(self):
+        """
+        Waits for a slot without blocking the event loop. See acquire().
+        """
+        waiter = _Waiter(asyncio.get_running_loop())
+        if not self._try_acquire(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._timed_out()
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        return self._releaser()
+
+    def _releaser(self):
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.release()
+        return release
+
+    def release(self):
+        """
+        Frees a slot, handing it straight to the longest waiting caller if there is one.
+        """
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft().grant()
+            else:
+                self.active -= 1
+
+    @contextmanager
+    def slot(self):
+        """
+        Holds a slot for the duration of a with block.
+        """
+        release = self.acquire()
+        try:
+            yield
+        finally:
+            release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """
+        Holds a slot for the duration of an async with block.
+        """
+        release = await self.aacquire()
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self):
+        """
+        Returns the number of slots, busy slots and waiting callers.
+        """
+        with self._lock:
+            return {"limit": self.limit, "active": self.active, "waiting": len(self._waiters)}
+
+request_limiter = ConcurrencyLimiter(
+    "llm_requests", LLM_REQUEST_CONCURRENCY, LLM_REQUEST_QUEUE_SIZE, LLM_REQUEST_QUEUE_TIMEOUT_SECONDS
+)
+
+def _parse_limits(value):
+    """
+    Parses "model=limit" pairs separated by commas into a dict.
+    """
+    limits = {}
+    for pair in value.split(","):
+        if "=" in pair:
+            model, limit = pair.rsplit("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+_model_limits = _parse_limits(LLM_CONCURRENCY_LIMITS)
+_model_limiters = {}
+_model_limiters_lock = threading.Lock()
+
+def model_limiter(model):
+    """
+    Returns the limiter of concurrent calls to a model, creating it on first use.
+    """
+    with _model_limiters_lock:
+        limiter = _model_limiters.get(model)
+        if limiter is None:
+            limiter = _model_limiters[model] = ConcurrencyLimiter(
+                f"model:{model}", _model_limits.get(model, LLM_DEFAULT_CONCURRENCY),
+                LLM_CALL_QUEUE_SIZE, LLM_CALL_QUEUE_TIMEOUT_SECONDS
+            )
+        return limiter
+
+def with_concurrency_limit(runnable, model):
+    """
+    Wraps an LLM (or a runnable built on one, e.g. with structured output) so that
+    every call holds a slot of the model's limiter.
+
+    Args:
+        runnable: The LLM runnable
+        model (str): The model it calls
+
+    Returns:
+        A runnable with the same input and output
+    """
+    limiter = model_limiter(model)
+
+    def invoke(input, config):
+        with limiter.slot():
+            return runnable.invoke(input, config)
+
+    async def ainvoke(input, config):
+        async with limiter.aslot():
+            return await runnable.ainvoke(input, config)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"{model} (concurrency limited)")
+
+def _limiter_samples():
+    with _model_limiters_lock:
+        limiters = [request_limiter, *_model_limiters.values()]
+    for limiter in limiters:
+        stats = limiter.stats()
+        yield (limiter.name, "active"), stats["active"]
+        yield (limiter.name, "waiting"), stats["waiting"]
+
+register_callback_gauge(
+    "mediassist_admission_slots", "Busy slots and waiting callers per concurrency limiter",
+    ["limiter", "state"], _limiter_samples
+)
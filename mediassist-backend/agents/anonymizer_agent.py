@@ -3,6 +3,9 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.pydantic_v1 import BaseModel, Field
 from typing import List, Optional
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
+from llm_cache import llm_cache
 
 ANONYMIZER_AGENT_SYSTEM_PROMPT = """
 You are a medical data anonymizer specialized in processing medical reports and documents.
@@ -59,8 +62,11 @@ class AnonymizerResponse(BaseModel):
 
 # Using ChatOllama for local LLM integration
 anonymizer_agent_llm = ChatOllama(
-    model="llama3.2"  # Using llama3.2 model for anonymization
+    model="llama3.2",  # Using llama3.2 model for anonymization
+    callbacks=[LLMMetricsCallback("anonymizer")],
+    cache=llm_cache("anonymizer")
 )
+anonymizer_agent_llm = with_concurrency_limit(anonymizer_agent_llm, "llama3.2")
 
 def anonymize_text(text):
 
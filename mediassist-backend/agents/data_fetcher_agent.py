@@ -2,6 +2,9 @@ from langchain_community.chat_models import ChatLiteLLM
 from tools.tools import get_nutritional_info, get_user_profile, get_medical_conditions
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
+from llm_cache import llm_cache
 
 DATA_FETCHER_AGENT_SYSTEM_PROMPT = """
 You are an insights agent responsible for retrieving insights from a database.
@@ -35,5 +38,8 @@ Weekly insights:
 data_fetcher_agent_llm = ChatLiteLLM(
     model="gpt-4o",
     api_base=API_BASE_URL,
-    api_key=API_KEY).bind_tools([get_nutritional_info, get_user_profile, get_medical_conditions])
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("data_fetcher")],
+    cache=llm_cache("data_fetcher")).bind_tools([get_nutritional_info, get_user_profile, get_medical_conditions])
+data_fetcher_agent_llm = with_concurrency_limit(data_fetcher_agent_llm, "gpt-4o")
 
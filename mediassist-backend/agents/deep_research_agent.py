@@ -3,6 +3,9 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.pydantic_v1 import BaseModel, Field
 from typing import List, Optional
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
+from llm_cache import llm_cache
 
 DEEP_RESEARCH_AGENT_SYSTEM_PROMPT = """
 You are a medical research assistant specialized in analyzing medical reports and documents.
@@ -160,5 +163,8 @@ class DeepResearchResponse(BaseModel):
 deep_research_agent_llm = ChatLiteLLM(
     model="o3-mini", 
     api_base=API_BASE_URL,
-    api_key=API_KEY
-)
\ No newline at end of file
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("deep_research")],
+    cache=llm_cache("deep_research")
+)
+deep_research_agent_llm = with_concurrency_limit(deep_research_agent_llm, "o3-mini")
\ No newline at end of file
@@ -2,6 +2,8 @@ from langchain_community.chat_models import ChatLiteLLM
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
 
 INPUT_AGENT_SYSTEM_PROMPT = """
 You're strictly responsible for taking inputs from the user and understand the intent behind it.
@@ -15,4 +17,5 @@ USER_INTENT: "input" || "question" || "greeting"
 DETAILS: <user's prompt>
 """
 
-input_agent_llm = ChatLiteLLM(model="gpt-4o", api_base=API_BASE_URL, api_key=API_KEY)
\ No newline at end of file
+input_agent_llm = ChatLiteLLM(model="gpt-4o", api_base=API_BASE_URL, api_key=API_KEY, callbacks=[LLMMetricsCallback("input")])
+input_agent_llm = with_concurrency_limit(input_agent_llm, "gpt-4o")
\ No newline at end of file
@@ -2,6 +2,9 @@ from langchain_community.chat_models import ChatLiteLLM
 from tools.tools import get_nutritional_info
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
+from llm_cache import llm_cache
 
 INSIGHTS_AGENT_SYSTEM_PROMPT = """
 You are an insights agent specializing in analyzing nutrition data, medical conditions, and user profile information.
@@ -46,7 +49,21 @@ Ensure your responses are clear, concise, and personalized to the user's profile
 Be conversational and supportive in your tone. Avoid overwhelming the user with too many numbers or technical details.
 """
 
+# Used by the chat graph, whose prompt is the conversation alone: the same question
+# must be answered again once new data has been logged, so it is not cached
 insights_agent_llm = ChatLiteLLM(
     model="gpt-4o", 
     api_base=API_BASE_URL, 
-    api_key=API_KEY)
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("insights")])
+insights_agent_llm = with_concurrency_limit(insights_agent_llm, "gpt-4o")
+
+# Used by the background insights graph, whose prompt carries the fetched data, so a
+# cached response is only reused while that data is unchanged
+background_insights_agent_llm = ChatLiteLLM(
+    model="gpt-4o", 
+    api_base=API_BASE_URL, 
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("insights")],
+    cache=llm_cache("insights"))
+background_insights_agent_llm = with_concurrency_limit(background_insights_agent_llm, "gpt-4o")
@@ -3,10 +3,13 @@ from langchain_core.pydantic_v1 import BaseModel, Field
 from typing import Literal
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
+from llm_cache import llm_cache
 
 class IntentClassification(BaseModel):
     """Classification of user intent for routing in the conversation graph."""
-    intent: Literal["user_profile", "nutrition", "medical_conditions", "insights"] = Field(
+    intent: Literal["user_profile", "nutrition", "medical_conditions", "insights", "general"] = Field(
         description="The classified intent of the user's message"
     )
     confidence: float = Field(
@@ -25,7 +28,8 @@ Your task is to classify the intent into one of the following categories:
 1. user_profile: Messages related to the user's profile information (age, gender, height, weight, etc.)
 2. nutrition: Messages related to inputting food information (e.g., meals, snacks, drinks)
 3. medical_conditions: Messages related to diseases, symptoms, treatments, medications, etc.
-4. data_fetcher: Messages asking for analysis, insights, or recommendations based on their data, especially nutrition data over time
+4. insights: Messages asking for analysis, insights, or recommendations based on their data, especially nutrition data over time
+5. general: Greetings, general health questions and anything else
 
 Examples:
 - "I am 35 years old and weigh 70kg" → user_profile
@@ -40,4 +44,7 @@ Provide your classification with a confidence score and a brief explanation of y
 intent_classifier_llm = ChatLiteLLM(
     model="gpt-4o", 
     api_base=API_BASE_URL, 
-    api_key=API_KEY).with_structured_output(IntentClassification)
\ No newline at end of file
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("intent_classifier")],
+    cache=llm_cache("intent_classifier")).with_structured_output(IntentClassification)
+intent_classifier_llm = with_concurrency_limit(intent_classifier_llm, "gpt-4o")
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""
+In-process intent classifier.
+
+A multinomial logistic regression over hashed n-gram features: words, word pairs
+and character trigrams of the message, hashed into a fixed number of buckets so no
+vocabulary has to be kept. A prediction touches a few dozen weights per intent and
+takes microseconds, so the chat graph asks this model first and only calls the LLM
+intent classifier when it is not confident enough.
+
+The model is trained from logged LLM classifications by
+scripts/train_intent_classifier.py and stored as JSON at INTENT_MODEL_PATH.
+"""
+import json
+import math
+import os
+import random
+import re
+import zlib
+from datetime import datetime
+
+from config import INTENT_MODEL_PATH
+
+DEFAULT_N_FEATURES = 2 ** 18
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+def extract_features(text, n_features=DEFAULT_N_FEATURES):
+    """
+    Turns a message into L2-normalised hashed n-gram counts.
+
+    Args:
+        text (str): The message
+        n_features (int): The number of hash buckets
+
+    Returns:
+        dict: Feature index -> value
+    """
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    counts = {}
+
+    def add(feature):
+        # crc32 rather than hash(), which differs between processes
+        index = zlib.crc32(feature.encode("utf-8")) % n_features
+        counts[index] = counts.get(index, 0) + 1
+
+    for position, token in enumerate(tokens):
+        add("w:" + token)
+        if position:
+            add("b:" + tokens[position - 1] + " " + token)
+        padded = f"<{token}>"
+        for start in range(len(padded) - 2):
+            add("c:" + padded[start:start + 3])
+
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {index: value / norm for index, value in counts.items()}
+
+def _softmax(scores):
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+class IntentModel:
+    """
+    A trained intent model: one sparse weight vector and bias per intent.
+    """
+
+    def __init__(self, classes, weights, bias, n_features=DEFAULT_N_FEATURES, metadata=None):
+        """
+        Args:
+            classes (list): The intents
+            weights (list): Per intent, a dict of feature index -> weight
+            bias (list): Per intent, the bias
+            n_features (int): The number of hash buckets the model was trained with
+            metadata (dict, optional): Training details, saved with the model
+        """
+        self.classes = classes
+        self.weights = weights
+        self.bias = bias
+        self.n_features = n_features
+        self.metadata = metadata or {}
+
+    def _probabilities(self, features):
+        scores = [
+            bias + sum(weights.get(index, 0.0) * value for index, value in features.items())
+            for weights, bias in zip(self.weights, self.bias)
+        ]
+        return _softmax(scores)
+
+    def predict_proba(self, text):
+        """
+        Returns the probability of every intent for a message, as a dict.
+        """
+        return dict(zip(self.classes, self._probabilities(extract_features(text, self.n_features))))
+
+    def predict(self, text):
+        """
+        Classifies a message.
+
+        Returns:
+            A tuple containing (intent, confidence)
+        """
+        probabilities = self._probabilities(extract_features(text, self.n_features))
+        best = max(range(len(self.classes)), key=probabilities.__getitem__)
+        return self.classes[best], probabilities[best]
+
+    @classmethod
+    def train(cls, samples, epochs=15, learning_rate=0.5, l2=1e-6, n_features=DEFAULT_N_FEATURES, seed=0):
+        """
+        Trains a model with stochastic gradient descent on the cross-entropy loss.
+
+        Args:
+            samples (list): (message, intent) pairs
+            epochs (int): Passes over the samples
+            learning_rate (float): The initial step size; it decays with each epoch
+            l2 (float): L2 regularisation strength
+            n_features (int): The number of hash buckets
+            seed (int): Seed for shuffling the samples
+
+        Returns:
+            IntentModel: The trained model
+        """
+        classes = sorted({intent for _, intent in samples})
+        class_index = {intent: index for index, intent in enumerate(classes)}
+        data = [(extract_features(text, n_features), class_index[intent]) for text, intent in samples]
+
+        weights = [{} for _ in classes]
+        bias = [0.0] * len(classes)
+        model = cls(classes, weights, bias, n_features)
+        rng = random.Random(seed)
+
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            step = learning_rate / (1 + epoch)
+            for features, label in data:
+                probabilities = model._probabilities(features)
+                for index, probability in enumerate(probabilities):
+                    gradient = probability - (1.0 if index == label else 0.0)
+                    bias[index] -= step * gradient
+                    class_weights = weights[index]
+                    for feature, value in features.items():
+                        weight = class_weights.get(feature, 0.0)
+                        class_weights[feature] = weight - step * (gradient * value + l2 * weight)
+
+        # Drop weights too small to change a prediction, to keep the saved model small
+        model.weights = [
+            {feature: weight for feature, weight in class_weights.items() if abs(weight) > 1e-4}
+            for class_weights in weights
+        ]
+        model.metadata = {"trained_at": datetime.utcnow().isoformat(), "samples": len(samples)}
+        return model
+
+    def save(self, path=INTENT_MODEL_PATH):
+        """
+        Writes the model to a JSON file.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = path + ".part"
+        with open(partial_path, "w") as f:
+            json.dump({
+                "classes": self.classes,
+                "n_features": self.n_features,
+                "bias": self.bias,
+                "weights": [{str(feature): weight for feature, weight in w.items()} for w in self.weights],
+                "metadata": self.metadata,
+            }, f)
+        # Processes loading the model never see a half-written file
+        os.replace(partial_path, path)
+
+    @classmethod
+    def load(cls, path=INTENT_MODEL_PATH):
+        """
+        Reads a model written by save().
+        """
+        with open(path) as f:
+            data = json.load(f)
+        weights = [{int(feature): weight for feature, weight in w.items()} for w in data["weights"]]
+        return cls(data["classes"], weights, data["bias"], data["n_features"], data.get("metadata"))
+
+def load_intent_model(path=INTENT_MODEL_PATH):
+    """
+    Loads the trained intent model, or returns None if there is none yet.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        model = IntentModel.load(path)
+    except Exception as e:
+        print(f"Error loading the intent model from {path}: {e}")
+        return None
+    print(f"Loaded intent model trained on {model.metadata.get('samples', '?')} messages")
+    return model
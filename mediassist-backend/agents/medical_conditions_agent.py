@@ -1,6 +1,8 @@
 from langchain_community.chat_models import ChatLiteLLM
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
 from storage.models import MedicalConditionData
 
 
@@ -12,4 +14,6 @@ Store the information in a structured format and respond back with an acknowedge
 medical_conditions_agent_llm = ChatLiteLLM(
     model="gpt-4o", 
     api_base=API_BASE_URL, 
-    api_key=API_KEY).with_structured_output(MedicalConditionData)
\ No newline at end of file
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("medical_conditions")]).with_structured_output(MedicalConditionData)
+medical_conditions_agent_llm = with_concurrency_limit(medical_conditions_agent_llm, "gpt-4o")
\ No newline at end of file
@@ -1,6 +1,8 @@
 from langchain_community.chat_models import ChatLiteLLM
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
 from storage.models import NutritionData
 
 NUTRITION_AGENT_SYSTEM_PROMPT = """
@@ -11,4 +13,6 @@ Store the information in a structured format and respond back with an acknowedge
 nutrition_agent_llm = ChatLiteLLM(
     model="gpt-4o", 
     api_base=API_BASE_URL, 
-    api_key=API_KEY).with_structured_output(NutritionData)
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("nutrition")]).with_structured_output(NutritionData)
+nutrition_agent_llm = with_concurrency_limit(nutrition_agent_llm, "gpt-4o")
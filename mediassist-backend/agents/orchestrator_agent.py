@@ -1,6 +1,8 @@
 from langchain_community.chat_models import ChatLiteLLM
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
 
 ORCHESTRATOR_SYSTEM_PROMPT = """
 You're an orchestrating agent. You redirect request between various other agents and tools depending on the user intent.
@@ -22,4 +24,5 @@ Redirect to `output_agent` if the user intent is "question" or "greeting".
 Response format: "nutrition_agent" || "medical_conditions_agent" || "user_profile_agent" || "output_agent"
 """
 
-orchestrator_agent_llm = ChatLiteLLM(model="gpt-4o", api_base=API_BASE_URL, api_key=API_KEY)
\ No newline at end of file
+orchestrator_agent_llm = ChatLiteLLM(model="gpt-4o", api_base=API_BASE_URL, api_key=API_KEY, callbacks=[LLMMetricsCallback("orchestrator")])
+orchestrator_agent_llm = with_concurrency_limit(orchestrator_agent_llm, "gpt-4o")
\ No newline at end of file
@@ -2,6 +2,8 @@ from langchain_community.chat_models import ChatLiteLLM
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
 
 
 OUTPUT_AGENT_SYSTEM_PROMPT = """
@@ -11,4 +13,5 @@ Based on the context of messages you have, summarize what action was taken for t
 Then, respond back to the user with the information you have.
 """
 
-output_agent_llm = ChatLiteLLM(model="gpt-4o", api_base=API_BASE_URL, api_key=API_KEY)
\ No newline at end of file
+output_agent_llm = ChatLiteLLM(model="gpt-4o", api_base=API_BASE_URL, api_key=API_KEY, callbacks=[LLMMetricsCallback("output")])
+output_agent_llm = with_concurrency_limit(output_agent_llm, "gpt-4o")
\ No newline at end of file
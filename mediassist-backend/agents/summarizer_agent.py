@@ -0,0 +1,23 @@
+from langchain_community.chat_models import ChatLiteLLM
+
+from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
+
+SUMMARIZER_AGENT_SYSTEM_PROMPT = """
+You're an agent responsible for keeping a running summary of a conversation between a user and a health assistant.
+
+You will be given the current summary, which may be empty, and the messages that follow it.
+Write an updated summary that covers both, in at most 200 words.
+
+Keep facts the assistant may need later: the user's profile details, meals and nutrition they reported,
+medical conditions, questions they asked and the advice they were given.
+Leave out greetings and small talk. Respond with the summary only.
+"""
+
+summarizer_agent_llm = ChatLiteLLM(
+    model="gpt-4o",
+    api_base=API_BASE_URL,
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("summarizer")])
+summarizer_agent_llm = with_concurrency_limit(summarizer_agent_llm, "gpt-4o")
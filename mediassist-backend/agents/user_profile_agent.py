@@ -1,6 +1,8 @@
 from langchain_community.chat_models import ChatLiteLLM
 
 from config import API_BASE_URL, API_KEY
+from metrics import LLMMetricsCallback
+from admission import with_concurrency_limit
 from storage.models import UserProfileData
 
 
@@ -23,4 +25,6 @@ Store the information in a structured format and respond with a friendly acknowl
 user_profile_agent_llm = ChatLiteLLM(
     model="gpt-4o", 
     api_base=API_BASE_URL, 
-    api_key=API_KEY).with_structured_output(UserProfileData)
\ No newline at end of file
+    api_key=API_KEY,
+    callbacks=[LLMMetricsCallback("user_profile")]).with_structured_output(UserProfileData)
+user_profile_agent_llm = with_concurrency_limit(user_profile_agent_llm, "gpt-4o")
\ No newline at end of file
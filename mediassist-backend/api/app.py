@@ -2,39 +2,74 @@ import sys
 import os
 import atexit
 import tempfile
-import uuid
 import json
 from datetime import datetime
-import threading
+import unicodedata
 
 # Add the mediassist-backend directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from flask import Flask, request, jsonify, make_response, send_file
-from utils import parse_pdf
+from flask import Flask, Response, request, jsonify, make_response, send_file, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
+from werkzeug.exceptions import RequestEntityTooLarge
+from urllib.parse import quote
 from flask_cors import CORS
 from litellm import transcription
 from .scheduler import insights_scheduler
-from .chat import ChatHandler
+from .chat import ChatHandler, conversation_id_from_request
 from .insights_handler import InsightsHandler
+from .deep_analysis_handler import DeepAnalysisHandler
+from .json_provider import MongoJSONProvider
+from .compression import init_compression
+from .request_metrics import init_request_metrics
 from storage.client import (
-    get_user_profile_data, get_medical_conditions_data, get_nutrition_data_for_period,
-    store_medical_report, get_medical_reports, get_medical_report, delete_medical_report
+    close_mongo_client, get_user_profile_data, get_medical_conditions_data,
+    store_medical_report_stream, ReportTooLarge, get_medical_reports, get_medical_report_download,
+    delete_medical_report, JobQueueFull,
+    store_nutrition_data_many, get_nutrition_data_page, get_medical_reports_page, get_cache_stats,
+    get_analysis_report as get_analysis_report_data, get_analysis_reports as get_analysis_reports_data,
+    get_analysis_reports_page, count_active_jobs
 )
-from graphs.deep_analysis_graph import graph as deep_analysis_graph
+from metrics import register_callback_gauge, render_metrics
+from admission import Overloaded, request_limiter
+from storage.models import NutritionData
+from storage.indexes import bootstrap_storage
 from datetime import datetime, timedelta
-from config import API_BASE_URL, API_KEY
-
-# Dictionary to track analysis status
-analysis_status = {}
-analysis_status_lock = threading.Lock()
+from config import (
+    API_BASE_URL, API_KEY, BULK_INSERT_BATCH_SIZE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MEDICAL_REPORT_MAX_BYTES,
+    MULTIPART_OVERHEAD_BYTES, MEDICAL_REPORT_SENDFILE, MEDICAL_REPORT_ACCEL_REDIRECT_PREFIX, LLM_RETRY_AFTER_SECONDS,
+    STORAGE_BOOTSTRAP_REQUIRED, DEEP_ANALYSIS_RETRY_AFTER_SECONDS
+)
 
 app = Flask(__name__)
+app.json = MongoJSONProvider(app)
+init_compression(app)
+init_request_metrics(app)
+
+# Reject request bodies larger than a medical report (plus room for the multipart
+# boundaries and form fields) with 413 before Werkzeug spools them to disk
+app.config['MAX_CONTENT_LENGTH'] = MEDICAL_REPORT_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+
+# Let the fronting web server send report downloads (see MEDICAL_REPORT_SENDFILE in config.py)
+app.config['USE_X_SENDFILE'] = MEDICAL_REPORT_SENDFILE == 'x-sendfile'
 
 CORS(app, resources={r"/*": {"origins": "*"}})  # Allow CORS for all routes and origins
 insights_handler = InsightsHandler()
 chat_handler = ChatHandler()
+deep_analysis_handler = DeepAnalysisHandler()
+
+# Release the shared MongoDB connection pool on shutdown (atexit runs handlers in
+# reverse order, so this runs after everything registered below)
+atexit.register(close_mongo_client)
+
+# Apply data migrations and create any missing MongoDB indexes before serving requests
+try:
+    bootstrap_storage()
+except Exception:
+    app.logger.exception("Error bootstrapping MongoDB storage")
+    if STORAGE_BOOTSTRAP_REQUIRED:
+        raise
 
 # Start the insights scheduler
 insights_scheduler.start()
@@ -42,32 +77,148 @@ insights_scheduler.start()
 # Register a function to stop the scheduler when the application exits
 atexit.register(insights_scheduler.stop)
 
+# Start the deep analysis workers
+deep_analysis_handler.queue.start()
+atexit.register(deep_analysis_handler.queue.stop)
+
+def job_queue_depth():
+    """
+    Samples for the job queue depth gauge, computed when /metrics is scraped.
+    """
+    job_type = deep_analysis_handler.queue.job_type
+    return [((job_type, status), count) for status, count in count_active_jobs(job_type).items()]
+
+register_callback_gauge(
+    "mediassist_job_queue_depth", "Queued and running background jobs", ["job_type", "status"], job_queue_depth
+)
+
+def get_page_args(default_limit=None):
+    """
+    Reads the keyset pagination arguments (?limit=...&after=...) from the request.
+    
+    Args:
+        default_limit (int, optional): The limit to use when none is given; None disables pagination
+    
+    Returns:
+        A tuple containing (limit, after)
+    
+    Raises:
+        ValueError: If limit is not a positive integer
+    """
+    limit = request.args.get('limit', default_limit)
+    after = request.args.get('after') or None
+    if limit is None:
+        return None, after
+    
+    limit = int(limit)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE), after
+
+def too_many_requests(error, retry_after):
+    """
+    Builds a 429 response telling the client to retry after retry_after seconds.
+    """
+    resp = make_response(jsonify({'error': str(error)}), 429)
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """
+    Answers requests turned away by admission control (see admission.py) with 429.
+    """
+    return too_many_requests(e, LLM_RETRY_AFTER_SECONDS)
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_entity_too_large(e):
+    """
+    Answers requests over MAX_CONTENT_LENGTH with a JSON 413.
+    """
+    return jsonify({'error': f'File exceeds the maximum size of {MEDICAL_REPORT_MAX_BYTES} bytes'}), 413
+
 @app.route('/send_message', methods=['POST'])
 def send_message():
     user_message = request.json.get('message', '')
     if not user_message:
         return jsonify({'error': 'No message provided'}), 400
+    try:
+        conversation_id = conversation_id_from_request(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Process the message using the ChatHandler
-    response = chat_handler.process_message(user_message)
+    with request_limiter.slot():
+        response = chat_handler.process_message(user_message, conversation_id)
     resp = make_response(jsonify({'response': response}))
     resp.headers['Access-Control-Allow-Origin'] = '*'
     return resp
 
+def sse_event(event, data):
+    """
+    Formats one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Headers for Server-Sent Event responses; X-Accel-Buffering stops nginx from buffering the stream
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Access-Control-Allow-Origin': '*'}
+
+@app.route('/send_message/stream', methods=['POST'])
+def send_message_stream():
+    """
+    Processes a chat message like /send_message, but streams the progress as
+    Server-Sent Events: a "node" event as each agent finishes, "token" events with
+    the reply as it is generated and a final "done" event with the full reply.
+    """
+    user_message = request.json.get('message', '')
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    try:
+        conversation_id = conversation_id_from_request(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Admit the request before the stream starts, so that it can still be answered with 429
+    release = request_limiter.acquire()
+
+    def generate():
+        try:
+            for event, data in chat_handler.stream_message(user_message, conversation_id):
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+
+    resp = Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+    # Runs when the stream ends, including when the client goes away
+    resp.call_on_close(release)
+    return resp
+
+def insights_response_body(insights):
+    """
+    Formats a stored insights document for the insights routes.
+    """
+    return {'response': insights['content'], 'generated_at': insights['date'].isoformat()}
+
+def refresh_requested():
+    """
+    Whether the request asks for insights to be regenerated (?refresh=1).
+    """
+    return request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+
 @app.route('/daily_insights', methods=['GET'])
 def daily_insights():
-    # Generate daily insights using the insights handler
-    daily_insights = insights_handler.get_daily_insights()
-    resp = make_response(jsonify({'response': daily_insights}))
+    # Serve the stored daily insights, regenerating them only when stale or on ?refresh=1
+    daily_insights = insights_handler.get_latest_insights('daily', refresh=refresh_requested())
+    resp = make_response(jsonify(insights_response_body(daily_insights)))
     resp.headers['Access-Control-Allow-Origin'] = '*'
     return resp
 
 @app.route('/weekly_insights', methods=['GET'])
 def weekly_insights():
-    # Generate weekly insights using the insights handler
-    weekly_insights = insights_handler.get_weekly_insights()
+    # Serve the stored weekly insights, regenerating them only when stale or on ?refresh=1
+    weekly_insights = insights_handler.get_latest_insights('weekly', refresh=refresh_requested())
 
-    resp = make_response(jsonify({'response': weekly_insights}))
+    resp = make_response(jsonify(insights_response_body(weekly_insights)))
     resp.headers['Access-Control-Allow-Origin'] = '*'
     return resp
 
@@ -81,15 +232,18 @@ def generate_and_store_insights():
         insight_type = request.json.get('type', 'both')
         result = {}
         
-        if insight_type in ['daily', 'both']:
-            daily_id = insights_handler.store_daily_insights()
-            result['daily_id'] = str(daily_id)
-        
-        if insight_type in ['weekly', 'both']:
-            weekly_id = insights_handler.store_weekly_insights()
-            result['weekly_id'] = str(weekly_id)
+        with request_limiter.slot():
+            if insight_type in ['daily', 'both']:
+                daily_id = insights_handler.store_daily_insights()
+                result['daily_id'] = str(daily_id)
+            
+            if insight_type in ['weekly', 'both']:
+                weekly_id = insights_handler.store_weekly_insights()
+                result['weekly_id'] = str(weekly_id)
         
         return jsonify({'success': True, 'result': result})
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -102,12 +256,7 @@ def get_user_profile():
         # Get user profile data using the existing function
         profile_data = get_user_profile_data()
         
-        # Convert ObjectId to string for JSON serialization
-        if profile_data and '_id' in profile_data:
-            profile_data['_id'] = str(profile_data['_id'])
-        if profile_data and 'timestamp' in profile_data:
-            profile_data['timestamp'] = profile_data['timestamp'].isoformat()
-            
+        # ObjectId and datetime values are serialized by the app's JSON provider
         resp = make_response(jsonify({'response': profile_data}))
         resp.headers['Access-Control-Allow-Origin'] = '*'
         return resp
@@ -128,6 +277,82 @@ def get_medical_conditions():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/nutrition_history', methods=['GET'])
+def get_nutrition_history():
+    """
+    Retrieves one page of nutrition entries, oldest first.
+    Query parameters: start and end (YYYY-MM-DD, default the last 30 days), limit and after.
+    """
+    try:
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if 'end' in request.args else datetime.utcnow()
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d') if 'start' in request.args else end_date - timedelta(days=30)
+        limit, after = get_page_args(DEFAULT_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        entries, next_cursor = get_nutrition_data_page(start_date, end_date, limit, after)
+        return jsonify({'entries': entries, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/nutrition/bulk', methods=['POST'])
+def bulk_import_nutrition():
+    """
+    Imports nutrition entries from an NDJSON request body (one JSON object per line).
+    Lines are validated against NutritionData and stored in batches, so a large export
+    costs one database round trip per batch instead of one per meal.
+    """
+    inserted = 0
+    rejected = []
+    batch = []
+    
+    try:
+        for line_number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                entry = NutritionData(**json.loads(line)).dict()
+            except Exception as e:
+                rejected.append({'line': line_number, 'error': str(e)})
+                continue
+            
+            batch.append(entry)
+            if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                inserted += len(store_nutrition_data_many(batch))
+                batch = []
+        
+        if batch:
+            inserted += len(store_nutrition_data_many(batch))
+        
+        return jsonify({
+            'success': True,
+            'inserted': inserted,
+            'rejected': len(rejected),
+            'errors': rejected[:100]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'inserted': inserted, 'error': str(e)}), 500
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """
+    Returns hit/miss counters for the storage read caches.
+    """
+    return jsonify(get_cache_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Returns the application metrics in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
 @app.route('/transcribe_audio', methods=['POST'])
 def transcribe_audio():
     """
@@ -178,13 +403,19 @@ def transcribe_audio():
 @app.route('/medical_reports', methods=['GET'])
 def get_all_medical_reports():
     """
-    Retrieves a list of all medical reports.
+    Retrieves a list of all medical reports, or one page of them when ?limit= is given.
     """
     try:
-        reports = get_medical_reports()
-        resp = make_response(jsonify({'reports': reports}))
+        limit, after = get_page_args()
+        if limit is None:
+            resp = make_response(jsonify({'reports': get_medical_reports()}))
+        else:
+            reports, next_cursor = get_medical_reports_page(limit, after)
+            resp = make_response(jsonify({'reports': reports, 'next_cursor': next_cursor}))
         resp.headers['Access-Control-Allow-Origin'] = '*'
         return resp
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -192,56 +423,120 @@ def get_all_medical_reports():
 def upload_medical_report():
     """
     Uploads a medical report file.
+    
+    Accepts either a multipart form with a "file" field (and optional "description"),
+    or the raw file as the request body with the name in ?filename=... (and optional
+    ?description=...). The file is copied to disk in chunks while its size and
+    SHA-256 are computed, so it is never held in memory as a whole.
     """
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+        if request.mimetype == 'multipart/form-data':
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
+                
+            file = request.files['file']
             
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        # Get file details
-        filename = file.filename
-        file_type = file.content_type
-        file_size = 0  # Will be calculated after reading the file
-        description = request.form.get('description', None)
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            
+            # Get file details
+            filename = secure_filename(file.filename)
+            file_type = file.content_type
+            description = request.form.get('description', None)
+            stream = file.stream
+        else:
+            filename = secure_filename(request.args.get('filename', ''))
+            
+            # Reject oversized raw uploads before reading them when the length is known
+            if request.content_length and request.content_length > MEDICAL_REPORT_MAX_BYTES:
+                return jsonify({'error': f'File exceeds the maximum size of {MEDICAL_REPORT_MAX_BYTES} bytes'}), 413
+            
+            file_type = request.mimetype or 'application/octet-stream'
+            description = request.args.get('description', None)
+            stream = request.stream
         
-        # Read the file data
-        file_data = file.read()
-        file_size = len(file_data)
+        # The name is used in the stored file's path, so it must not contain separators
+        if not filename:
+            return jsonify({'error': 'No valid filename provided'}), 400
         
         # Store the file
-        file_id = store_medical_report(file_data, filename, file_type, file_size, description)
+        metadata = store_medical_report_stream(stream, filename, file_type, description)
         
         return jsonify({
             'success': True,
-            'file_id': str(file_id),
+            'file_id': str(metadata['_id']),
             'filename': filename,
             'file_type': file_type,
-            'file_size': file_size
+            'file_size': metadata['file_size'],
+            'sha256': metadata['sha256']
         })
+    except ReportTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except RequestEntityTooLarge as e:
+        return request_entity_too_large(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def attachment_filename(filename):
+    """
+    Returns the Content-Disposition filename parameters for a download, using the
+    RFC 2231 form for non-ASCII names like send_file does.
+    """
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
+    return {'filename': filename}
+
 @app.route('/download_medical_report/<file_id>', methods=['GET'])
 def download_medical_report(file_id):
     """
     Downloads a specific medical report file.
+    
+    Stored reports never change, so responses carry an ETag (the file's SHA-256) and
+    Last-Modified (the upload date). Revalidation requests are answered with 304
+    from the metadata alone, and Range requests get partial content. The transfer
+    itself can be offloaded to the fronting web server (see MEDICAL_REPORT_SENDFILE).
     """
     try:
-        file_path, filename, content_type = get_medical_report(file_id)
-        
-        if not file_path or not os.path.exists(file_path):
+        report = get_medical_report_download(file_id)
+        if not report:
             return jsonify({'error': 'File not found'}), 404
         
-        return send_file(
-            file_path,
-            mimetype=content_type,
-            as_attachment=True,
-            download_name=filename
-        )
+        etag = report['sha256']
+        last_modified = report['uploadDate']
+        
+        # Answer revalidation before touching the filesystem
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response = make_response('', 304)
+        elif MEDICAL_REPORT_SENDFILE == 'x-accel-redirect':
+            # nginx serves the file (including Range requests) from its internal location
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = MEDICAL_REPORT_ACCEL_REDIRECT_PREFIX + quote(report['stored_filename'])
+            response.headers['Content-Type'] = report['file_type']
+            response.headers.set('Content-Disposition', 'attachment', **attachment_filename(report['filename']))
+        else:
+            if not os.path.exists(report['file_path']):
+                return jsonify({'error': 'File not found'}), 404
+            
+            # conditional=True handles If-None-Match, If-Modified-Since and Range;
+            # with USE_X_SENDFILE, Flask sends an X-Sendfile header instead of the file
+            response = send_file(
+                report['file_path'],
+                mimetype=report['file_type'],
+                as_attachment=True,
+                download_name=report['filename'],
+                conditional=True,
+                etag=etag or True,
+                last_modified=last_modified
+            )
+        
+        if etag:
+            response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -263,139 +558,23 @@ def delete_medical_report_endpoint(file_id):
 @app.route('/deep_analysis', methods=['POST'])
 def trigger_deep_analysis():
     """
-    Triggers a deep analysis of all medical reports.
+    Queues a deep analysis of all medical reports. The analysis runs on the
+    deep analysis job queue; poll /analysis_status/<analysis_id> for its progress.
     """
     try:
-        # Get all medical reports
-        reports = get_medical_reports()
-        
-        if not reports:
+        job = deep_analysis_handler.start_analysis()
+        if job is None:
             return jsonify({'error': 'No medical reports found'}), 404
-            
-        # Combined report content
-        combined_report_content = ""
-        file_ids = []
-        filenames = []
-        
-        # Process each report
-        for report in reports:
-            file_id = report.get('_id')
-            filename = report.get('filename')
-            
-            # Skip if file_id is missing
-            if not file_id:
-                continue
-                
-            file_ids.append(str(file_id))
-            filenames.append(filename)
-            
-            # Get the file
-            file_path, _, content_type = get_medical_report(str(file_id))
-            
-            if not file_path or not os.path.exists(file_path):
-                continue
-            
-            # Read the file content
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-                # Handle different file types
-                if 'pdf' in content_type.lower():
-                    # Use the PDF parser for PDF files
-                    report_text = parse_pdf(file_path)
-                elif 'text' in content_type:
-                    # For text files, decode directly
-                    try:
-                        report_text = file_content.decode('utf-8')
-                    except UnicodeDecodeError:
-                        report_text = f"[Binary file content of type {content_type}]"
-                else:
-                    # For other binary formats, use a placeholder
-                    report_text = f"[Binary file content of type {content_type}]"
-                
-                # Add to combined content with separator
-                combined_report_content += f"\n\n--- REPORT: {filename} ---\n\n{report_text}"
-        # Initialize the state for the graph
-        initial_state = {
-            "messages": [],
-            "report_content": combined_report_content,
-            "file_ids": file_ids,
-            "filenames": filenames
-        }
-        
-        # Run the graph asynchronously
-        config = {"configurable": {"thread_id": "combined_analysis"}}
-        
-        # Generate a unique analysis ID
-        analysis_id = str(uuid.uuid4())
-        
-        # Set initial status
-        with analysis_status_lock:
-            analysis_status[analysis_id] = {
-                'status': 'running',
-                'timestamp': datetime.now().isoformat(),
-                'file_count': len(file_ids)
-            }
-        
-        # Start the analysis in a separate thread
-        def run_analysis():
-            try:
-                result = deep_analysis_graph.invoke(initial_state, config=config)
-                
-                # Store the result in a file
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                report_filename = f"deep_analysis_{timestamp}.json"
-                report_path = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'reports', report_filename)
-                
-                # Extract the content from the AIMessage
-                if result and 'messages' in result and len(result['messages']) > 0:
-                    analysis_content = result['messages'][-1].content
-                    
-                    # Create a report object
-                    report_data = {
-                        'timestamp': datetime.now().isoformat(),
-                        'file_ids': file_ids,
-                        'filenames': filenames,
-                        'content': analysis_content,
-                        'report_id': timestamp
-                    }
-                    
-                    # Write to file
-                    with open(report_path, 'w') as f:
-                        json.dump(report_data, f, indent=2)
-                    
-                    print(f"Deep analysis completed and saved to {report_path}")
-                    
-                    # Update status to completed
-                    with analysis_status_lock:
-                        if analysis_id in analysis_status:
-                            analysis_status[analysis_id]['status'] = 'completed'
-                            analysis_status[analysis_id]['report_id'] = timestamp
-                else:
-                    print("Deep analysis completed but no content was returned")
-                    
-                    # Update status to completed with error
-                    with analysis_status_lock:
-                        if analysis_id in analysis_status:
-                            analysis_status[analysis_id]['status'] = 'completed_no_content'
-            except Exception as e:
-                print(f"Error in deep analysis: {str(e)}")
-                
-                # Update status to error
-                with analysis_status_lock:
-                    if analysis_id in analysis_status:
-                        analysis_status[analysis_id]['status'] = 'error'
-                        analysis_status[analysis_id]['error'] = str(e)
-        
-        thread = threading.Thread(target=run_analysis)
-        thread.start()
         
         return jsonify({
             'success': True,
             'message': 'Deep analysis started',
-            'file_count': len(file_ids),
-            'filenames': filenames,
-            'analysis_id': analysis_id
+            'file_count': job['file_count'],
+            'filenames': job['payload']['filenames'],
+            'analysis_id': job['_id']
         })
+    except JobQueueFull as e:
+        return too_many_requests(e, DEEP_ANALYSIS_RETRY_AFTER_SECONDS)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -405,49 +584,43 @@ def get_analysis_status(analysis_id):
     Checks the status of a specific analysis.
     """
     try:
-        with analysis_status_lock:
-            if analysis_id in analysis_status:
-                return jsonify(analysis_status[analysis_id])
-            else:
-                return jsonify({'error': 'Analysis ID not found'}), 404
+        status = deep_analysis_handler.get_status(analysis_id)
+        if status is None:
+            return jsonify({'error': 'Analysis ID not found'}), 404
+        return jsonify(status)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/analysis_reports', methods=['GET'])
 def get_analysis_reports():
     """
-    Retrieves a list of all deep analysis reports.
+    Retrieves a list of all deep analysis reports, or one page of them when ?limit= is given.
     """
     try:
-        reports_dir = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'reports')
-        
-        # Create the directory if it doesn't exist
-        if not os.path.exists(reports_dir):
-            os.makedirs(reports_dir)
-            
-        # Get all JSON files in the reports directory
-        report_files = [f for f in os.listdir(reports_dir) if f.endswith('.json')]
-        
-        reports = []
-        for filename in report_files:
-            file_path = os.path.join(reports_dir, filename)
-            try:
-                with open(file_path, 'r') as f:
-                    report_data = json.load(f)
-                    # Add basic info to the list
-                    reports.append({
-                        'report_id': report_data.get('report_id', ''),
-                        'timestamp': report_data.get('timestamp', ''),
-                        'filenames': report_data.get('filenames', []),
-                        'file_count': len(report_data.get('filenames', []))
-                    })
-            except Exception as e:
-                print(f"Error reading report file {filename}: {str(e)}")
+        limit, after = get_page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        next_cursor = None
+        if limit is None:
+            reports = get_analysis_reports_data()
+        else:
+            reports, next_cursor = get_analysis_reports_page(limit, after)
         
-        # Sort reports by timestamp (newest first)
-        reports.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        # Summaries only; the analysis content is fetched per report
+        reports = [{
+            'report_id': report['report_id'],
+            'timestamp': report['timestamp'],
+            'filenames': report.get('filenames', []),
+            'file_count': report.get('file_count', 0)
+        } for report in reports]
         
+        if limit is not None:
+            return jsonify({'reports': reports, 'next_cursor': next_cursor})
         return jsonify({'reports': reports})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -457,20 +630,10 @@ def get_analysis_report(report_id):
     Retrieves a specific deep analysis report.
     """
     try:
-        reports_dir = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'reports')
-        
-        # Look for the report file
-        report_files = [f for f in os.listdir(reports_dir) if f.endswith('.json') and report_id in f]
-        
-        if not report_files:
+        report_data = get_analysis_report_data(report_id)
+        if report_data is None:
             return jsonify({'error': 'Report not found'}), 404
             
-        # Use the first matching file
-        file_path = os.path.join(reports_dir, report_files[0])
-        
-        with open(file_path, 'r') as f:
-            report_data = json.load(f)
-            
         return jsonify({'report': report_data})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
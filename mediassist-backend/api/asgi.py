@@ -0,0 +1,141 @@
+"""
+ASGI entry point for serving MediAssist asynchronously.
+
+    uvicorn api.asgi:application
+
+The routes that wait on long chains of LLM calls (/send_message,
+/send_message/stream, /daily_insights and /weekly_insights) are served by native async endpoints that await
+graph.ainvoke(), so a single process can hold many slow LLM requests open without
+a thread per request. Every other route is served by the existing Flask app,
+which runs in a bounded thread pool behind a WSGI adapter.
+"""
+import sys
+import os
+from contextlib import asynccontextmanager
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from .request_metrics import RequestMetricsMiddleware
+from .app import app as flask_app, chat_handler, insights_handler, insights_response_body, sse_event, SSE_HEADERS
+from .chat import conversation_id_from_request
+from storage import aio as storage_aio
+from admission import Overloaded, request_limiter
+from config import ASGI_WSGI_WORKERS, COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL, LLM_RETRY_AFTER_SECONDS
+
+async def chat_request(request):
+    """
+    Reads a chat request body.
+
+    Returns:
+        A tuple containing (user_message, conversation_id, error_response); error_response is
+        a 400 response when the body is invalid, None otherwise
+    """
+    try:
+        body = await request.json()
+        user_message = body.get('message', '')
+    except (ValueError, AttributeError):
+        body, user_message = {}, ''
+    if not user_message:
+        return None, None, JSONResponse({'error': 'No message provided'}, status_code=400)
+    try:
+        return user_message, conversation_id_from_request(body), None
+    except ValueError as e:
+        return None, None, JSONResponse({'error': str(e)}, status_code=400)
+
+async def send_message(request):
+    user_message, conversation_id, error = await chat_request(request)
+    if error:
+        return error
+
+    # Process the message using the ChatHandler
+    async with request_limiter.aslot():
+        response = await chat_handler.aprocess_message(user_message, conversation_id)
+    return JSONResponse({'response': response})
+
+async def send_message_stream(request):
+    user_message, conversation_id, error = await chat_request(request)
+    if error:
+        return error
+
+    # Admit the request before the stream starts, so that it can still be answered with 429
+    release = await request_limiter.aacquire()
+
+    async def generate():
+        try:
+            async for event, data in chat_handler.astream_message(user_message, conversation_id):
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+
+    # The background task runs when the stream ends, including when the client goes away
+    return StreamingResponse(
+        generate(), media_type='text/event-stream', headers=SSE_HEADERS, background=BackgroundTask(release)
+    )
+
+def refresh_requested(request):
+    return request.query_params.get('refresh', '').lower() in ('1', 'true', 'yes')
+
+async def daily_insights(request):
+    # Serve the stored daily insights, regenerating them only when stale or on ?refresh=1
+    daily_insights = await insights_handler.aget_latest_insights('daily', refresh=refresh_requested(request))
+    return JSONResponse(insights_response_body(daily_insights))
+
+async def weekly_insights(request):
+    # Serve the stored weekly insights, regenerating them only when stale or on ?refresh=1
+    weekly_insights = await insights_handler.aget_latest_insights('weekly', refresh=refresh_requested(request))
+    return JSONResponse(insights_response_body(weekly_insights))
+
+async def overloaded(request, exc):
+    # Requests turned away by admission control (see admission.py)
+    return JSONResponse(
+        {'error': str(exc)}, status_code=429, headers={'Retry-After': str(LLM_RETRY_AFTER_SECONDS)}
+    )
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Release the Motor connection pools of the async storage API on shutdown
+    storage_aio.close_mongo_client()
+
+async_app = Starlette(
+    routes=[
+        Route('/send_message', send_message, methods=['POST']),
+        Route('/send_message/stream', send_message_stream, methods=['POST']),
+        Route('/daily_insights', daily_insights, methods=['GET']),
+        Route('/weekly_insights', weekly_insights, methods=['GET']),
+    ],
+    middleware=[
+        # Allow CORS for all origins, like the Flask app
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        # Request latency, recorded by api/request_metrics.py for the Flask routes
+        Middleware(RequestMetricsMiddleware),
+        # Flask responses are compressed by api/compression.py; SSE streams are left alone
+        Middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE, compresslevel=COMPRESSION_LEVEL),
+    ],
+    exception_handlers={Overloaded: overloaded},
+    lifespan=lifespan,
+)
+
+ASYNC_PATHS = {route.path for route in async_app.routes}
+
+wsgi_app = WSGIMiddleware(flask_app, workers=ASGI_WSGI_WORKERS)
+
+async def application(scope, receive, send):
+    """
+    Sends the async routes (and lifespan events) to the async app and every other
+    request to the Flask app.
+    """
+    if scope['type'] == 'lifespan' or scope.get('path') in ASYNC_PATHS:
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
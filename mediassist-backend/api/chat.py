@@ -1,13 +1,113 @@
-from graphs.frontend_graph import graph
+import re
 
-config = {"configurable": {"thread_id": "1"}}
+from langchain_core.messages import AIMessage
+
+from graphs.frontend_graph import graph, RESPONSE_NODES
+
+# Conversation of clients that send neither a conversation nor a user ID
+DEFAULT_CONVERSATION_ID = "default"
+
+# Conversation IDs become checkpointer thread IDs, so only short, plain IDs are accepted
+CONVERSATION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.:-]{1,128}$")
+
+def conversation_id_from_request(body):
+    """
+    Returns the conversation a chat request belongs to: its "conversationId", or
+    failing that its "userId", or DEFAULT_CONVERSATION_ID.
+    
+    Raises:
+        ValueError: If the ID is not a short string of letters, digits and _.:-
+    """
+    conversation_id = body.get("conversationId") or body.get("userId") or DEFAULT_CONVERSATION_ID
+    if not isinstance(conversation_id, str) or not CONVERSATION_ID_PATTERN.match(conversation_id):
+        raise ValueError("Invalid conversationId")
+    return conversation_id
+
+def _config(conversation_id):
+    # Every conversation has its own thread in the chat graph's checkpointer
+    return {"configurable": {"thread_id": f"chat-{conversation_id}"}}
 
 class ChatHandler:
     def __init__(self):
         # Initialize any necessary components here
         pass
 
-    def process_message(self, user_message):
+    def process_message(self, user_message, conversation_id=DEFAULT_CONVERSATION_ID):
         # Process the user message using the graph and filter for output_agent messages
-        response = graph.invoke({"messages": [{"role": "user", "content": user_message}]}, config=config)
+        response = graph.invoke(
+            {"messages": [{"role": "user", "content": user_message}]}, config=_config(conversation_id)
+        )
         return response['messages'][-1].content
+
+    async def aprocess_message(self, user_message, conversation_id=DEFAULT_CONVERSATION_ID):
+        # Same as process_message, but awaits the graph so no thread is held while the LLMs run
+        response = await graph.ainvoke(
+            {"messages": [{"role": "user", "content": user_message}]}, config=_config(conversation_id)
+        )
+        return response['messages'][-1].content
+
+    def stream_message(self, user_message, conversation_id=DEFAULT_CONVERSATION_ID):
+        """
+        Processes a user message like process_message, yielding progress as it happens.
+        
+        Yields:
+            tuple: (event, data) pairs, where event is "node" when a graph node finishes,
+            "token" for each chunk of the reply and "done" with the full reply at the end
+        """
+        stream = graph.stream(
+            {"messages": [{"role": "user", "content": user_message}]},
+            config=_config(conversation_id),
+            stream_mode=["updates", "messages"]
+        )
+        response = None
+        for mode, chunk in stream:
+            if mode == "updates":
+                response = self._response_from_update(chunk, response)
+            event = self._stream_event(mode, chunk)
+            if event:
+                yield event
+        yield "done", {"response": response}
+
+    async def astream_message(self, user_message, conversation_id=DEFAULT_CONVERSATION_ID):
+        """
+        Async version of stream_message, for the ASGI server.
+        """
+        stream = graph.astream(
+            {"messages": [{"role": "user", "content": user_message}]},
+            config=_config(conversation_id),
+            stream_mode=["updates", "messages"]
+        )
+        response = None
+        async for mode, chunk in stream:
+            if mode == "updates":
+                response = self._response_from_update(chunk, response)
+            event = self._stream_event(mode, chunk)
+            if event:
+                yield event
+        yield "done", {"response": response}
+
+    def _stream_event(self, mode, chunk):
+        """
+        Converts one item of a multi-mode graph stream into an (event, data) pair,
+        or None if it is not sent to the client.
+        """
+        if mode == "messages":
+            # Only the reply is streamed: AI messages from the node that answers the user
+            message, metadata = chunk
+            if metadata.get("langgraph_node") in RESPONSE_NODES and isinstance(message, AIMessage) and message.content:
+                return "token", {"content": message.content}
+            return None
+        
+        # "updates" yields {node_name: state_update} once per finished node
+        for node in chunk:
+            return "node", {"node": node}
+        return None
+
+    def _response_from_update(self, chunk, response):
+        """
+        Returns the reply if a node that answers the user finished in this update.
+        """
+        for node in RESPONSE_NODES:
+            if node in chunk:
+                return chunk[node]["messages"][-1].content
+        return response
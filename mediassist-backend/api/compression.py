@@ -0,0 +1,65 @@
+"""
+Response compression for the Flask app.
+
+Compresses JSON and text responses of at least COMPRESSION_MIN_SIZE bytes with
+brotli (when the brotli package is installed) or gzip, whichever the client
+prefers according to its Accept-Encoding header. File downloads and streamed
+responses (e.g. Server-Sent Events) are sent as they are.
+"""
+import gzip
+
+from flask import request
+
+from config import COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html", "text/csv"}
+
+def _compress(data, encoding):
+    if encoding == "br":
+        # brotli quality goes from 0 to 11; the gzip level (1-9) is a reasonable setting for it
+        return brotli.compress(data, quality=COMPRESSION_LEVEL)
+    return gzip.compress(data, compresslevel=COMPRESSION_LEVEL)
+
+def _negotiate_encoding():
+    """
+    Picks the encoding to use from the request's Accept-Encoding header, or None.
+    """
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(encodings)
+
+def compress_response(response):
+    """
+    after_request hook that compresses eligible responses.
+    """
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if response.content_length is not None and response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(_compress(response.get_data(), encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+def init_compression(app):
+    """
+    Registers response compression on a Flask app.
+    """
+    app.after_request(compress_response)
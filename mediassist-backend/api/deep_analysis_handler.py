@@ -0,0 +1,127 @@
+import os
+from datetime import datetime
+
+from utils import parse_pdf
+from graphs.deep_analysis_graph import graph
+from storage.client import get_medical_reports, get_medical_report, store_analysis_report
+from config import DEEP_ANALYSIS_WORKERS, DEEP_ANALYSIS_MAX_ACTIVE_JOBS
+from .job_queue import JobQueue
+
+class DeepAnalysisHandler:
+    def __init__(self):
+        self.queue = JobQueue("deep_analysis", self.run_analysis, DEEP_ANALYSIS_WORKERS, DEEP_ANALYSIS_MAX_ACTIVE_JOBS)
+
+    def start_analysis(self):
+        """
+        Queues a deep analysis of all medical reports.
+
+        Returns:
+            The job document, or None if there are no medical reports
+
+        Raises:
+            JobQueueFull: If too many analyses are already queued or running
+        """
+        reports = get_medical_reports(projection=["filename"])
+        reports = [report for report in reports if report.get('_id')]
+        if not reports:
+            return None
+
+        payload = {
+            "file_ids": [str(report['_id']) for report in reports],
+            "filenames": [report.get('filename') for report in reports]
+        }
+        return self.queue.submit(payload, file_count=len(reports))
+
+    def get_status(self, analysis_id):
+        """
+        Returns the status of an analysis, or None if it is unknown or has expired.
+        """
+        job = self.queue.get(analysis_id, ["status", "created_at", "file_count", "report_id", "error"])
+        if job is None:
+            return None
+
+        status = {
+            'status': job['status'],
+            'timestamp': job['created_at'].isoformat(),
+            'file_count': job.get('file_count', 0)
+        }
+        for field in ('report_id', 'error'):
+            if field in job:
+                status[field] = job[field]
+        return status
+
+    def run_analysis(self, job):
+        """
+        Runs a queued deep analysis job: reads the reports, runs the deep analysis
+        graph and stores the resulting report. Called by the job queue workers.
+
+        Returns:
+            dict: The job's final status and result fields
+        """
+        file_ids = job['payload']['file_ids']
+        filenames = job['payload']['filenames']
+
+        # Initialize the state for the graph
+        initial_state = {
+            "messages": [],
+            "report_content": self._combined_report_content(file_ids, filenames),
+            "file_ids": file_ids,
+            "filenames": filenames
+        }
+
+        # Each analysis gets its own conversation thread
+        config = {"configurable": {"thread_id": job['_id']}}
+        result = graph.invoke(initial_state, config=config)
+
+        # Extract the content from the AIMessage
+        if not (result and 'messages' in result and len(result['messages']) > 0):
+            print("Deep analysis completed but no content was returned")
+            return {'status': 'completed_no_content'}
+
+        # Workers run analyses in parallel, so the job ID keeps report IDs from the same second apart
+        now = datetime.now()
+        report_id = f"{now.strftime('%Y%m%d_%H%M%S')}_{job['_id'][:8]}"
+        store_analysis_report({
+            'report_id': report_id,
+            'timestamp': now,
+            'file_ids': file_ids,
+            'filenames': filenames,
+            'content': result['messages'][-1].content
+        })
+
+        print(f"Deep analysis completed and stored as report {report_id}")
+        return {'status': 'completed', 'report_id': report_id}
+
+    def _combined_report_content(self, file_ids, filenames):
+        """
+        Reads the text of every report and joins them with a separator per report.
+        """
+        combined_report_content = ""
+        for file_id, filename in zip(file_ids, filenames):
+            # Get the file
+            file_path, _, content_type = get_medical_report(file_id)
+            if not file_path or not os.path.exists(file_path):
+                continue
+
+            # Add to combined content with separator
+            report_text = self._report_text(file_path, content_type)
+            combined_report_content += f"\n\n--- REPORT: {filename} ---\n\n{report_text}"
+        return combined_report_content
+
+    def _report_text(self, file_path, content_type):
+        """
+        Extracts the text of a report file according to its type.
+        """
+        # Handle different file types
+        if 'pdf' in content_type.lower():
+            # Use the PDF parser for PDF files
+            return parse_pdf(file_path)
+        if 'text' in content_type:
+            # For text files, decode directly
+            with open(file_path, 'rb') as f:
+                try:
+                    return f.read().decode('utf-8')
+                except UnicodeDecodeError:
+                    pass
+        # For other binary formats, use a placeholder
+        return f"[Binary file content of type {content_type}]"
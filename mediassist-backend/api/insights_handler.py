@@ -1,13 +1,113 @@
+import asyncio
+import threading
+import uuid
 from graphs.background_graph import graph
-from storage.client import store_insights_data, get_daily_insights_for_range
+from storage.client import store_insights_data, get_daily_insights_for_range, get_most_recent_insights
+from storage import aio as storage_aio
 from datetime import datetime, timedelta
+from config import DAILY_INSIGHTS_MAX_AGE_HOURS, WEEKLY_INSIGHTS_MAX_AGE_HOURS
+from admission import request_limiter
 
-config = {"configurable": {"thread_id": "1"}}
+def _run_config(analysis_type):
+    """
+    Config for one run of the background graph. Every run gets its own thread, so
+    the history of earlier runs is neither sent to the LLM again nor kept forever
+    by the checkpointer; finished threads expire with CHECKPOINT_RETENTION_DAYS.
+    """
+    return {"configurable": {"thread_id": f"insights-{analysis_type}-{uuid.uuid4()}"}}
+
+# How old stored insights may be before get_latest_insights regenerates them
+INSIGHTS_MAX_AGE = {
+    "daily": timedelta(hours=DAILY_INSIGHTS_MAX_AGE_HOURS),
+    "weekly": timedelta(hours=WEEKLY_INSIGHTS_MAX_AGE_HOURS),
+}
+
+# Fields returned by the insights routes
+INSIGHTS_FIELDS = {"content": 1, "date": 1, "_id": 0}
 
 class InsightsHandler:
     def __init__(self):
-        # Initialize any necessary components here
-        pass
+        # One regeneration at a time per insights type, so concurrent requests for
+        # stale insights share a single run of the graph
+        self._regenerate_locks = {analysis_type: threading.Lock() for analysis_type in INSIGHTS_MAX_AGE}
+        self._aregenerate_locks = {analysis_type: asyncio.Lock() for analysis_type in INSIGHTS_MAX_AGE}
+    
+    def get_latest_insights(self, analysis_type, refresh=False):
+        """
+        Returns the most recent stored insights, regenerating and storing them when
+        none exist, when they are older than INSIGHTS_MAX_AGE, or when refresh is set.
+        
+        Args:
+            analysis_type (str): "daily" or "weekly"
+            refresh (bool): Regenerate even if the stored insights are fresh
+        
+        Returns:
+            dict: The insights document with "content" and "date"
+        
+        Raises:
+            Overloaded: If the insights must be generated but no admission slot became free in time
+        """
+        requested_at = datetime.utcnow()
+        if not refresh:
+            insights = get_most_recent_insights(analysis_type, projection=INSIGHTS_FIELDS)
+            if self._is_fresh(analysis_type, insights, requested_at):
+                return insights
+        
+        with self._regenerate_locks[analysis_type]:
+            # Another request may have regenerated the insights while this one waited
+            insights = get_most_recent_insights(analysis_type, projection=INSIGHTS_FIELDS)
+            if insights and insights["date"] >= requested_at:
+                return insights
+            
+            # Generating insights is an LLM-backed request, so it needs an admission slot
+            generate = self.get_daily_insights if analysis_type == "daily" else self.get_weekly_insights
+            with request_limiter.slot():
+                content = generate()
+            insights = self._insights_document(analysis_type, content)
+            store_insights_data(insights)
+            return insights
+    
+    async def aget_latest_insights(self, analysis_type, refresh=False):
+        """
+        Async version of get_latest_insights, for the ASGI server.
+        
+        Returns:
+            dict: The insights document with "content" and "date"
+        """
+        requested_at = datetime.utcnow()
+        if not refresh:
+            insights = await storage_aio.get_most_recent_insights(analysis_type, projection=INSIGHTS_FIELDS)
+            if self._is_fresh(analysis_type, insights, requested_at):
+                return insights
+        
+        async with self._aregenerate_locks[analysis_type]:
+            insights = await storage_aio.get_most_recent_insights(analysis_type, projection=INSIGHTS_FIELDS)
+            if insights and insights["date"] >= requested_at:
+                return insights
+            
+            generate = self.aget_daily_insights if analysis_type == "daily" else self.aget_weekly_insights
+            async with request_limiter.aslot():
+                content = await generate()
+            insights = self._insights_document(analysis_type, content)
+            await storage_aio.store_insights_data(insights)
+            return insights
+    
+    def _is_fresh(self, analysis_type, insights, now):
+        """
+        Checks whether stored insights are recent enough to be served as they are.
+        """
+        return insights is not None and now - insights["date"] <= INSIGHTS_MAX_AGE[analysis_type]
+    
+    def _insights_document(self, analysis_type, content):
+        """
+        Builds an insights document for storage.
+        """
+        return {
+            "analysis_type": analysis_type,
+            "content": content,
+            "date": datetime.utcnow(),
+            "metadata": {}
+        }
 
     def get_daily_insights(self):
         """
@@ -17,7 +117,7 @@ class InsightsHandler:
             str: The daily insights content
         """
         # Invoke the graph with a prompt for daily analysis
-        response = graph.invoke({"messages": [{"role": "user", "content": "Provide personal daily analysis"}]}, config=config)
+        response = graph.invoke({"messages": [{"role": "user", "content": "Provide personal daily analysis"}]}, config=_run_config("daily"))
         return response['messages'][-1].content if response['messages'] else "No daily insights available."
 
     def get_weekly_insights(self):
@@ -30,20 +130,52 @@ class InsightsHandler:
         # Get daily insights for the past week
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=7)
-        daily_insights = get_daily_insights_for_range(start_date, end_date)
+        daily_insights = get_daily_insights_for_range(start_date, end_date, projection={"content": 1, "_id": 0})
+        
+        # Invoke the graph with a prompt built from the daily insights
+        response = graph.invoke({"messages": [{"role": "user", "content": self._weekly_prompt(daily_insights)}]}, config=_run_config("weekly"))
+        return response['messages'][-1].content if response['messages'] else "No weekly insights available."
+    
+    def _weekly_prompt(self, daily_insights):
+        """
+        Builds the weekly analysis prompt from the stored daily insights of the past week.
         
+        Args:
+            daily_insights (list): Daily insights documents with a "content" field
+        
+        Returns:
+            str: The prompt for the background graph
+        """
         # If we have daily insights, use them to generate weekly insights
         if daily_insights:
-            # Prepare a prompt that includes the daily insights
             daily_insights_text = "\n\n".join([insight["content"] for insight in daily_insights])
-            prompt = f"Generate weekly insights based on the following daily insights from the past week:\n\n{daily_insights_text}"
-            
-            # Invoke the graph with the prepared prompt
-            response = graph.invoke({"messages": [{"role": "user", "content": prompt}]}, config=config)
-        else:
-            # If no daily insights are available, generate weekly insights directly
-            response = graph.invoke({"messages": [{"role": "user", "content": "Provide personal weekly analysis"}]}, config=config)
+            return f"Generate weekly insights based on the following daily insights from the past week:\n\n{daily_insights_text}"
+        
+        # If no daily insights are available, generate weekly insights directly
+        return "Provide personal weekly analysis"
+    
+    async def aget_daily_insights(self):
+        """
+        Async version of get_daily_insights, for the ASGI server.
+        
+        Returns:
+            str: The daily insights content
+        """
+        response = await graph.ainvoke({"messages": [{"role": "user", "content": "Provide personal daily analysis"}]}, config=_run_config("daily"))
+        return response['messages'][-1].content if response['messages'] else "No daily insights available."
+    
+    async def aget_weekly_insights(self):
+        """
+        Async version of get_weekly_insights, for the ASGI server.
+        
+        Returns:
+            str: The weekly insights content
+        """
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=7)
+        daily_insights = await storage_aio.get_daily_insights_for_range(start_date, end_date, projection={"content": 1, "_id": 0})
         
+        response = await graph.ainvoke({"messages": [{"role": "user", "content": self._weekly_prompt(daily_insights)}]}, config=_run_config("weekly"))
         return response['messages'][-1].content if response['messages'] else "No weekly insights available."
     
     def store_daily_insights(self):
@@ -58,13 +190,7 @@ class InsightsHandler:
         content = self.get_daily_insights()
         
         # Store the daily insights in the database
-        insights_data = {
-            "analysis_type": "daily",
-            "content": content,
-            "date": datetime.utcnow(),
-            "metadata": {}
-        }
-        return store_insights_data(insights_data)
+        return store_insights_data(self._insights_document("daily", content))
     
     def store_weekly_insights(self):
         """
@@ -78,10 +204,4 @@ class InsightsHandler:
         content = self.get_weekly_insights()
         
         # Store the weekly insights in the database
-        insights_data = {
-            "analysis_type": "weekly",
-            "content": content,
-            "date": datetime.utcnow(),
-            "metadata": {}
-        }
-        return store_insights_data(insights_data)
+        return store_insights_data(self._insights_document("weekly", content))
@@ -0,0 +1,181 @@
+import sys
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage.client import enqueue_job, claim_next_job, heartbeat_job, finish_job, requeue_stale_jobs, get_job
+from config import (
+    JOB_RETENTION_HOURS, JOB_POLL_INTERVAL_SECONDS, JOB_STALE_AFTER_SECONDS, JOB_REQUEUE_INTERVAL_SECONDS,
+    JOB_HEARTBEAT_INTERVAL_SECONDS, JOB_MAX_ATTEMPTS
+)
+
+class JobQueue:
+    """
+    A fixed-size pool of worker threads that runs background jobs of one type.
+
+    Jobs are stored in MongoDB (see the job functions in storage/client.py), so they
+    survive restarts and every process shares one queue and one status table. Each
+    process runs its own pool; idle workers poll for jobs queued elsewhere and are
+    woken immediately for jobs queued by their own process.
+    """
+
+    def __init__(self, job_type, handler, workers, max_active):
+        """
+        Args:
+            job_type (str): The kind of job this queue runs
+            handler (callable): Called with the claimed job document; returns a dict
+                of result fields, including the final "status"
+            workers (int): The number of worker threads
+            max_active (int): The maximum number of queued and running jobs
+        """
+        self.job_type = job_type
+        self.handler = handler
+        self.workers = workers
+        self.max_active = max_active
+        self.retention = timedelta(hours=JOB_RETENTION_HOURS)
+        self.running = False
+        self.worker_threads = []
+        self._wakeup = threading.Event()
+        self._requeue_lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        if self.running:
+            print(f"{self.job_type} job queue is already running.")
+            return
+
+        self._requeue_stale_jobs()
+
+        self.running = True
+        worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run_worker, args=(f"{worker_prefix}:{index}",))
+            thread.daemon = True  # Set as daemon so it will exit when the main program exits
+            thread.start()
+            self.worker_threads.append(thread)
+
+        print(f"{self.job_type} job queue started with {self.workers} workers at {datetime.now()}")
+
+    def stop(self):
+        """
+        Stop the worker threads once they finish their current job.
+        """
+        if not self.running:
+            print(f"{self.job_type} job queue is not running.")
+            return
+
+        self.running = False
+        self._wakeup.set()
+        for thread in self.worker_threads:
+            thread.join(timeout=1)
+        self.worker_threads = []
+
+        print(f"{self.job_type} job queue stopped at {datetime.now()}")
+
+    def submit(self, payload, **fields):
+        """
+        Queues a job.
+
+        Args:
+            payload (dict): The job's input, passed to the handler
+            **fields: Extra fields stored on the job document
+
+        Returns:
+            The job document, with its ID in _id
+
+        Raises:
+            JobQueueFull: If max_active jobs are already queued or running
+        """
+        job = enqueue_job(self.job_type, payload, max_active=self.max_active, **fields)
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id, projection=None):
+        """
+        Retrieves a job of this queue by its ID, or None if it does not exist.
+        """
+        job = get_job(job_id, projection)
+        if job is None or job.get("type", self.job_type) != self.job_type:
+            return None
+        return job
+
+    def _requeue_stale_jobs(self):
+        """
+        Queue again the jobs left running by a worker or process that went away, at
+        most once every JOB_REQUEUE_INTERVAL_SECONDS per process.
+        """
+        if not self._requeue_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self._next_requeue:
+                return
+            self._next_requeue = time.monotonic() + JOB_REQUEUE_INTERVAL_SECONDS
+            requeued, failed = requeue_stale_jobs(
+                self.job_type, timedelta(seconds=JOB_STALE_AFTER_SECONDS), JOB_MAX_ATTEMPTS, self.retention
+            )
+            if requeued:
+                print(f"Requeued {requeued} abandoned {self.job_type} jobs")
+            if failed:
+                print(f"Gave up {failed} abandoned {self.job_type} jobs after {JOB_MAX_ATTEMPTS} attempts")
+        except Exception as e:
+            print(f"Error requeuing abandoned {self.job_type} jobs: {e}")
+        finally:
+            self._requeue_lock.release()
+
+    def _send_heartbeats(self, job_id, worker_id, done):
+        """
+        Refresh a running job's heartbeat every JOB_HEARTBEAT_INTERVAL_SECONDS until
+        done is set, so a slow job is not mistaken for an abandoned one.
+        """
+        while not done.wait(JOB_HEARTBEAT_INTERVAL_SECONDS):
+            try:
+                if not heartbeat_job(job_id, worker_id):
+                    print(f"{self.job_type} job {job_id} is no longer owned by {worker_id}")
+                    return
+            except Exception as e:
+                print(f"Error sending the heartbeat of {self.job_type} job {job_id}: {e}")
+
+    def _run_worker(self, worker_id):
+        """
+        Run the worker loop: requeue abandoned jobs when due, claim the next job, run
+        it, record the outcome.
+        """
+        while self.running:
+            self._requeue_stale_jobs()
+            try:
+                job = claim_next_job(self.job_type, worker_id)
+            except Exception as e:
+                print(f"Error claiming {self.job_type} job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(JOB_POLL_INTERVAL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self._send_heartbeats, args=(job["_id"], worker_id, done))
+            heartbeat.daemon = True
+            heartbeat.start()
+            try:
+                result = self.handler(job)
+                status = result.pop("status", "completed")
+            except Exception as e:
+                print(f"Error in {self.job_type} job {job['_id']}: {e}")
+                status, result = "error", {"error": str(e)}
+            finally:
+                done.set()
+
+            try:
+                if not finish_job(job["_id"], worker_id, status, self.retention, **result):
+                    print(f"Discarded the outcome of {self.job_type} job {job['_id']}: it was taken over by another worker")
+            except Exception as e:
+                print(f"Error recording the outcome of {self.job_type} job {job['_id']}: {e}")
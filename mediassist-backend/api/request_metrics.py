@@ -0,0 +1,67 @@
+"""
+Request latency metrics for the Flask and ASGI apps.
+
+Requests are recorded in HTTP_REQUEST_SECONDS (see metrics.py) under their route
+pattern, e.g. /download_medical_report/<file_id>, so that per-resource URLs do not
+each create a new time series. For streamed responses (Server-Sent Events) the
+time until the response starts is recorded, not the length of the stream.
+"""
+import time
+
+from flask import g, request
+
+from metrics import HTTP_REQUEST_SECONDS
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+def _record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        HTTP_REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+    return response
+
+def init_request_metrics(app):
+    """
+    Registers request latency metrics on a Flask app.
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording request latency for an app whose routes have fixed paths.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            recorded = True
+            HTTP_REQUEST_SECONDS.labels(scope["method"], scope["path"], status).observe(time.perf_counter() - started)
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                record(str(message["status"]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            if not recorded:
+                record("500")
+            raise
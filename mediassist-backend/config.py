@@ -1,2 +1,133 @@
+import os
+
 API_BASE_URL = ""
-API_KEY = ""
\ No newline at end of file
+API_KEY = ""
+
+# MongoDB connection settings (shared, process-wide client)
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+
+# Refuse to start the API when the data migrations or index creation fail at startup
+# (see storage/indexes.py); otherwise the error is logged and the API starts anyway
+STORAGE_BOOTSTRAP_REQUIRED = os.getenv("STORAGE_BOOTSTRAP_REQUIRED", "false").lower() in ("1", "true", "yes")
+
+# Maximum number of documents sent per insert_many round trip by the bulk storage functions
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "1000"))
+
+# Page sizes for the paginated listing endpoints (?limit=...&after=...)
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+# In-process read cache for the user profile and medical conditions
+STORAGE_CACHE_TTL_SECONDS = float(os.getenv("STORAGE_CACHE_TTL_SECONDS", "300"))
+STORAGE_CACHE_MAX_ENTRIES = int(os.getenv("STORAGE_CACHE_MAX_ENTRIES", "128"))
+
+# Threads used by the ASGI server (api/asgi.py) to run the synchronous Flask routes
+ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", "10"))
+
+# Stored insights older than this are regenerated when /daily_insights or /weekly_insights
+# is requested. The scheduler stores new ones daily / weekly, so the defaults leave some slack.
+DAILY_INSIGHTS_MAX_AGE_HOURS = float(os.getenv("DAILY_INSIGHTS_MAX_AGE_HOURS", "26"))
+WEEKLY_INSIGHTS_MAX_AGE_HOURS = float(os.getenv("WEEKLY_INSIGHTS_MAX_AGE_HOURS", "170"))
+
+# Medical report uploads are copied to disk in chunks of this size and rejected once they exceed the limit
+MEDICAL_REPORT_MAX_BYTES = int(os.getenv("MEDICAL_REPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Allowance on top of MEDICAL_REPORT_MAX_BYTES for the multipart boundaries and form fields of an upload
+MULTIPART_OVERHEAD_BYTES = int(os.getenv("MULTIPART_OVERHEAD_BYTES", str(64 * 1024)))
+
+# Optional offload of medical report downloads to the fronting web server:
+# "x-accel-redirect" (nginx; files are served from MEDICAL_REPORT_ACCEL_REDIRECT_PREFIX,
+# an internal location aliased to the uploads directory), "x-sendfile" (Apache, lighttpd),
+# or empty to send files from the app
+MEDICAL_REPORT_SENDFILE = os.getenv("MEDICAL_REPORT_SENDFILE", "").lower()
+MEDICAL_REPORT_ACCEL_REDIRECT_PREFIX = os.getenv("MEDICAL_REPORT_ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+
+# Deep analysis job queue: worker threads per process, maximum queued + running jobs
+# across all processes (further requests get 429), how long finished jobs are kept,
+# how often idle workers poll for jobs queued by other processes, how often a worker
+# refreshes the heartbeat of the job it runs, after how long without a heartbeat a
+# running job is queued again, how often the workers look for such jobs, and how
+# many times a job is started before it is given up
+DEEP_ANALYSIS_WORKERS = int(os.getenv("DEEP_ANALYSIS_WORKERS", "2"))
+DEEP_ANALYSIS_MAX_ACTIVE_JOBS = int(os.getenv("DEEP_ANALYSIS_MAX_ACTIVE_JOBS", "10"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("JOB_HEARTBEAT_INTERVAL_SECONDS", "60"))
+JOB_STALE_AFTER_SECONDS = float(os.getenv("JOB_STALE_AFTER_SECONDS", "600"))
+JOB_REQUEUE_INTERVAL_SECONDS = float(os.getenv("JOB_REQUEUE_INTERVAL_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Retry-After sent with the 429 of a full deep analysis queue; a slot only frees up
+# when a running analysis finishes, so this is much longer than LLM_RETRY_AFTER_SECONDS
+DEEP_ANALYSIS_RETRY_AFTER_SECONDS = int(os.getenv("DEEP_ANALYSIS_RETRY_AFTER_SECONDS", "60"))
+
+# Responses of at least this many bytes are compressed (brotli or gzip) when the client accepts it
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+
+# Admission control for the LLM-backed routes (/send_message, /send_message/stream,
+# /daily_insights, /weekly_insights, /generate_and_store_insights): how many may run
+# at once per process, how many more may wait for a slot and for how long before
+# getting 429, and the Retry-After sent with it
+LLM_REQUEST_CONCURRENCY = int(os.getenv("LLM_REQUEST_CONCURRENCY", "8"))
+LLM_REQUEST_QUEUE_SIZE = int(os.getenv("LLM_REQUEST_QUEUE_SIZE", "32"))
+LLM_REQUEST_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_RETRY_AFTER_SECONDS = int(os.getenv("LLM_RETRY_AFTER_SECONDS", "5"))
+
+# Concurrent calls per model and process, as "model=limit" pairs separated by commas;
+# models not listed get LLM_DEFAULT_CONCURRENCY. Calls wait for a slot for at most
+# LLM_CALL_QUEUE_TIMEOUT_SECONDS, and at most LLM_CALL_QUEUE_SIZE calls wait per model.
+LLM_CONCURRENCY_LIMITS = os.getenv("LLM_CONCURRENCY_LIMITS", "gpt-4o=8,o3-mini=2,llama3.2=2")
+LLM_DEFAULT_CONCURRENCY = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "4"))
+LLM_CALL_QUEUE_SIZE = int(os.getenv("LLM_CALL_QUEUE_SIZE", "64"))
+LLM_CALL_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_QUEUE_TIMEOUT_SECONDS", "60"))
+
+# Persistent cache of LLM responses for the agents that opt in (see llm_cache.py):
+# an SQLite file shared by all processes, how long a response is reused and how many
+# are kept (least recently used first out)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.abspath(os.path.join(os.path.dirname(__file__), "../cache/llm_cache.sqlite3"))
+)
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+# Chat routing: "fast" classifies each message with one LLM call and lets the chosen
+# handler reply directly; "legacy" runs the input agent, orchestrator, intent
+# classifier, handler and output agent in sequence. On the fast path, messages
+# classified with less confidence than CHAT_ROUTING_MIN_CONFIDENCE get a general reply.
+CHAT_ROUTING_MODE = os.getenv("CHAT_ROUTING_MODE", "fast").lower()
+CHAT_ROUTING_MIN_CONFIDENCE = float(os.getenv("CHAT_ROUTING_MIN_CONFIDENCE", "0.5"))
+
+# Local intent model (see agents/local_intent_classifier.py): where the trained model
+# is read from, and how confident it must be to answer without the LLM classifier.
+# Chat message classifications are logged for training for INTENT_LOG_RETENTION_DAYS.
+INTENT_MODEL_PATH = os.getenv(
+    "INTENT_MODEL_PATH", os.path.abspath(os.path.join(os.path.dirname(__file__), "../models/intent_classifier.json"))
+)
+INTENT_MODEL_MIN_CONFIDENCE = float(os.getenv("INTENT_MODEL_MIN_CONFIDENCE", "0.85"))
+INTENT_LOGGING_ENABLED = os.getenv("INTENT_LOGGING_ENABLED", "true").lower() in ("1", "true", "yes")
+INTENT_LOG_RETENTION_DAYS = float(os.getenv("INTENT_LOG_RETENTION_DAYS", "180"))
+
+# Chat memory (see graphs/chat_memory.py): once a conversation holds more than
+# CHAT_MEMORY_MAX_MESSAGES messages, all but the last CHAT_MEMORY_KEEP_MESSAGES are
+# folded into a running summary. Agents are sent the summary and as many of the
+# most recent messages as fit in CHAT_MEMORY_MAX_PROMPT_TOKENS.
+CHAT_MEMORY_MAX_MESSAGES = int(os.getenv("CHAT_MEMORY_MAX_MESSAGES", "20"))
+CHAT_MEMORY_KEEP_MESSAGES = int(os.getenv("CHAT_MEMORY_KEEP_MESSAGES", "8"))
+CHAT_MEMORY_MAX_PROMPT_TOKENS = int(os.getenv("CHAT_MEMORY_MAX_PROMPT_TOKENS", "2000"))
+
+# Where LangGraph keeps graph state (see graphs/checkpointer.py): "sqlite" (a file
+# shared by the processes of one host), "mongo" (shared by every host) or "memory".
+# Each thread keeps its CHECKPOINT_MAX_PER_THREAD latest checkpoints, and checkpoints
+# are deleted CHECKPOINT_RETENTION_DAYS after they were written.
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite").lower()
+CHECKPOINT_SQLITE_PATH = os.getenv(
+    "CHECKPOINT_SQLITE_PATH", os.path.abspath(os.path.join(os.path.dirname(__file__), "../cache/checkpoints.sqlite3"))
+)
+CHECKPOINT_MAX_PER_THREAD = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "10"))
+CHECKPOINT_RETENTION_DAYS = float(os.getenv("CHECKPOINT_RETENTION_DAYS", "30"))
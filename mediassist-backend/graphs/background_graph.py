@@ -4,12 +4,13 @@ from typing_extensions import TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 
 from agents.data_fetcher_agent import data_fetcher_agent_llm, DATA_FETCHER_AGENT_SYSTEM_PROMPT
-from agents.insights_agent import insights_agent_llm, INSIGHTS_AGENT_SYSTEM_PROMPT
+from agents.insights_agent import background_insights_agent_llm, INSIGHTS_AGENT_SYSTEM_PROMPT
 from tools.tools import tool_node
+from graphs.checkpointer import create_checkpointer
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
@@ -23,6 +24,10 @@ def process_tool_output(tool_calls):
         tool_output.append(message.content)
     return json.dumps(tool_output)
 
+async def aprocess_tool_output(tool_calls):
+    response = await tool_node.ainvoke({"messages": [tool_calls]})
+    return json.dumps([message.content for message in response['messages']])
+
 def data_fetcher_agent(state: State):
     system_message = SystemMessage(content=DATA_FETCHER_AGENT_SYSTEM_PROMPT)
     tool_calls = data_fetcher_agent_llm.invoke([system_message] + state["messages"])
@@ -30,21 +35,31 @@ def data_fetcher_agent(state: State):
     data = AIMessage(content=tool_output)
     return {"messages": [data]}
 
+async def adata_fetcher_agent(state: State):
+    system_message = SystemMessage(content=DATA_FETCHER_AGENT_SYSTEM_PROMPT)
+    tool_calls = await data_fetcher_agent_llm.ainvoke([system_message] + state["messages"])
+    tool_output = await aprocess_tool_output(tool_calls)
+    return {"messages": [AIMessage(content=tool_output)]}
+
 def insights_agent(state: State):
     system_message = SystemMessage(content=INSIGHTS_AGENT_SYSTEM_PROMPT)
-    insights_response = insights_agent_llm.invoke([system_message] + state["messages"])
+    insights_response = background_insights_agent_llm.invoke([system_message] + state["messages"])
     return {"messages": [insights_response]}
 
-# Nodes in the graph
-graph_builder.add_node("data_fetcher_agent", data_fetcher_agent)
-graph_builder.add_node("insights_agent", insights_agent)
+async def ainsights_agent(state: State):
+    system_message = SystemMessage(content=INSIGHTS_AGENT_SYSTEM_PROMPT)
+    return {"messages": [await background_insights_agent_llm.ainvoke([system_message] + state["messages"])]}
+
+# Nodes in the graph (the async twins are used by graph.ainvoke())
+graph_builder.add_node("data_fetcher_agent", RunnableLambda(data_fetcher_agent, afunc=adata_fetcher_agent))
+graph_builder.add_node("insights_agent", RunnableLambda(insights_agent, afunc=ainsights_agent))
 
 
 graph_builder.add_edge(START, "data_fetcher_agent")
 graph_builder.add_edge("data_fetcher_agent", "insights_agent")
 graph_builder.add_edge("insights_agent", END)
 
-memory = MemorySaver()
+memory = create_checkpointer("background")
 graph = graph_builder.compile(checkpointer=memory)
 
 
@@ -0,0 +1,126 @@
+"""
+Conversation memory policy for the chat graph.
+
+The chat graph keeps one conversation per thread in its checkpointer. Without a
+policy both the checkpoint and every prompt grow with each turn, so:
+
+- Agents are sent their system prompt once, followed by the conversation summary
+  and as many of the most recent messages as fit in CHAT_MEMORY_MAX_PROMPT_TOKENS
+  (see build_prompt).
+- At the end of a turn, once the conversation holds more than
+  CHAT_MEMORY_MAX_MESSAGES messages, the older ones are folded into the summary by
+  the summarizer agent and removed from the state, leaving the last
+  CHAT_MEMORY_KEEP_MESSAGES (see compact_memory).
+"""
+from langchain_core.messages import (
+    HumanMessage, SystemMessage, RemoveMessage, get_buffer_string, trim_messages
+)
+from langchain_core.messages.utils import count_tokens_approximately
+
+from agents.summarizer_agent import summarizer_agent_llm, SUMMARIZER_AGENT_SYSTEM_PROMPT
+from config import CHAT_MEMORY_MAX_MESSAGES, CHAT_MEMORY_KEEP_MESSAGES, CHAT_MEMORY_MAX_PROMPT_TOKENS
+
+def _history(state):
+    # System prompts are added per call and never belong in the stored conversation
+    return [message for message in state["messages"] if not isinstance(message, SystemMessage)]
+
+def build_prompt(system_prompt, state, max_tokens=CHAT_MEMORY_MAX_PROMPT_TOKENS):
+    """
+    Builds the messages sent to an agent: its system prompt with the conversation
+    summary, then the most recent messages that fit in the token budget.
+
+    Args:
+        system_prompt (str): The agent's system prompt
+        state (dict): The chat graph state
+        max_tokens (int): Token budget for the conversation messages
+
+    Returns:
+        list: The messages to send to the agent's LLM
+    """
+    summary = state.get("summary")
+    if summary:
+        system_prompt = f"{system_prompt}\n\nSummary of the earlier conversation:\n{summary}"
+
+    history = _history(state)
+    recent = trim_messages(
+        history,
+        max_tokens=max_tokens,
+        token_counter=count_tokens_approximately,
+        strategy="last",
+        start_on="human",
+    )
+    if not recent:
+        # The latest message alone is over budget; the agent still needs it
+        recent = [next((m for m in reversed(history) if isinstance(m, HumanMessage)), history[-1])]
+    return [SystemMessage(content=system_prompt)] + recent
+
+def _split_history(history):
+    """
+    Splits the conversation into (older, recent) messages, recent being the last
+    CHAT_MEMORY_KEEP_MESSAGES moved back to start on a user message so no reply
+    is kept without the message it answers.
+    """
+    start = max(len(history) - CHAT_MEMORY_KEEP_MESSAGES, 0)
+    while start > 0 and not isinstance(history[start], HumanMessage):
+        start -= 1
+    return history[:start], history[start:]
+
+def _summary_request(state, older):
+    transcript = get_buffer_string(older, human_prefix="User", ai_prefix="Assistant")
+    return [
+        SystemMessage(content=SUMMARIZER_AGENT_SYSTEM_PROMPT),
+        HumanMessage(content=f"Current summary:\n{state.get('summary') or '(none)'}\n\nMessages:\n{transcript}"),
+    ]
+
+def _compaction(state):
+    """
+    Returns (older messages to summarise, messages to remove), or None when the
+    conversation is within its limits.
+    """
+    history = _history(state)
+    stray_system_messages = [m for m in state["messages"] if isinstance(m, SystemMessage)]
+    older = []
+    if len(history) > CHAT_MEMORY_MAX_MESSAGES:
+        older, _ = _split_history(history)
+    if not older and not stray_system_messages:
+        return None
+    return older, stray_system_messages + older
+
+def _compacted_state(state, older, removed, summary):
+    update = {"messages": [RemoveMessage(id=message.id) for message in removed]}
+    if older:
+        print(f"CHAT MEMORY: summarised {len(older)} messages")
+        update["summary"] = summary
+    return update
+
+def compact_memory(state):
+    """
+    Graph node run at the end of each turn: folds older messages into the summary
+    and removes them, along with any system prompts stored by earlier versions.
+    """
+    compaction = _compaction(state)
+    if compaction is None:
+        return {}
+    older, removed = compaction
+    summary = state.get("summary", "")
+    if older:
+        try:
+            summary = summarizer_agent_llm.invoke(_summary_request(state, older)).content
+        except Exception as e:
+            # The messages are dropped regardless, so the state stays bounded
+            print(f"Error summarising the conversation: {e}")
+    return _compacted_state(state, older, removed, summary)
+
+async def acompact_memory(state):
+    """Async version of compact_memory."""
+    compaction = _compaction(state)
+    if compaction is None:
+        return {}
+    older, removed = compaction
+    summary = state.get("summary", "")
+    if older:
+        try:
+            summary = (await summarizer_agent_llm.ainvoke(_summary_request(state, older))).content
+        except Exception as e:
+            print(f"Error summarising the conversation: {e}")
+    return _compacted_state(state, older, removed, summary)
@@ -0,0 +1,531 @@
+"""
+Checkpointers for the LangGraph graphs.
+
+CHECKPOINT_BACKEND picks where graph state is kept:
+
+- "sqlite" (the default): an SQLite file at CHECKPOINT_SQLITE_PATH, shared by the
+  worker processes of one host
+- "mongo": the checkpoint_db database on MONGO_URI, shared by every host
+- "memory": in the process, lost on restart (LangGraph's MemorySaver)
+
+Every checkpoint holds the complete state of its thread, so only the latest one
+is needed to carry on a conversation; older ones only serve to replay history.
+The persistent savers therefore compact a thread whenever they store a checkpoint,
+keeping its CHECKPOINT_MAX_PER_THREAD most recent checkpoints and their pending
+writes, and remove checkpoints older than CHECKPOINT_RETENTION_DAYS, so threads
+nobody uses any more disappear (in MongoDB through a TTL index).
+
+All graphs share the store, but each gets its own saver from
+create_checkpointer(graph), which keeps its threads apart from those of other
+graphs, so two graphs can use the same thread ID without sharing state.
+
+Thread IDs: the chat graph uses one thread per conversation ("chat-<conversation
+ID>", see api/chat.py), the insights graph one per run, deep analysis one per job
+(the job ID) and the user profile graph the single thread "user_profile".
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata
+)
+from langgraph.checkpoint.memory import MemorySaver
+from pymongo import DESCENDING
+
+from config import (
+    CHECKPOINT_BACKEND, CHECKPOINT_SQLITE_PATH, CHECKPOINT_MAX_PER_THREAD, CHECKPOINT_RETENTION_DAYS
+)
+
+# How often a saver removes expired checkpoints from SQLite, in seconds
+PURGE_INTERVAL_SECONDS = 600
+
+class CompactingSaver(BaseCheckpointSaver):
+    """
+    Base class of the persistent savers: thread and config handling shared by
+    the SQLite and MongoDB implementations.
+    """
+
+    def __init__(self, graph, max_per_thread=CHECKPOINT_MAX_PER_THREAD, retention_days=CHECKPOINT_RETENTION_DAYS):
+        """
+        Args:
+            graph (str): The graph using the saver; its threads are kept apart from other graphs'
+            max_per_thread (int): How many checkpoints are kept per thread
+            retention_days (float): How long checkpoints are kept
+        """
+        super().__init__()
+        self.graph = graph
+        self.max_per_thread = max(max_per_thread, 1)
+        self.retention = timedelta(days=retention_days)
+
+    @staticmethod
+    def _thread(config):
+        # Thread IDs are stored as strings, whatever type the caller passes
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _config(thread_id, checkpoint_ns, checkpoint_id):
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _tuple(self, row, writes):
+        """
+        Builds a CheckpointTuple from a stored checkpoint and its pending writes.
+        """
+        thread_id, checkpoint_ns = row["thread_id"], row["checkpoint_ns"]
+        parent_id = row.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, row["checkpoint_id"]),
+            checkpoint=self.serde.loads_typed((row["type"], row["checkpoint"])),
+            metadata=self.serde.loads_typed((row["metadata_type"], row["metadata"])),
+            parent_config=self._config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[
+                (write["task_id"], write["channel"], self.serde.loads_typed((write["type"], write["value"])))
+                for write in writes
+            ],
+        )
+
+    def _checkpoint_row(self, config, checkpoint, metadata):
+        thread_id, checkpoint_ns = self._thread(config)
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        return {
+            "graph": self.graph,
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": checkpoint_type,
+            "checkpoint": checkpoint_data,
+            "metadata_type": metadata_type,
+            "metadata": metadata_data,
+        }
+
+    def _write_rows(self, config, writes, task_id, task_path):
+        """
+        Returns (row, replace) pairs for put_writes. Writes to the special channels
+        (errors, interrupts) replace earlier ones; other writes are kept as first stored.
+        """
+        thread_id, checkpoint_ns = self._thread(config)
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            idx = WRITES_IDX_MAP.get(channel, index)
+            rows.append(({
+                "graph": self.graph,
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": config["configurable"]["checkpoint_id"],
+                "task_id": task_id,
+                "idx": idx,
+                "channel": channel,
+                "type": value_type,
+                "value": value_data,
+                "task_path": task_path,
+            }, idx < 0))
+        return rows
+
+    def _matches(self, checkpoint_tuple, filter):
+        return all(checkpoint_tuple.metadata.get(key) == value for key, value in (filter or {}).items())
+
+class SQLiteSaver(CompactingSaver):
+    """
+    Checkpoint saver backed by an SQLite file. The async methods run the
+    synchronous ones in a worker thread.
+    """
+
+    def __init__(self, graph, path=CHECKPOINT_SQLITE_PATH, **kwargs):
+        """
+        Args:
+            graph (str): The graph using the saver
+            path (str): The SQLite database file
+            **kwargs: max_per_thread and retention_days, see CompactingSaver
+        """
+        super().__init__(graph, **kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    def _connection(self):
+        """
+        Returns this thread's connection, creating the database on first use.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        # WAL lets readers in other processes proceed while one process writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "graph TEXT, thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, parent_checkpoint_id TEXT, "
+            "type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, created_at REAL, "
+            "PRIMARY KEY (graph, thread_id, checkpoint_ns, checkpoint_id))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoint_writes ("
+            "graph TEXT, thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, task_id TEXT, idx INTEGER, "
+            "channel TEXT, type TEXT, value BLOB, task_path TEXT, created_at REAL, "
+            "PRIMARY KEY (graph, thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS checkpoints_created_at ON checkpoints (created_at)")
+        connection.execute("CREATE INDEX IF NOT EXISTS checkpoint_writes_created_at ON checkpoint_writes (created_at)")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _writes(self, connection, row):
+        return connection.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes "
+            "WHERE graph = ? AND thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_path, task_id, idx",
+            (self.graph, row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"]),
+        ).fetchall()
+
+    def get_tuple(self, config):
+        """
+        Returns the checkpoint named in the config, or the thread's latest one.
+        """
+        thread_id, checkpoint_ns = self._thread(config)
+        connection = self._connection()
+        query = "SELECT * FROM checkpoints WHERE graph = ? AND thread_id = ? AND checkpoint_ns = ?"
+        params = [self.graph, thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        row = connection.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        return self._tuple(dict(row), self._writes(connection, row))
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """
+        Yields the checkpoints matching the config and metadata filter, newest first.
+        """
+        query = "SELECT * FROM checkpoints WHERE graph = ?"
+        params = [self.graph]
+        if config:
+            thread_id, checkpoint_ns = self._thread(config)
+            query += " AND thread_id = ?"
+            params.append(thread_id)
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+
+        connection = self._connection()
+        rows = connection.execute(query + " ORDER BY checkpoint_id DESC", params).fetchall()
+        for row in rows:
+            checkpoint_tuple = self._tuple(dict(row), self._writes(connection, row))
+            if not self._matches(checkpoint_tuple, filter):
+                continue
+            yield checkpoint_tuple
+            if limit is not None:
+                limit -= 1
+                if limit <= 0:
+                    break
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        """
+        Stores a checkpoint and compacts its thread.
+        """
+        row = self._checkpoint_row(config, checkpoint, metadata)
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row["graph"], row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"],
+                 row["parent_checkpoint_id"], row["type"], row["checkpoint"], row["metadata_type"],
+                 row["metadata"], now),
+            )
+            self._compact(connection, row["thread_id"], row["checkpoint_ns"])
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        if now - self._last_purge > PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            self.purge_expired()
+        return self._config(row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"])
+
+    def _compact(self, connection, thread_id, checkpoint_ns):
+        """
+        Deletes all but the thread's max_per_thread newest checkpoints, with their writes.
+        """
+        oldest_kept = connection.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE graph = ? AND thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (self.graph, thread_id, checkpoint_ns, self.max_per_thread - 1),
+        ).fetchone()
+        if oldest_kept is None:
+            return
+        for table in ("checkpoints", "checkpoint_writes"):
+            connection.execute(
+                f"DELETE FROM {table} WHERE graph = ? AND thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (self.graph, thread_id, checkpoint_ns, oldest_kept["checkpoint_id"]),
+            )
+
+    def purge_expired(self):
+        """
+        Deletes checkpoints and writes older than the retention period, from all graphs.
+
+        Returns:
+            int: The number of checkpoints deleted
+        """
+        cutoff = time.time() - self.retention.total_seconds()
+        connection = self._connection()
+        try:
+            deleted = connection.execute("DELETE FROM checkpoints WHERE created_at < ?", (cutoff,)).rowcount
+            connection.execute("DELETE FROM checkpoint_writes WHERE created_at < ?", (cutoff,))
+        except sqlite3.Error as e:
+            print(f"Error purging expired checkpoints: {e}")
+            return 0
+        if deleted:
+            print(f"Purged {deleted} expired checkpoints")
+        return deleted
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        """
+        Stores the writes of a task, pending until the next checkpoint.
+        """
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for row, replace in self._write_rows(config, writes, task_id, task_path):
+                connection.execute(
+                    f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO checkpoint_writes "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*row.values(), now),
+                )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def delete_thread(self, thread_id):
+        """
+        Deletes all checkpoints and writes of a thread.
+        """
+        connection = self._connection()
+        for table in ("checkpoints", "checkpoint_writes"):
+            connection.execute(f"DELETE FROM {table} WHERE graph = ? AND thread_id = ?", (self.graph, str(thread_id)))
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoint_tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+class MongoSaver(CompactingSaver):
+    """
+    Checkpoint saver backed by the checkpoint_db database. The sync methods use the
+    shared PyMongo client, the async ones the Motor client of the running event loop.
+    Expired checkpoints are removed by the TTL indexes on expires_at (see storage/indexes.py).
+    """
+
+    def _collections(self):
+        from storage.client import get_mongo_client
+        db = get_mongo_client()["checkpoint_db"]
+        return db["checkpoints"], db["checkpoint_writes"]
+
+    def _acollections(self):
+        from storage.aio import get_mongo_client
+        db = get_mongo_client()["checkpoint_db"]
+        return db["checkpoints"], db["checkpoint_writes"]
+
+    def _thread_query(self, config):
+        thread_id, checkpoint_ns = self._thread(config)
+        return {"graph": self.graph, "thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+
+    def _list_query(self, config, before):
+        query = {"graph": self.graph}
+        if config:
+            thread_id, checkpoint_ns = self._thread(config)
+            query["thread_id"] = thread_id
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query["checkpoint_ns"] = checkpoint_ns
+            if checkpoint_id := get_checkpoint_id(config):
+                query["checkpoint_id"] = checkpoint_id
+        if before and (before_id := get_checkpoint_id(before)):
+            query["checkpoint_id"] = {"$lt": before_id}
+        return query
+
+    @staticmethod
+    def _writes_query(row):
+        return {key: row[key] for key in ("graph", "thread_id", "checkpoint_ns", "checkpoint_id")}
+
+    def _stamp(self, document):
+        now = datetime.utcnow()
+        return {**document, "created_at": now, "expires_at": now + self.retention}
+
+    @staticmethod
+    def _write_update(row, replace):
+        key = {name: row[name] for name in ("graph", "thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx")}
+        return key, ({"$set": row} if replace else {"$setOnInsert": row})
+
+    # Sync
+
+    def get_tuple(self, config):
+        """
+        Returns the checkpoint named in the config, or the thread's latest one.
+        """
+        checkpoints, writes = self._collections()
+        query = self._thread_query(config)
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        row = checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        if row is None:
+            return None
+        return self._tuple(row, writes.find(self._writes_query(row)).sort([("task_path", 1), ("task_id", 1), ("idx", 1)]))
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """
+        Yields the checkpoints matching the config and metadata filter, newest first.
+        """
+        checkpoints, writes = self._collections()
+        for row in checkpoints.find(self._list_query(config, before)).sort("checkpoint_id", DESCENDING):
+            pending = writes.find(self._writes_query(row)).sort([("task_path", 1), ("task_id", 1), ("idx", 1)])
+            checkpoint_tuple = self._tuple(row, pending)
+            if not self._matches(checkpoint_tuple, filter):
+                continue
+            yield checkpoint_tuple
+            if limit is not None:
+                limit -= 1
+                if limit <= 0:
+                    break
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        """
+        Stores a checkpoint and compacts its thread.
+        """
+        row = self._checkpoint_row(config, checkpoint, metadata)
+        checkpoints, writes = self._collections()
+        checkpoints.replace_one(self._writes_query(row), self._stamp(row), upsert=True)
+
+        thread_query = self._thread_query(config)
+        oldest_kept = next(
+            checkpoints.find(thread_query, {"checkpoint_id": 1})
+            .sort("checkpoint_id", DESCENDING).skip(self.max_per_thread - 1).limit(1),
+            None,
+        )
+        if oldest_kept is not None:
+            stale = {**thread_query, "checkpoint_id": {"$lt": oldest_kept["checkpoint_id"]}}
+            checkpoints.delete_many(stale)
+            writes.delete_many(stale)
+        return self._config(row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"])
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        """
+        Stores the writes of a task, pending until the next checkpoint.
+        """
+        _, collection = self._collections()
+        for row, replace in self._write_rows(config, writes, task_id, task_path):
+            key, update = self._write_update(self._stamp(row), replace)
+            collection.update_one(key, update, upsert=True)
+
+    def delete_thread(self, thread_id):
+        """
+        Deletes all checkpoints and writes of a thread.
+        """
+        for collection in self._collections():
+            collection.delete_many({"graph": self.graph, "thread_id": str(thread_id)})
+
+    # Async
+
+    async def aget_tuple(self, config):
+        checkpoints, writes = self._acollections()
+        query = self._thread_query(config)
+        if checkpoint_id := get_checkpoint_id(config):
+            query["checkpoint_id"] = checkpoint_id
+        row = await checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        if row is None:
+            return None
+        pending = await writes.find(self._writes_query(row)).sort(
+            [("task_path", 1), ("task_id", 1), ("idx", 1)]
+        ).to_list(length=None)
+        return self._tuple(row, pending)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoints, writes = self._acollections()
+        async for row in checkpoints.find(self._list_query(config, before)).sort("checkpoint_id", DESCENDING):
+            pending = await writes.find(self._writes_query(row)).sort(
+                [("task_path", 1), ("task_id", 1), ("idx", 1)]
+            ).to_list(length=None)
+            checkpoint_tuple = self._tuple(row, pending)
+            if not self._matches(checkpoint_tuple, filter):
+                continue
+            yield checkpoint_tuple
+            if limit is not None:
+                limit -= 1
+                if limit <= 0:
+                    break
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        row = self._checkpoint_row(config, checkpoint, metadata)
+        checkpoints, writes = self._acollections()
+        await checkpoints.replace_one(self._writes_query(row), self._stamp(row), upsert=True)
+
+        thread_query = self._thread_query(config)
+        kept = await checkpoints.find(thread_query, {"checkpoint_id": 1}).sort(
+            "checkpoint_id", DESCENDING
+        ).skip(self.max_per_thread - 1).limit(1).to_list(length=1)
+        if kept:
+            stale = {**thread_query, "checkpoint_id": {"$lt": kept[0]["checkpoint_id"]}}
+            await checkpoints.delete_many(stale)
+            await writes.delete_many(stale)
+        return self._config(row["thread_id"], row["checkpoint_ns"], row["checkpoint_id"])
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        _, collection = self._acollections()
+        for row, replace in self._write_rows(config, writes, task_id, task_path):
+            key, update = self._write_update(self._stamp(row), replace)
+            await collection.update_one(key, update, upsert=True)
+
+    async def adelete_thread(self, thread_id):
+        for collection in self._acollections():
+            await collection.delete_many({"graph": self.graph, "thread_id": str(thread_id)})
+
+def create_checkpointer(graph, backend=CHECKPOINT_BACKEND):
+    """
+    Creates the checkpointer of a graph for the configured backend.
+
+    Args:
+        graph (str): The graph's name, which keeps its threads apart from other graphs'
+        backend (str): "sqlite", "mongo" or "memory"
+
+    Returns:
+        BaseCheckpointSaver: The checkpointer to compile the graph with
+    """
+    if backend == "mongo":
+        return MongoSaver(graph)
+    if backend == "memory":
+        return MemorySaver()
+    return SQLiteSaver(graph)
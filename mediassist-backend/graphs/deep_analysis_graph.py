@@ -1,15 +1,21 @@
+import asyncio
 from typing import Annotated
 from typing_extensions import TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 
 from agents.deep_research_agent import deep_research_agent_llm, DEEP_RESEARCH_AGENT_SYSTEM_PROMPT
 from agents.anonymizer_agent import anonymize_text
-from storage.client import get_user_profile_data, get_medical_conditions_data, get_nutrition_data_for_period
+from storage.client import (
+    get_user_profile_data, get_medical_conditions_data, get_latest_nutrition_data,
+    summarize_nutrition_for_period
+)
+from storage import aio as storage_aio
 from datetime import datetime, timedelta
+from graphs.checkpointer import create_checkpointer
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
@@ -19,6 +25,12 @@ class State(TypedDict):
 
 graph_builder = StateGraph(State)
 
+# Only the fields that prepare_context puts into the prompt are read from storage
+USER_PROFILE_CONTEXT_FIELDS = {"age": 1, "gender": 1, "height": 1, "weight": 1, "_id": 0}
+MEDICAL_CONDITION_CONTEXT_FIELDS = {"condition_name": 1, "symptoms": 1, "treatment": 1, "prevention": 1, "_id": 0}
+# The number of most recent food names listed in the context
+RECENT_FOOD_ITEMS = 5
+
 def anonymize_content(state: State):
     """
     Anonymizes the report content before further processing.
@@ -34,25 +46,11 @@ def anonymize_content(state: State):
     # Update the state with anonymized content
     return {"report_content": anonymized_content}
 
-def prepare_context(state: State):
+def _context_message(state, user_profile, medical_conditions, nutrition_summary, nutrition_data):
     """
-    Prepares the context for the deep research agent by gathering user profile, medical conditions,
-    and nutrition data. Uses the anonymized report content.
+    Formats the gathered user context and the anonymized report into the prompt
+    for the deep research agent.
     """
-    print("PREPARING CONTEXT FOR DEEP ANALYSIS")
-    
-    # Get user profile data
-    user_profile = get_user_profile_data()
-    
-    # Get medical conditions data
-    medical_conditions = get_medical_conditions_data()
-    
-    # Get nutrition data for the last 30 days
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=30)
-    nutrition_data = get_nutrition_data_for_period(start_date, end_date)
-    
-    # Format the context message
     context_message = f"""
     I need to analyze a medical report with the following user context:
     
@@ -86,33 +84,74 @@ def prepare_context(state: State):
         context_message += "No medical conditions data available.\n"
     
     context_message += "\nNUTRITION DATA (Last 30 days):\n"
-    if nutrition_data:
-        # Summarize nutrition data
-        total_entries = len(nutrition_data)
-        avg_calories = sum(entry.get('calories', 0) for entry in nutrition_data) / total_entries if total_entries > 0 else 0
-        avg_protein = sum(entry.get('protein', 0) for entry in nutrition_data) / total_entries if total_entries > 0 else 0
-        avg_carbs = sum(entry.get('carbohydrates', 0) for entry in nutrition_data) / total_entries if total_entries > 0 else 0
-        avg_fats = sum(entry.get('fats', 0) for entry in nutrition_data) / total_entries if total_entries > 0 else 0
+    if 'average_daily' in nutrition_summary:
+        # Summarize nutrition data from the daily rollup
+        average_daily = nutrition_summary['average_daily']
         
         context_message += f"""
-        Average daily calories: {avg_calories:.2f}
-        Average daily protein: {avg_protein:.2f}g
-        Average daily carbohydrates: {avg_carbs:.2f}g
-        Average daily fats: {avg_fats:.2f}g
-        Number of entries: {total_entries}
+        Average daily calories: {average_daily['calories']:.2f}
+        Average daily protein: {average_daily['protein']:.2f}g
+        Average daily carbohydrates: {average_daily['carbohydrates']:.2f}g
+        Average daily fats: {average_daily['fats']:.2f}g
+        Number of entries: {nutrition_summary['total_entries']}
         """
         
-        # Add some recent food items
-        recent_foods = [entry.get('food_name', 'Unknown food') for entry in nutrition_data[:5]]
+        # Add the most recent food items
+        recent_foods = [entry.get('food_name', 'Unknown food') for entry in nutrition_data]
         context_message += f"Recent food items: {', '.join(recent_foods)}\n"
     else:
         context_message += "No nutrition data available.\n"
     
+    return context_message
+
+def prepare_context(state: State):
+    """
+    Prepares the context for the deep research agent by gathering user profile, medical conditions,
+    and nutrition data. Uses the anonymized report content.
+    """
+    print("PREPARING CONTEXT FOR DEEP ANALYSIS")
+    
+    # Get user profile data
+    user_profile = get_user_profile_data(projection=USER_PROFILE_CONTEXT_FIELDS)
+    
+    # Get medical conditions data
+    medical_conditions = get_medical_conditions_data(projection=MEDICAL_CONDITION_CONTEXT_FIELDS)
+    
+    # Get nutrition data for the last 30 days
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=30)
+    nutrition_summary = summarize_nutrition_for_period(start_date, end_date)
+    nutrition_data = get_latest_nutrition_data(
+        start_date, end_date, RECENT_FOOD_ITEMS, projection={"food_name": 1, "_id": 0}
+    )
+    
     # Create a human message with the context
+    context_message = _context_message(state, user_profile, medical_conditions, nutrition_summary, nutrition_data)
     human_message = HumanMessage(content=context_message)
     
     return {"messages": [human_message]}
 
+async def aprepare_context(state: State):
+    """
+    Async version of prepare_context. The four independent reads are issued
+    concurrently through the Motor-backed storage API.
+    """
+    print("PREPARING CONTEXT FOR DEEP ANALYSIS")
+    
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=30)
+    user_profile, medical_conditions, nutrition_summary, nutrition_data = await asyncio.gather(
+        storage_aio.get_user_profile_data(projection=USER_PROFILE_CONTEXT_FIELDS),
+        storage_aio.get_medical_conditions_data(projection=MEDICAL_CONDITION_CONTEXT_FIELDS),
+        storage_aio.summarize_nutrition_for_period(start_date, end_date),
+        storage_aio.get_latest_nutrition_data(
+            start_date, end_date, RECENT_FOOD_ITEMS, projection={"food_name": 1, "_id": 0}
+        ),
+    )
+    
+    context_message = _context_message(state, user_profile, medical_conditions, nutrition_summary, nutrition_data)
+    return {"messages": [HumanMessage(content=context_message)]}
+
 def deep_research_agent(state: State):
     """
     Analyzes the medical report using the deep research agent.
@@ -127,7 +166,7 @@ def deep_research_agent(state: State):
 
 # Nodes in the graph
 graph_builder.add_node("anonymize_content", anonymize_content)
-graph_builder.add_node("prepare_context", prepare_context)
+graph_builder.add_node("prepare_context", RunnableLambda(prepare_context, afunc=aprepare_context))
 graph_builder.add_node("deep_research_agent", deep_research_agent)
 
 # Edges in the graph
@@ -136,5 +175,5 @@ graph_builder.add_edge("anonymize_content", "prepare_context")
 graph_builder.add_edge("prepare_context", "deep_research_agent")
 graph_builder.add_edge("deep_research_agent", END)
 
-memory = MemorySaver()
+memory = create_checkpointer("deep_analysis")
 graph = graph_builder.compile(checkpointer=memory)
\ No newline at end of file
@@ -1,38 +1,132 @@
+from datetime import timedelta
 from typing import Annotated
 from typing_extensions import TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 
 from agents.input_agent import input_agent_llm, INPUT_AGENT_SYSTEM_PROMPT
 from agents.output_agent import output_agent_llm, OUTPUT_AGENT_SYSTEM_PROMPT
 from agents.orchestrator_agent import orchestrator_agent_llm, ORCHESTRATOR_SYSTEM_PROMPT
 from agents.nutrition_agent import nutrition_agent_llm, NUTRITION_AGENT_SYSTEM_PROMPT
 from agents.insights_agent import insights_agent_llm, INSIGHTS_AGENT_SYSTEM_PROMPT
-from agents.intent_classifier_agent import intent_classifier_llm, INTENT_CLASSIFIER_SYSTEM_PROMPT
-from storage.client import store_nutrition_data, store_medical_conditions_data, store_user_profile_data
+from agents.intent_classifier_agent import intent_classifier_llm, IntentClassification, INTENT_CLASSIFIER_SYSTEM_PROMPT
+from agents.local_intent_classifier import load_intent_model
+from storage.client import (
+    store_nutrition_data, store_medical_conditions_data, store_user_profile_data, store_intent_classification
+)
+from storage import aio as storage_aio
 from agents.medical_conditions_agent import medical_conditions_agent_llm, MEDICAL_CONDITIONS_AGENT_SYSTEM_PROMPT
 from agents.user_profile_agent import user_profile_agent_llm, USER_PROFILE_AGENT_SYSTEM_PROMPT
+from graphs.chat_memory import build_prompt, compact_memory, acompact_memory
+from graphs.checkpointer import create_checkpointer
+from config import (
+    CHAT_ROUTING_MODE, CHAT_ROUTING_MIN_CONFIDENCE,
+    INTENT_MODEL_MIN_CONFIDENCE, INTENT_LOGGING_ENABLED, INTENT_LOG_RETENTION_DAYS
+)
+from metrics import INTENT_CLASSIFICATIONS
+
+# Trained by scripts/train_intent_classifier.py; None until a model has been trained
+intent_model = load_intent_model()
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    # Fast path only: the node classify_intent picked for this turn
+    route: str
+    # Summary of the messages compact_memory removed from the conversation
+    summary: str
+
+def _local_classification(text):
+    """
+    Classifies a message with the local intent model, or returns None when
+    there is no model or it is not confident enough.
+    """
+    if intent_model is None:
+        return None
+    intent, confidence = intent_model.predict(text)
+    if confidence < INTENT_MODEL_MIN_CONFIDENCE:
+        return None
+    try:
+        return IntentClassification(intent=intent, confidence=confidence, explanation="local intent model")
+    except Exception as e:
+        # A model trained on intents the graph no longer routes
+        print(f"Ignoring local intent classification {intent}: {e}")
+        return None
+
+def _classification_log_entry(user_message, classification, source):
+    INTENT_CLASSIFICATIONS.labels(source, classification.intent).inc()
+    return {
+        "message": user_message.content,
+        "intent": classification.intent,
+        "confidence": classification.confidence,
+        "source": source,
+    }
+
+def _classify_message(user_message):
+    """
+    Classifies a message with the local intent model, calling the intent
+    classifier agent only when the model is unsure. The result is logged as
+    training data for the local model.
+    """
+    classification = _local_classification(user_message.content)
+    source = "local"
+    if classification is None:
+        system_message = SystemMessage(content=INTENT_CLASSIFIER_SYSTEM_PROMPT)
+        classification = intent_classifier_llm.invoke([system_message, user_message])
+        source = "llm"
 
-graph_builder = StateGraph(State)
+    entry = _classification_log_entry(user_message, classification, source)
+    if INTENT_LOGGING_ENABLED:
+        try:
+            store_intent_classification(entry, timedelta(days=INTENT_LOG_RETENTION_DAYS))
+        except Exception as e:
+            print(f"Error logging intent classification: {e}")
+    return classification
+
+async def _aclassify_message(user_message):
+    """Async version of _classify_message."""
+    classification = _local_classification(user_message.content)
+    source = "local"
+    if classification is None:
+        system_message = SystemMessage(content=INTENT_CLASSIFIER_SYSTEM_PROMPT)
+        classification = await intent_classifier_llm.ainvoke([system_message, user_message])
+        source = "llm"
+
+    entry = _classification_log_entry(user_message, classification, source)
+    if INTENT_LOGGING_ENABLED:
+        try:
+            await storage_aio.store_intent_classification(entry, timedelta(days=INTENT_LOG_RETENTION_DAYS))
+        except Exception as e:
+            print(f"Error logging intent classification: {e}")
+    return classification
 
 def forward_or_respond(state):
-    """Decides whether to forward the request to another agent or respond directly using LLM-based intent classification."""
+    """Decides whether to forward the request to another agent or respond directly using intent classification."""
     user_message = state["messages"][-2]
-    system_message = SystemMessage(content=INTENT_CLASSIFIER_SYSTEM_PROMPT)
     print(user_message)
     
-    # Use the intent classifier to determine thpe user's intent
-    classification = intent_classifier_llm.invoke([system_message, user_message])
+    # Use the intent classifier to determine the user's intent
+    classification = _classify_message(user_message)
     
     print(f"Intent classification: {classification.intent} (confidence: {classification.confidence})")
     print(f"Explanation: {classification.explanation}")
     
+    return _route_for_intent(classification)
+
+async def aforward_or_respond(state):
+    """Async version of forward_or_respond."""
+    user_message = state["messages"][-2]
+    classification = await _aclassify_message(user_message)
+    
+    print(f"Intent classification: {classification.intent} (confidence: {classification.confidence})")
+    print(f"Explanation: {classification.explanation}")
+    
+    return _route_for_intent(classification)
+
+def _route_for_intent(classification):
+    """Maps an intent classification to the next node in the graph."""
     # Route based on the classified intent
     if classification.intent == "user_profile":
         return "user_profile_agent"
@@ -40,74 +134,162 @@ def forward_or_respond(state):
         return "nutrition_agent"
     elif classification.intent == "medical_conditions":
         return "medical_conditions_agent"
-    elif classification.intent == "data_fetcher":
-        return "data_fetcher_agent"
+    elif classification.intent == "insights":
+        return "insights_agent"
     else:  # general or any other intent
         return "respond"
 
+def _latest_user_message(state):
+    """Returns the most recent message from the user."""
+    for message in reversed(state["messages"]):
+        if isinstance(message, HumanMessage):
+            return message
+    return state["messages"][-1]
+
+def _fast_route(classification):
+    """Maps a fast-path classification to a node, answering directly when unsure."""
+    print(f"Intent classification: {classification.intent} (confidence: {classification.confidence})")
+    # A storage handler acting on a misread message would save wrong data
+    if classification.confidence < CHAT_ROUTING_MIN_CONFIDENCE:
+        return "respond"
+    return _route_for_intent(classification)
+
+def classify_intent(state: State):
+    """
+    Fast path entry: a single structured classification of the user's message
+    picks the handler, replacing the input, orchestrator and router calls.
+    """
+    print("CLASSIFY INTENT")
+    classification = _classify_message(_latest_user_message(state))
+    return {"route": _fast_route(classification)}
+
+async def aclassify_intent(state: State):
+    """Async version of classify_intent."""
+    print("CLASSIFY INTENT")
+    classification = await _aclassify_message(_latest_user_message(state))
+    return {"route": _fast_route(classification)}
+
+def route_from_classification(state: State):
+    """Fast path router: follows the decision made by classify_intent."""
+    return state["route"]
+
 def input_agent(state: State):
     print("INPUT AGENT")
-    system_message = SystemMessage(content=INPUT_AGENT_SYSTEM_PROMPT)
-    return {"messages": [input_agent_llm.invoke([system_message] + state["messages"])]}
+    return {"messages": [input_agent_llm.invoke(build_prompt(INPUT_AGENT_SYSTEM_PROMPT, state))]}
+
+async def ainput_agent(state: State):
+    print("INPUT AGENT")
+    return {"messages": [await input_agent_llm.ainvoke(build_prompt(INPUT_AGENT_SYSTEM_PROMPT, state))]}
 
 def output_agent(state: State):
     print("OUTPUT AGENT")
     print(state["messages"][-1])
-    system_message = SystemMessage(content=OUTPUT_AGENT_SYSTEM_PROMPT)
-    return {"messages": [output_agent_llm.invoke([system_message] + state["messages"])]}
+    return {"messages": [output_agent_llm.invoke(build_prompt(OUTPUT_AGENT_SYSTEM_PROMPT, state))]}
+
+async def aoutput_agent(state: State):
+    print("OUTPUT AGENT")
+    return {"messages": [await output_agent_llm.ainvoke(build_prompt(OUTPUT_AGENT_SYSTEM_PROMPT, state))]}
 
 def orchestrator_agent(state: State):
     print("ORCHESTRATOR AGENT")
-    system_message = SystemMessage(content=ORCHESTRATOR_SYSTEM_PROMPT)
-    return {"messages": [orchestrator_agent_llm.invoke([system_message] + state["messages"])]}
+    return {"messages": [orchestrator_agent_llm.invoke(build_prompt(ORCHESTRATOR_SYSTEM_PROMPT, state))]}
+
+async def aorchestrator_agent(state: State):
+    print("ORCHESTRATOR AGENT")
+    return {"messages": [await orchestrator_agent_llm.ainvoke(build_prompt(ORCHESTRATOR_SYSTEM_PROMPT, state))]}
+
+# On the fast path these acknowledgements are the reply the user sees. The LLM may
+# leave any value out, so missing values are skipped rather than formatted.
+NUTRITION_ACK_FIELDS = [
+    ("calories", "kcal"), ("protein", "g protein"), ("carbohydrates", "g carbohydrates"), ("fats", "g fat")
+]
+
+def _nutrition_ack(data):
+    food_name = data.get('food_name') or "your food"
+    amounts = [
+        f"{data[field]:g} {unit}" for field, unit in NUTRITION_ACK_FIELDS
+        if isinstance(data.get(field), (int, float))
+    ]
+    if not amounts:
+        return f"Got it, I've logged {food_name}."
+    if len(amounts) > 1:
+        amounts = [", ".join(amounts[:-1]), amounts[-1]]
+    return f"Got it, I've logged {food_name}: {' and '.join(amounts)}."
+
+def _medical_conditions_ack(data):
+    return f"Thanks, I've added {data.get('condition_name') or 'this condition'} to your medical history."
 
 def nutrition_agent(state: State):
     print("NUTRITION AGENT")
-    system_message = SystemMessage(content=NUTRITION_AGENT_SYSTEM_PROMPT)
-    response = nutrition_agent_llm.invoke([system_message] + state["messages"])
+    response = nutrition_agent_llm.invoke(build_prompt(NUTRITION_AGENT_SYSTEM_PROMPT, state))
     nutrition_data = response.dict()
     try:
         store_nutrition_data(nutrition_data)
-        response = AIMessage(content="Nutrition data stored successfully.")
     except Exception as e:
         print(f"Error storing nutrition data: {e}")
-        response = AIMessage(content="Failed to store nutrition data.")
-        return {"messages": [system_message] + state["messages"] + [response]}
+        return {"messages": [AIMessage(content="Failed to store nutrition data.")]}
 
-    response = AIMessage(content="Nutrition data stored successfully.")
-    return {"messages": [system_message] + state["messages"] + [response]}
+    return {"messages": [AIMessage(content=_nutrition_ack(nutrition_data))]}
+
+async def anutrition_agent(state: State):
+    print("NUTRITION AGENT")
+    response = await nutrition_agent_llm.ainvoke(build_prompt(NUTRITION_AGENT_SYSTEM_PROMPT, state))
+    nutrition_data = response.dict()
+    try:
+        await storage_aio.store_nutrition_data(nutrition_data)
+    except Exception as e:
+        print(f"Error storing nutrition data: {e}")
+        return {"messages": [AIMessage(content="Failed to store nutrition data.")]}
+
+    return {"messages": [AIMessage(content=_nutrition_ack(nutrition_data))]}
 
 def medical_conditions_agent(state: State):
     print("MEDICAL CONDITIONS AGENT")
-    system_message = SystemMessage(content=MEDICAL_CONDITIONS_AGENT_SYSTEM_PROMPT)
-    llm_response = medical_conditions_agent_llm.invoke([system_message] + state["messages"])
+    llm_response = medical_conditions_agent_llm.invoke(build_prompt(MEDICAL_CONDITIONS_AGENT_SYSTEM_PROMPT, state))
     medical_conditions_data = llm_response.dict()
     try:
         store_medical_conditions_data(medical_conditions_data)
-        response = AIMessage(content="Medical conditions data stored successfully.") 
     except Exception as e:
         print(f"Error storing medical conditions data: {e}")
-        response = AIMessage(content="Failed to store medical conditions data.")
-        return {"messages": [system_message] + state["messages"] + [response]}
+        return {"messages": [AIMessage(content="Failed to store medical conditions data.")]}
+
+    return {"messages": [AIMessage(content=_medical_conditions_ack(medical_conditions_data))]}
+
+async def amedical_conditions_agent(state: State):
+    print("MEDICAL CONDITIONS AGENT")
+    llm_response = await medical_conditions_agent_llm.ainvoke(build_prompt(MEDICAL_CONDITIONS_AGENT_SYSTEM_PROMPT, state))
+    medical_conditions_data = llm_response.dict()
+    try:
+        await storage_aio.store_medical_conditions_data(medical_conditions_data)
+    except Exception as e:
+        print(f"Error storing medical conditions data: {e}")
+        return {"messages": [AIMessage(content="Failed to store medical conditions data.")]}
 
-    return {"messages": [system_message] + state["messages"] + [response]}
+    return {"messages": [AIMessage(content=_medical_conditions_ack(medical_conditions_data))]}
 
 def insights_agent(state: State):
     """
     Handles nutrition-related queries by analyzing nutrition data and providing actionable insights.
     """
     print("INSIGHTS AGENT")
-    system_message = SystemMessage(content=INSIGHTS_AGENT_SYSTEM_PROMPT)
     
-    # Get response from the insights agent
-    response = insights_agent_llm.invoke([system_message] + state["messages"])
+    # Get response from the insights agent; returning the LLM's own message lets
+    # the chat stream recognise the tokens it already sent
+    response = insights_agent_llm.invoke(build_prompt(INSIGHTS_AGENT_SYSTEM_PROMPT, state))
     
-    return {"messages": state["messages"] + [AIMessage(content=response.content)]}
+    return {"messages": [response]}
+
+async def ainsights_agent(state: State):
+    """
+    Async version of insights_agent.
+    """
+    print("INSIGHTS AGENT")
+    response = await insights_agent_llm.ainvoke(build_prompt(INSIGHTS_AGENT_SYSTEM_PROMPT, state))
+    return {"messages": [response]}
 
 def user_profile_agent(state: State):
     print("USER PROFILE AGENT")
-    system_message = SystemMessage(content=USER_PROFILE_AGENT_SYSTEM_PROMPT)
-    llm_response = user_profile_agent_llm.invoke([system_message] + state["messages"])
+    llm_response = user_profile_agent_llm.invoke(build_prompt(USER_PROFILE_AGENT_SYSTEM_PROMPT, state))
     user_profile_data = llm_response.dict()
     
     try:
@@ -117,39 +299,98 @@ def user_profile_agent(state: State):
     except Exception as e:
         print(f"Error storing user profile data: {e}")
         response = AIMessage(content="I'm sorry, I couldn't save your profile information. Please try again.")
-        return {"messages": [system_message] + state["messages"] + [response]}
+        return {"messages": [response]}
 
-    return {"messages": [system_message] + state["messages"] + [response]}
+    return {"messages": [response]}
 
-# Nodes in the graph
-graph_builder.add_node("input_agent", input_agent)
-graph_builder.add_node("orchestrator_agent", orchestrator_agent)
-graph_builder.add_node("output_agent", output_agent)
-graph_builder.add_node("nutrition_agent", nutrition_agent)
-graph_builder.add_node("medical_conditions_agent", medical_conditions_agent)
-graph_builder.add_node("user_profile_agent", user_profile_agent)
-graph_builder.add_node("insights_agent", insights_agent)
+async def auser_profile_agent(state: State):
+    print("USER PROFILE AGENT")
+    llm_response = await user_profile_agent_llm.ainvoke(build_prompt(USER_PROFILE_AGENT_SYSTEM_PROMPT, state))
+    try:
+        await storage_aio.store_user_profile_data(llm_response.dict())
+        response = AIMessage(content="Thank you! I've updated your profile information.")
+    except Exception as e:
+        print(f"Error storing user profile data: {e}")
+        response = AIMessage(content="I'm sorry, I couldn't save your profile information. Please try again.")
+    return {"messages": [response]}
+
+# Handlers that store data and reply with a fixed acknowledgement
+STORAGE_NODES = ["nutrition_agent", "medical_conditions_agent", "user_profile_agent"]
 
-# Edges in the graph
-graph_builder.add_edge(START, "input_agent")
-graph_builder.add_edge("input_agent", "orchestrator_agent")
+# The nodes whose last message is the reply to the user, per routing mode
+RESPONSE_NODES_BY_MODE = {
+    "legacy": ("output_agent",),
+    "fast": ("output_agent", "insights_agent", *STORAGE_NODES),
+}
 
-graph_builder.add_conditional_edges("orchestrator_agent", forward_or_respond, {
+def _add_handler_nodes(graph_builder):
+    # Each node has an async twin that graph.ainvoke() uses, so the async server
+    # awaits LLM and database calls instead of blocking a thread.
+    graph_builder.add_node("output_agent", RunnableLambda(output_agent, afunc=aoutput_agent))
+    graph_builder.add_node("nutrition_agent", RunnableLambda(nutrition_agent, afunc=anutrition_agent))
+    graph_builder.add_node("medical_conditions_agent", RunnableLambda(medical_conditions_agent, afunc=amedical_conditions_agent))
+    graph_builder.add_node("user_profile_agent", RunnableLambda(user_profile_agent, afunc=auser_profile_agent))
+    graph_builder.add_node("insights_agent", RunnableLambda(insights_agent, afunc=ainsights_agent))
+    graph_builder.add_node("compact_memory", RunnableLambda(compact_memory, afunc=acompact_memory))
+
+HANDLER_ROUTES = {
     "nutrition_agent": "nutrition_agent",
     "medical_conditions_agent": "medical_conditions_agent",
     "user_profile_agent": "user_profile_agent",
     "insights_agent": "insights_agent",
     "respond": "output_agent",
-})
+}
+
+def build_legacy_graph(checkpointer):
+    """
+    The original pipeline: input agent, orchestrator, intent classifier, handler,
+    then the output agent rewrites the handler's result; up to five LLM calls.
+    Every turn ends with compact_memory, which keeps the conversation bounded.
+    """
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("input_agent", RunnableLambda(input_agent, afunc=ainput_agent))
+    graph_builder.add_node("orchestrator_agent", RunnableLambda(orchestrator_agent, afunc=aorchestrator_agent))
+    _add_handler_nodes(graph_builder)
+
+    graph_builder.add_edge(START, "input_agent")
+    graph_builder.add_edge("input_agent", "orchestrator_agent")
+    graph_builder.add_conditional_edges(
+        "orchestrator_agent", RunnableLambda(forward_or_respond, afunc=aforward_or_respond), HANDLER_ROUTES
+    )
+    for node in STORAGE_NODES + ["insights_agent"]:
+        graph_builder.add_edge(node, "output_agent")
+    graph_builder.add_edge("output_agent", "compact_memory")
+    graph_builder.add_edge("compact_memory", END)
+    return graph_builder.compile(checkpointer=checkpointer)
 
-graph_builder.add_edge("nutrition_agent", "output_agent")
-graph_builder.add_edge("medical_conditions_agent", "output_agent")
-graph_builder.add_edge("user_profile_agent", "output_agent")
-graph_builder.add_edge("insights_agent", "output_agent")
-graph_builder.add_edge("output_agent", END)
+def build_fast_graph(checkpointer):
+    """
+    The fast path: one intent classification call, then the handler answers
+    directly. Storage handlers reply with their acknowledgement, so a message
+    takes two LLM calls instead of up to five.
+    """
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("classify_intent", RunnableLambda(classify_intent, afunc=aclassify_intent))
+    _add_handler_nodes(graph_builder)
+
+    graph_builder.add_edge(START, "classify_intent")
+    graph_builder.add_conditional_edges("classify_intent", route_from_classification, HANDLER_ROUTES)
+    for node in STORAGE_NODES + ["insights_agent", "output_agent"]:
+        graph_builder.add_edge(node, "compact_memory")
+    graph_builder.add_edge("compact_memory", END)
+    return graph_builder.compile(checkpointer=checkpointer)
+
+def build_graph(mode, checkpointer):
+    """
+    Builds the chat graph for a routing mode ("fast" or "legacy").
+    """
+    if mode == "legacy":
+        return build_legacy_graph(checkpointer)
+    return build_fast_graph(checkpointer)
 
-memory = MemorySaver()
-graph = graph_builder.compile(checkpointer=memory)
+memory = create_checkpointer("frontend")
+graph = build_graph(CHAT_ROUTING_MODE, memory)
+RESPONSE_NODES = RESPONSE_NODES_BY_MODE.get(CHAT_ROUTING_MODE, RESPONSE_NODES_BY_MODE["fast"])
 
 # Chat part
 
@@ -0,0 +1,180 @@
+"""
+Persistent cache of LLM responses.
+
+Agents whose calls are deterministic enough to reuse (the same prompt over the same
+data gives an equally good answer) opt in by passing cache=llm_cache("agent_name")
+to their chat model. LangChain then looks every call up before sending it to the
+provider and stores the response afterwards.
+
+Responses are keyed on the model and its parameters, including any bound tools or
+structured output schema, and on the message list. Message IDs, tool call IDs and
+response metadata are left out of the key, since they are different on every run
+even when the conversation is the same. Entries live in an SQLite file shared by
+all processes, expire after LLM_CACHE_TTL_SECONDS, and the least recently used
+entries are evicted beyond LLM_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from config import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+from metrics import LLM_CACHE_REQUESTS
+
+# Fields of serialized messages that differ between runs of the same conversation
+VOLATILE_MESSAGE_FIELDS = {"id", "tool_call_id", "response_metadata", "usage_metadata"}
+
+def _normalise(value):
+    """
+    Strips the volatile fields from serialized messages, recursively.
+    """
+    if isinstance(value, list):
+        return [_normalise(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if "lc" in value and "kwargs" in value:
+        # A serialized object: "id" is its class path, which is kept
+        return {**value, "kwargs": _normalise(value["kwargs"])}
+
+    normalised = {}
+    for key, item in value.items():
+        if key in VOLATILE_MESSAGE_FIELDS:
+            continue
+        if key == "content" and isinstance(item, str):
+            item = item.strip()
+        normalised[key] = _normalise(item)
+    return normalised
+
+def cache_key(prompt, llm_string):
+    """
+    Returns the cache key of a call.
+
+    Args:
+        prompt (str): The serialized message list, as passed to BaseCache.lookup
+        llm_string (str): The model, its parameters and bound tools, as passed to BaseCache.lookup
+
+    Returns:
+        str: A SHA-256 hex digest
+    """
+    try:
+        prompt = json.dumps(_normalise(json.loads(prompt)), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        pass
+    return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+class SQLiteLLMCache(BaseCache):
+    """
+    LangChain cache backed by an SQLite file, with a TTL and LRU eviction.
+    """
+
+    def __init__(self, agent, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            agent (str): The agent using the cache, for metrics
+            path (str): The SQLite database file
+            ttl (float): How long an entry is used, in seconds
+            max_entries (int): How many entries are kept
+        """
+        self.agent = agent
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Returns this thread's connection, creating the database on first use.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        # WAL lets readers in other processes proceed while one process writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, agent TEXT, value TEXT, created_at REAL, expires_at REAL, last_used REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def lookup(self, prompt, llm_string):
+        """
+        Returns the cached generations of a call, or None.
+        """
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+                generations = loads(row[0])
+        except Exception as e:
+            print(f"Error reading the LLM cache: {e}")
+            row = None
+
+        if row is None:
+            LLM_CACHE_REQUESTS.labels(self.agent, "miss").inc()
+            return None
+
+        LLM_CACHE_REQUESTS.labels(self.agent, "hit").inc()
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is not None:
+                # Lets LLMMetricsCallback tell cached responses from provider calls
+                message.response_metadata = {**message.response_metadata, "cache_hit": True}
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        """
+        Stores the generations of a call and evicts expired and surplus entries.
+        """
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, agent, value, created_at, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.agent, dumps(list(return_val)), now, now + self.ttl, now)
+            )
+            connection.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            surplus = connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if surplus > 0:
+                connection.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                    (surplus,)
+                )
+        except Exception as e:
+            print(f"Error writing the LLM cache: {e}")
+
+    def clear(self, **kwargs):
+        """
+        Removes this agent's entries.
+        """
+        self._connection().execute("DELETE FROM llm_cache WHERE agent = ?", (self.agent,))
+
+def llm_cache(agent):
+    """
+    Returns the response cache for an agent's chat model, or None when caching is
+    disabled (LLM_CACHE_ENABLED).
+
+    Args:
+        agent (str): The agent's name, used in the hit/miss metrics
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    return SQLiteLLMCache(agent)
@@ -0,0 +1,232 @@
+"""
+Prometheus metrics for MediAssist.
+
+Defines the application's metrics and the helpers that record them: a decorator
+timing storage calls, a LangChain callback handler recording LLM calls per agent,
+and callback gauges computed when /metrics is scraped. The /metrics route itself
+is registered by api/app.py.
+
+When PROMETHEUS_MULTIPROC_DIR is set (multi-process servers such as gunicorn),
+metrics from all worker processes are aggregated at scrape time.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# LLM calls take seconds to minutes, much longer than the default buckets allow for
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 90, 150, 300)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "mediassist_http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route",
+    ["method", "route", "status"],
+    buckets=LLM_BUCKETS,
+)
+
+STORAGE_CALL_SECONDS = Histogram(
+    "mediassist_storage_call_duration_seconds",
+    "Time spent in storage functions",
+    ["function", "backend", "outcome"],
+)
+
+LLM_CALLS = Counter(
+    "mediassist_llm_calls_total",
+    "LLM calls, by agent and outcome (ok, error, or cached for responses from the LLM cache)",
+    ["agent", "outcome"],
+)
+
+LLM_CALL_SECONDS = Histogram(
+    "mediassist_llm_call_duration_seconds",
+    "LLM call latency, by agent",
+    ["agent"],
+    buckets=LLM_BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    "mediassist_llm_tokens_total",
+    "LLM tokens used, by agent and token type (prompt or completion)",
+    ["agent", "type"],
+)
+
+LLM_CACHE_REQUESTS = Counter(
+    "mediassist_llm_cache_requests_total",
+    "LLM response cache lookups (see llm_cache.py), by agent and result (hit or miss)",
+    ["agent", "result"],
+)
+
+INTENT_CLASSIFICATIONS = Counter(
+    "mediassist_intent_classifications_total",
+    "Chat message intent classifications, by source (local model or llm) and intent",
+    ["source", "intent"],
+)
+
+ADMISSION_REJECTIONS = Counter(
+    "mediassist_admission_rejections_total",
+    "Requests and LLM calls turned away by a concurrency limiter (see admission.py)",
+    ["limiter", "reason"],
+)
+
+def timed_storage_call(function):
+    """
+    Decorator recording the duration and outcome of a storage function in
+    STORAGE_CALL_SECONDS. Works for both regular functions and coroutines.
+    """
+    backend = "async" if inspect.iscoroutinefunction(function) else "sync"
+
+    def observe(started, outcome):
+        STORAGE_CALL_SECONDS.labels(function.__name__, backend, outcome).observe(time.perf_counter() - started)
+
+    if backend == "async":
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await function(*args, **kwargs)
+            except Exception:
+                observe(started, "error")
+                raise
+            observe(started, "ok")
+            return result
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            observe(started, "error")
+            raise
+        observe(started, "ok")
+        return result
+    return wrapper
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    LangChain callback handler recording call count, latency and token usage of
+    one agent's LLM. Attach it with callbacks=[LLMMetricsCallback("agent_name")].
+    """
+
+    # Record inline for async runs too, instead of in an executor thread
+    run_inline = True
+
+    def __init__(self, agent):
+        self.agent = agent
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id):
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def _finish(self, run_id, outcome):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        LLM_CALLS.labels(self.agent, outcome).inc()
+        # Latency is that of the provider; cached responses would only drag it down
+        if started is not None and outcome != "cached":
+            LLM_CALL_SECONDS.labels(self.agent).observe(time.perf_counter() - started)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if _cache_hit(response):
+            # Served from the LLM response cache: no provider call, no tokens spent
+            self._finish(run_id, "cached")
+            return
+        self._finish(run_id, "ok")
+        prompt_tokens, completion_tokens = _token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.labels(self.agent, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(self.agent, "completion").inc(completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+def _cache_hit(response):
+    """
+    Whether an LLMResult was served from the LLM response cache.
+    """
+    return any(
+        getattr(getattr(generation, "message", None), "response_metadata", {}).get("cache_hit")
+        for generations in response.generations
+        for generation in generations
+    )
+
+def _token_usage(response):
+    """
+    Extracts (prompt_tokens, completion_tokens) from an LLMResult, from the
+    messages' usage metadata or, failing that, the provider's token_usage.
+    """
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if prompt_tokens or completion_tokens:
+        return prompt_tokens, completion_tokens
+
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens", 0) or 0, token_usage.get("completion_tokens", 0) or 0
+
+class _CallbackGaugeCollector:
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def collect(self):
+        gauge = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        try:
+            for labels, value in self.callback():
+                gauge.add_metric(labels, value)
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+        yield gauge
+
+_callback_gauges = []
+
+def register_callback_gauge(name, documentation, labelnames, callback):
+    """
+    Registers a gauge whose samples are computed by callback() on every scrape.
+
+    Args:
+        name (str): The metric name
+        documentation (str): The metric help text
+        labelnames (list): The label names
+        callback (callable): Returns an iterable of (label_values, value) pairs
+    """
+    collector = _CallbackGaugeCollector(name, documentation, labelnames, callback)
+    _callback_gauges.append(collector)
+    REGISTRY.register(collector)
+
+def render_metrics():
+    """
+    Renders all metrics in the Prometheus text exposition format.
+
+    Returns:
+        A tuple containing (body, content_type)
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _callback_gauges:
+            registry.register(collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,137 @@
+import sys
+import os
+import time
+import uuid
+import argparse
+import statistics
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+import graphs.frontend_graph as frontend_graph
+from agents.intent_classifier_agent import IntentClassification
+from storage.models import NutritionData, MedicalConditionData, UserProfileData
+
+DEFAULT_ITERATIONS = 5
+
+# One message per route of the chat graph
+SAMPLE_MESSAGES = [
+    "Hi there!",
+    "I had a bowl of oatmeal with a banana for breakfast",
+    "I am 35 years old and weigh 70kg",
+    "I was diagnosed with type 2 diabetes last year",
+    "How has my protein intake looked over the past week?",
+    "Is it better to walk in the morning or in the evening?",
+]
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts the LLM calls made while running the graph."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+class SimulatedLLM:
+    """
+    Stands in for an agent's LLM: waits a fixed time, like a provider round trip,
+    then returns a canned response. Used with --simulate-latency.
+    """
+
+    def __init__(self, latency, respond, counter):
+        self.latency = latency
+        self.respond = respond
+        self.counter = counter
+
+    def invoke(self, messages, config=None):
+        self.counter.calls += 1
+        time.sleep(self.latency)
+        return self.respond(messages)
+
+def _classify(messages):
+    """Keyword intent classification standing in for the intent classifier."""
+    text = messages[-1].content.lower()
+    for intent, keywords in (
+        ("nutrition", ("had", "ate", "breakfast", "lunch", "dinner")),
+        ("user_profile", ("years old", "weigh")),
+        ("medical_conditions", ("diagnosed", "diabetes")),
+        ("insights", ("intake", "past week")),
+    ):
+        if any(keyword in text for keyword in keywords):
+            return IntentClassification(intent=intent, confidence=0.9, explanation="keyword match")
+    return IntentClassification(intent="general", confidence=0.9, explanation="no keyword matched")
+
+def simulate_llms(latency, counter):
+    """
+    Replaces the LLMs used by the chat graph with SimulatedLLMs.
+    """
+    def reply(text):
+        return lambda messages: AIMessage(content=text)
+
+    frontend_graph.input_agent_llm = SimulatedLLM(latency, lambda messages: AIMessage(
+        content=f"USER_INTENT: input\nDETAILS: {messages[-1].content}"
+    ), counter)
+    frontend_graph.orchestrator_agent_llm = SimulatedLLM(latency, reply("output_agent"), counter)
+    frontend_graph.output_agent_llm = SimulatedLLM(latency, reply("Here is my answer."), counter)
+    frontend_graph.insights_agent_llm = SimulatedLLM(latency, reply("Your protein intake was steady."), counter)
+    frontend_graph.intent_classifier_llm = SimulatedLLM(latency, _classify, counter)
+    frontend_graph.nutrition_agent_llm = SimulatedLLM(latency, lambda messages: NutritionData(
+        food_name="Oatmeal with banana", calories=255, protein=6, carbohydrates=54, fats=3
+    ), counter)
+    frontend_graph.medical_conditions_agent_llm = SimulatedLLM(latency, lambda messages: MedicalConditionData(
+        condition_name="Type 2 diabetes", symptoms="", treatment="", prevention=""
+    ), counter)
+    frontend_graph.user_profile_agent_llm = SimulatedLLM(latency, lambda messages: UserProfileData(
+        age=35, weight=70
+    ), counter)
+
+def run(mode, iterations, counter):
+    """Send every sample message through the graph of a routing mode and print latency percentiles."""
+    graph = frontend_graph.build_graph(mode, MemorySaver())
+
+    timings = []
+    calls_before = counter.calls
+    for _ in range(iterations):
+        for message in SAMPLE_MESSAGES:
+            # A fresh thread per message, so the conversation history does not grow between runs
+            config = {"configurable": {"thread_id": str(uuid.uuid4())}, "callbacks": [counter]}
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=message)]}, config=config)
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+    calls_per_message = (counter.calls - calls_before) / len(timings)
+    print(f"{mode:<8} mean {statistics.mean(timings):9.1f} ms   p50 {statistics.median(timings):9.1f} ms   "
+          f"p95 {p95:9.1f} ms   {calls_per_message:.1f} LLM calls per message")
+    return statistics.mean(timings)
+
+def main():
+    """Compare chat turn latency of the legacy pipeline against the fast-path router"""
+    parser = argparse.ArgumentParser(description="Benchmark the chat graph routing modes")
+    parser.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS,
+                        help="How many times each sample message is sent per mode")
+    parser.add_argument("--simulate-latency", type=float, metavar="SECONDS",
+                        help="Replace the LLMs with stand-ins that take this long per call, "
+                             "instead of calling the configured provider")
+    args = parser.parse_args()
+
+    counter = LLMCallCounter()
+    if args.simulate_latency is not None:
+        simulate_llms(args.simulate_latency, counter)
+
+    print(f"Sending {len(SAMPLE_MESSAGES)} messages {args.iterations} times per routing mode...")
+    before = run("legacy", args.iterations, counter)
+    after = run("fast", args.iterations, counter)
+    print(f"Speed-up: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    main()
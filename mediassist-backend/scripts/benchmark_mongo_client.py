@@ -0,0 +1,63 @@
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage.client import create_mongo_client, get_mongo_client, close_mongo_client
+
+DEFAULT_ITERATIONS = 200
+
+def lookup_with_new_client():
+    """
+    The old behaviour: build a fresh MongoClient for every storage call.
+    The client is closed afterwards so the benchmark itself does not leak pools.
+    """
+    client = create_mongo_client()
+    try:
+        client["user_profile_db"]["user_profile_data"].find_one(sort=[("timestamp", -1)])
+    finally:
+        client.close()
+
+def lookup_with_shared_client():
+    """
+    The new behaviour: reuse the process-wide pooled client.
+    """
+    client = get_mongo_client()
+    client["user_profile_db"]["user_profile_data"].find_one(sort=[("timestamp", -1)])
+
+def run(label, func, iterations):
+    """Time a storage call and print latency percentiles in milliseconds."""
+    # Warm up once so the shared client's initial connection is not counted
+    func()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<24} mean {statistics.mean(timings):8.3f} ms   "
+          f"p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
+    return statistics.mean(timings)
+
+def main():
+    """Compare per-call latency of a client-per-call against the shared client"""
+    parser = argparse.ArgumentParser(description="Benchmark MongoDB client reuse")
+    parser.add_argument("-n", "--iterations", type=int, default=DEFAULT_ITERATIONS)
+    args = parser.parse_args()
+
+    print(f"Running {args.iterations} find_one calls per mode...")
+    before = run("new client per call", lookup_with_new_client, args.iterations)
+    after = run("shared pooled client", lookup_with_shared_client, args.iterations)
+    print(f"Speed-up: {before / after:.1f}x")
+
+    close_mongo_client()
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ from datetime import datetime, timedelta
 # Add the mediassist-backend directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from storage.client import get_mongo_client, store_nutrition_data, store_medical_conditions_data, store_user_profile_data
+from storage.client import get_mongo_client, store_nutrition_data_many, store_medical_conditions_data_many, store_user_profile_data
 from storage.models import NutritionData, MedicalConditionData, UserProfileData
 
 # Configuration
@@ -114,10 +114,10 @@ def generate_nutrition_data(days):
                 )
             )
             
-            # Store the nutrition data
-            store_nutrition_data(data.dict())
             nutrition_data.append(data)
     
+    # Store all nutrition data in batches
+    store_nutrition_data_many(data.dict() for data in nutrition_data)
     print(f"Generated and stored {len(nutrition_data)} nutrition data entries.")
     return nutrition_data
 
@@ -139,8 +139,6 @@ def generate_medical_conditions(days):
         timestamp=date
     )
     
-    # Store the medical condition data
-    store_medical_conditions_data(data.dict())
     medical_data.append(data)
     
     # Add 1-2 temporary conditions randomly throughout the period
@@ -160,10 +158,10 @@ def generate_medical_conditions(days):
             timestamp=date
         )
         
-        # Store the medical condition data
-        store_medical_conditions_data(data.dict())
         medical_data.append(data)
     
+    # Store all medical condition data in batches
+    store_medical_conditions_data_many(data.dict() for data in medical_data)
     print(f"Generated and stored {len(medical_data)} medical condition entries.")
     return medical_data
 
@@ -0,0 +1,27 @@
+import sys
+import os
+import argparse
+from datetime import datetime
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage.client import rebuild_nutrition_daily_rollup
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD command line argument"""
+    return datetime.strptime(value, "%Y-%m-%d")
+
+def main():
+    """Rebuild the nutrition_daily_rollup collection from raw nutrition entries"""
+    parser = argparse.ArgumentParser(description="Backfill or repair the daily nutrition rollup")
+    parser.add_argument("--start", type=parse_date, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_date, help="Last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    print("Rebuilding daily nutrition rollup...")
+    days = rebuild_nutrition_daily_rollup(args.start, args.end)
+    print(f"Rebuilt rollup for {days} days.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import statistics
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.local_intent_classifier import IntentModel, DEFAULT_N_FEATURES
+from config import INTENT_MODEL_PATH, INTENT_MODEL_MIN_CONFIDENCE
+
+DEFAULT_MIN_CONFIDENCE = 0.8
+DEFAULT_TEST_FRACTION = 0.2
+DEFAULT_EPOCHS = 15
+
+def load_logged_samples(min_confidence):
+    """
+    Reads the messages the LLM intent classifier labelled from MongoDB.
+    Classifications made by the local model are left out, so it never learns
+    from its own mistakes.
+    """
+    from storage.client import get_intent_classifications
+    rows = get_intent_classifications(
+        source="llm", min_confidence=min_confidence, projection={"_id": 0, "message": 1, "intent": 1}
+    )
+    return [(row["message"], row["intent"]) for row in rows if row.get("message")]
+
+def load_file_samples(path):
+    """
+    Reads samples from a JSON Lines file with a "message" and an "intent" per line.
+    """
+    samples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                samples.append((row["message"], row["intent"]))
+    return samples
+
+def split_samples(samples, test_fraction, seed):
+    """Shuffles the samples and splits them into (train, test)."""
+    samples = list(samples)
+    random.Random(seed).shuffle(samples)
+    test_size = int(len(samples) * test_fraction)
+    return samples[test_size:], samples[:test_size]
+
+def evaluate(model, samples, threshold):
+    """
+    Prints accuracy, per-intent precision and recall, prediction latency, and how
+    many messages the model would answer without the LLM at the confidence threshold.
+    """
+    predictions = []
+    timings = []
+    for message, _ in samples:
+        start = time.perf_counter()
+        predictions.append(model.predict(message))
+        timings.append((time.perf_counter() - start) * 1_000_000)
+
+    correct = sum(1 for (_, intent), (predicted, _) in zip(samples, predictions) if intent == predicted)
+    print(f"Accuracy: {correct / len(samples):.1%} on {len(samples)} messages")
+
+    print(f"{'intent':<20} {'precision':>9} {'recall':>9} {'support':>8}")
+    for intent in sorted({intent for _, intent in samples} | set(model.classes)):
+        true_positives = sum(
+            1 for (_, actual), (predicted, _) in zip(samples, predictions) if actual == predicted == intent
+        )
+        predicted_count = sum(1 for predicted, _ in predictions if predicted == intent)
+        support = sum(1 for _, actual in samples if actual == intent)
+        precision = true_positives / predicted_count if predicted_count else 0.0
+        recall = true_positives / support if support else 0.0
+        print(f"{intent:<20} {precision:>9.1%} {recall:>9.1%} {support:>8}")
+
+    timings.sort()
+    p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+    print(f"Latency: mean {statistics.mean(timings):.1f} µs   p50 {statistics.median(timings):.1f} µs   "
+          f"p95 {p95:.1f} µs")
+
+    confident = [
+        (intent, predicted) for (_, intent), (predicted, confidence) in zip(samples, predictions)
+        if confidence >= threshold
+    ]
+    coverage = len(confident) / len(samples)
+    confident_accuracy = (
+        sum(1 for intent, predicted in confident if intent == predicted) / len(confident) if confident else 0.0
+    )
+    print(f"At confidence >= {threshold:g}: {coverage:.1%} of messages skip the LLM, "
+          f"{confident_accuracy:.1%} of those correctly")
+
+def main():
+    """Train the local intent model from logged classifications and report how well it does"""
+    parser = argparse.ArgumentParser(description="Train and evaluate the local intent classifier")
+    parser.add_argument("--data", metavar="FILE",
+                        help="JSON Lines file with message and intent fields, instead of the logged classifications")
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help="Only train on logged LLM classifications at least this confident")
+    parser.add_argument("--test-fraction", type=float, default=DEFAULT_TEST_FRACTION,
+                        help="Share of the samples held out for evaluation")
+    parser.add_argument("--epochs", type=int, default=DEFAULT_EPOCHS, help="Training passes over the samples")
+    parser.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES, help="Number of hash buckets")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the train/test split and shuffling")
+    parser.add_argument("--threshold", type=float, default=INTENT_MODEL_MIN_CONFIDENCE,
+                        help="Confidence the chat graph requires before skipping the LLM")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH, help="Where the trained model is written")
+    parser.add_argument("--evaluate-only", action="store_true",
+                        help="Evaluate the model at --output on all samples instead of training a new one")
+    args = parser.parse_args()
+
+    samples = load_file_samples(args.data) if args.data else load_logged_samples(args.min_confidence)
+    if not samples:
+        print("No samples to train on; chat messages are logged as they are classified")
+        sys.exit(1)
+    print(f"Loaded {len(samples)} samples")
+
+    if args.evaluate_only:
+        evaluate(IntentModel.load(args.output), samples, args.threshold)
+        return
+
+    train, test = split_samples(samples, args.test_fraction, args.seed)
+    start = time.perf_counter()
+    model = IntentModel.train(train, epochs=args.epochs, n_features=args.n_features, seed=args.seed)
+    print(f"Trained on {len(train)} samples in {time.perf_counter() - start:.1f} s")
+
+    if test:
+        evaluate(model, test, args.threshold)
+        # Retrain on everything for the saved model, now that it has been measured
+        model = IntentModel.train(samples, epochs=args.epochs, n_features=args.n_features, seed=args.seed)
+
+    model.save(args.output)
+    print(f"Saved the model to {args.output}; restart the API to load it")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,649 @@
+"""
+Async twin of storage.client, backed by Motor.
+
+Every function has the same name, arguments and return value as its counterpart
+in storage.client, but is a coroutine. Query construction, result formatting and
+the read caches are shared with the sync client, so both backends store and
+return identical documents and a write through either one invalidates the caches.
+"""
+import asyncio
+import os
+import threading
+import weakref
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from config import (
+    MONGO_URI, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, BULK_INSERT_BATCH_SIZE,
+    MEDICAL_REPORT_MAX_BYTES, UPLOAD_CHUNK_SIZE
+)
+from storage.client import (
+    ObjectId, USER_PROFILE_ID, MEDICAL_REPORT_LIST_FIELDS, ANALYSIS_REPORT_LIST_FIELDS,
+    ACTIVE_JOB_STATUSES, JobQueueFull, _new_job, _free_job_slots, _job_queue_full,
+    _running_job_query, _finished_job_update, _stale_jobs_query,
+    user_profile_cache, medical_conditions_cache, get_cache_stats,
+    analyze_nutrition_data, ensure_upload_dir,
+    _projection_cache_key, _nutrition_rollup_updates,
+    _user_profile_update, _page_cursor, _page_result,
+    _nutrition_analysis_pipeline, _format_nutrition_analysis,
+    _nutrition_rollup_range_query, _summarize_nutrition_rollup, _nutrition_rollup_rebuild_plan,
+    _nutrition_rollup_replacements, _write_medical_report_file, _copy_medical_report_stream,
+    _medical_report_metadata, _medical_report_download
+)
+from metrics import timed_storage_call
+
+# Connect to MongoDB
+#
+# Motor clients are bound to the event loop they are first used on, so one client is
+# kept per running loop (normally exactly one per process). Like the sync client,
+# clients are dropped in a forked child and rebuilt lazily.
+
+_clients = weakref.WeakKeyDictionary()
+_clients_pid = os.getpid()
+_clients_lock = threading.Lock()
+
+def create_mongo_client():
+    """
+    Builds a new Motor client from the configured URI, pool size and timeouts.
+    Prefer get_mongo_client(), which returns the shared instance for the running loop.
+    """
+    return AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    )
+
+def get_mongo_client():
+    """
+    Returns the Motor client for the running event loop, creating it on first use.
+    Must be called from a coroutine.
+    """
+    global _clients, _clients_pid
+
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients = weakref.WeakKeyDictionary()
+            _clients_pid = os.getpid()
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = create_mongo_client()
+    return client
+
+def close_mongo_client():
+    """
+    Closes every Motor client created by this process.
+    """
+    with _clients_lock:
+        if _clients_pid == os.getpid():
+            for client in list(_clients.values()):
+                client.close()
+        _clients.clear()
+
+async def _insert_many_batched(collection, records, batch_size, after_batch=None):
+    """
+    Inserts records with unordered insert_many calls of at most batch_size documents.
+    after_batch, if given, is awaited with each batch once it is stored.
+    """
+    inserted_ids = []
+    batch = []
+
+    async def flush(batch):
+        result = await collection.insert_many(batch, ordered=False)
+        inserted_ids.extend(result.inserted_ids)
+        if after_batch:
+            await after_batch(batch)
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    return inserted_ids
+
+async def _increment_nutrition_rollup(db, entries):
+    """
+    Adds nutrition entries to the nutrition_daily_rollup collection.
+    """
+    updates = _nutrition_rollup_updates(entries)
+    if updates:
+        await db["nutrition_daily_rollup"].bulk_write(updates, ordered=False)
+
+@timed_storage_call
+async def store_nutrition_data(data):
+    """
+    Stores nutrition data in MongoDB and adds it to the daily rollup.
+    """
+    db = get_mongo_client()["nutrition_db"]
+    result = await db["nutrition_data"].insert_one(data)
+    await _increment_nutrition_rollup(db, [data])
+    return result.inserted_id
+
+@timed_storage_call
+async def store_nutrition_data_many(records, batch_size=BULK_INSERT_BATCH_SIZE):
+    """
+    Stores many nutrition data entries in MongoDB, one round trip per batch.
+    """
+    db = get_mongo_client()["nutrition_db"]
+    return await _insert_many_batched(
+        db["nutrition_data"], records, batch_size,
+        after_batch=lambda batch: _increment_nutrition_rollup(db, batch)
+    )
+
+@timed_storage_call
+async def store_medical_conditions_data(data):
+    """
+    Stores medical conditions data in MongoDB.
+    """
+    collection = get_mongo_client()["medical_conditions_db"]["medical_conditions_data"]
+    try:
+        result = await collection.insert_one(data)
+    finally:
+        medical_conditions_cache.invalidate()
+    return result.inserted_id
+
+@timed_storage_call
+async def store_medical_conditions_data_many(records, batch_size=BULK_INSERT_BATCH_SIZE):
+    """
+    Stores many medical conditions entries in MongoDB, one round trip per batch.
+    """
+    collection = get_mongo_client()["medical_conditions_db"]["medical_conditions_data"]
+    try:
+        return await _insert_many_batched(collection, records, batch_size)
+    finally:
+        medical_conditions_cache.invalidate()
+
+@timed_storage_call
+async def store_user_profile_data(data):
+    """
+    Stores or updates user profile data with a single atomic upsert.
+
+    Returns:
+        The merged profile document after the update
+    """
+    collection = get_mongo_client()["user_profile_db"]["user_profile_data"]
+    try:
+        return await collection.find_one_and_update(
+            {'profile_id': USER_PROFILE_ID},
+            _user_profile_update(data),
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    finally:
+        user_profile_cache.invalidate()
+
+@timed_storage_call
+async def get_user_profile_data(projection=None):
+    """
+    Retrieves the user profile data, from the read cache when possible.
+    """
+    cache_key = _projection_cache_key(projection)
+    found, profile_data = user_profile_cache.get(cache_key)
+    if found:
+        return profile_data
+    generation = user_profile_cache.generation
+
+    collection = get_mongo_client()["user_profile_db"]["user_profile_data"]
+    profile_data = await collection.find_one({'profile_id': USER_PROFILE_ID}, projection)
+
+    user_profile_cache.set(cache_key, profile_data, generation)
+    return profile_data
+
+@timed_storage_call
+async def store_insights_data(data):
+    """
+    Stores insights data in MongoDB.
+    """
+    collection = get_mongo_client()["insights_db"]["insights_data"]
+    result = await collection.insert_one(data)
+    return result.inserted_id
+
+@timed_storage_call
+async def get_daily_insights_for_range(start_date, end_date, projection=None):
+    """
+    Retrieves daily insights for a specific date range.
+    """
+    collection = get_mongo_client()["insights_db"]["insights_data"]
+    cursor = collection.find({
+        "analysis_type": "daily",
+        "date": {"$gte": start_date, "$lte": end_date}
+    }, projection).sort("date", 1)
+    return await cursor.to_list(length=None)
+
+@timed_storage_call
+async def get_most_recent_insights(analysis_type, projection=None):
+    """
+    Retrieves the most recent insights of one type, or None if no insights exist.
+    """
+    collection = get_mongo_client()["insights_db"]["insights_data"]
+    return await collection.find_one(
+        {"analysis_type": analysis_type},
+        projection=projection,
+        sort=[("date", -1)]
+    )
+
+@timed_storage_call
+async def get_most_recent_daily_insights(projection=None):
+    """
+    Retrieves the most recent daily insights, or None if no insights exist.
+    """
+    return await get_most_recent_insights("daily", projection)
+
+@timed_storage_call
+async def get_most_recent_weekly_insights(projection=None):
+    """
+    Retrieves the most recent weekly insights, or None if no insights exist.
+    """
+    return await get_most_recent_insights("weekly", projection)
+
+@timed_storage_call
+async def get_medical_conditions_data(projection=None):
+    """
+    Retrieves the medical conditions data, from the read cache when possible.
+    """
+    cache_key = _projection_cache_key(projection)
+    found, conditions = medical_conditions_cache.get(cache_key)
+    if found:
+        return conditions
+    generation = medical_conditions_cache.generation
+
+    collection = get_mongo_client()["medical_conditions_db"]["medical_conditions_data"]
+    conditions = await collection.find({}, projection).to_list(length=None)
+
+    medical_conditions_cache.set(cache_key, conditions, generation)
+    return conditions
+
+@timed_storage_call
+async def get_nutrition_data_for_period(start_date, end_date, projection=None):
+    """
+    Retrieves nutrition data for a specific date range.
+    """
+    collection = get_mongo_client()["nutrition_db"]["nutrition_data"]
+    cursor = collection.find({
+        "timestamp": {"$gte": start_date, "$lte": end_date}
+    }, projection).sort("timestamp", 1)
+    return await cursor.to_list(length=None)
+
+@timed_storage_call
+async def get_latest_nutrition_data(start_date, end_date, limit, projection=None):
+    """
+    Retrieves the most recent nutrition entries in a date range, newest first.
+    """
+    collection = get_mongo_client()["nutrition_db"]["nutrition_data"]
+    cursor = collection.find({
+        "timestamp": {"$gte": start_date, "$lte": end_date}
+    }, projection).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+    return await cursor.to_list(length=None)
+
+@timed_storage_call
+async def get_nutrition_data_page(start_date, end_date, limit, after=None, projection=None):
+    """
+    Retrieves one page of nutrition data for a date range, oldest first.
+
+    Returns:
+        A tuple containing (entries, next_cursor); next_cursor is None on the last page
+    """
+    collection = get_mongo_client()["nutrition_db"]["nutrition_data"]
+    cursor = _page_cursor(
+        collection,
+        {"timestamp": {"$gte": start_date, "$lte": end_date}},
+        "timestamp", 1, limit, after, projection
+    )
+    return _page_result(await cursor.to_list(length=None), "timestamp", limit)
+
+@timed_storage_call
+async def analyze_nutrition_data_for_period(start_date, end_date):
+    """
+    Analyzes nutrition data for a date range inside MongoDB.
+    """
+    collection = get_mongo_client()["nutrition_db"]["nutrition_data"]
+    cursor = collection.aggregate(_nutrition_analysis_pipeline(start_date, end_date))
+    summaries = await cursor.to_list(length=1)
+    return _format_nutrition_analysis(summaries[0] if summaries else None)
+
+@timed_storage_call
+async def get_nutrition_daily_rollup(start_date, end_date, projection=None):
+    """
+    Retrieves the per-day nutrition totals for a date range from the rollup collection.
+    """
+    collection = get_mongo_client()["nutrition_db"]["nutrition_daily_rollup"]
+    cursor = collection.find(
+        _nutrition_rollup_range_query(start_date, end_date),
+        projection or {"_id": 0}
+    ).sort("date", 1)
+    return await cursor.to_list(length=None)
+
+@timed_storage_call
+async def summarize_nutrition_for_period(start_date, end_date):
+    """
+    Summarizes nutrition data for a date range from the daily rollup collection.
+    """
+    return _summarize_nutrition_rollup(await get_nutrition_daily_rollup(start_date, end_date))
+
+@timed_storage_call
+async def rebuild_nutrition_daily_rollup(start_date=None, end_date=None):
+    """
+    Recomputes the nutrition_daily_rollup collection from the raw nutrition entries.
+    Nutrition writes to the rebuilt range must be paused while it runs.
+    """
+    db = get_mongo_client()["nutrition_db"]
+    rollup = db["nutrition_daily_rollup"]
+
+    date_query, pipeline = _nutrition_rollup_rebuild_plan(start_date, end_date)
+    await rollup.create_index("date", unique=True, name="date_1")
+    days = await db["nutrition_data"].aggregate(pipeline).to_list(length=None)
+    existing = await rollup.find(date_query, {"date": 1, "_id": 0}).to_list(length=None)
+    updates = _nutrition_rollup_replacements(days, existing)
+    if updates:
+        await rollup.bulk_write(updates, ordered=False)
+
+    return len(days)
+
+@timed_storage_call
+async def store_medical_report(file_data, filename, file_type, file_size, description=None):
+    """
+    Stores a medical report file in the filesystem and metadata in MongoDB.
+    The file is written from a worker thread so the event loop is not blocked.
+    """
+    unique_filename = await asyncio.to_thread(_write_medical_report_file, file_data, filename)
+
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    metadata = _medical_report_metadata(filename, unique_filename, file_type, file_size, description)
+    result = await collection.insert_one(metadata)
+    return result.inserted_id
+
+@timed_storage_call
+async def store_medical_report_stream(stream, filename, file_type, description=None,
+                                      max_size=MEDICAL_REPORT_MAX_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Stores a medical report read from a (blocking) stream in chunks, recording its
+    size and SHA-256. The copy runs in a worker thread.
+    
+    Raises:
+        ReportTooLarge: If the file is longer than max_size bytes
+    """
+    unique_filename, file_size, sha256 = await asyncio.to_thread(
+        _copy_medical_report_stream, stream, filename, max_size, chunk_size
+    )
+
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    metadata = _medical_report_metadata(filename, unique_filename, file_type, file_size, description, sha256)
+    try:
+        await collection.insert_one(metadata)
+    except Exception:
+        await asyncio.to_thread(_remove_file_if_exists, os.path.join(ensure_upload_dir(), unique_filename))
+        raise
+    return metadata
+
+@timed_storage_call
+async def get_medical_reports(projection=None):
+    """
+    Retrieves a list of all medical reports metadata.
+    """
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    cursor = collection.find({}, projection or MEDICAL_REPORT_LIST_FIELDS).sort("uploadDate", -1)
+    return await cursor.to_list(length=None)
+
+@timed_storage_call
+async def get_medical_reports_page(limit, after=None, projection=None):
+    """
+    Retrieves one page of medical reports metadata, newest first.
+
+    Returns:
+        A tuple containing (reports, next_cursor); next_cursor is None on the last page
+    """
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    cursor = _page_cursor(
+        collection, {}, "uploadDate", -1, limit, after, projection or MEDICAL_REPORT_LIST_FIELDS
+    )
+    return _page_result(await cursor.to_list(length=None), "uploadDate", limit)
+
+@timed_storage_call
+async def get_medical_report(file_id):
+    """
+    Retrieves a specific medical report file.
+
+    Returns:
+        A tuple containing (file_path, filename, content_type)
+    """
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    metadata = await collection.find_one(
+        {"_id": ObjectId(file_id)},
+        ["stored_filename", "filename", "file_type"]
+    )
+    if not metadata:
+        return None, None, None
+
+    file_path = os.path.join(ensure_upload_dir(), metadata["stored_filename"])
+    if not await asyncio.to_thread(os.path.exists, file_path):
+        return None, None, None
+
+    return file_path, metadata["filename"], metadata["file_type"]
+
+@timed_storage_call
+async def get_medical_report_download(file_id):
+    """
+    Retrieves what is needed to serve a medical report download, or None if no such
+    report exists.
+    """
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    metadata = await collection.find_one(
+        {"_id": ObjectId(file_id)},
+        ["stored_filename", "filename", "file_type", "file_size", "sha256", "uploadDate"]
+    )
+    if not metadata:
+        return None
+
+    return _medical_report_download(metadata)
+
+@timed_storage_call
+async def delete_medical_report(file_id):
+    """
+    Deletes a specific medical report file.
+
+    Returns:
+        True if the file was deleted, False otherwise
+    """
+    collection = get_mongo_client()["medical_reports_db"]["medical_reports_metadata"]
+    metadata = await collection.find_one({"_id": ObjectId(file_id)}, ["stored_filename"])
+    if not metadata:
+        return False
+
+    file_path = os.path.join(ensure_upload_dir(), metadata["stored_filename"])
+    # File system calls run in a worker thread so the event loop is not blocked
+    await asyncio.to_thread(_remove_file_if_exists, file_path)
+
+    await collection.delete_one({"_id": ObjectId(file_id)})
+    return True
+
+def _remove_file_if_exists(file_path):
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+@timed_storage_call
+async def store_analysis_report(report):
+    """
+    Stores a finished deep analysis report.
+    """
+    collection = get_mongo_client()["analysis_reports_db"]["analysis_reports"]
+    report = dict(report, file_count=len(report.get("filenames", [])))
+    result = await collection.insert_one(report)
+    return result.inserted_id
+
+@timed_storage_call
+async def get_analysis_report(report_id):
+    """
+    Retrieves a deep analysis report by its report_id, or None if it does not exist.
+    """
+    collection = get_mongo_client()["analysis_reports_db"]["analysis_reports"]
+    return await collection.find_one({"report_id": report_id}, {"_id": 0, "file_count": 0})
+
+@timed_storage_call
+async def get_analysis_reports(projection=None):
+    """
+    Retrieves all deep analysis reports, newest first.
+    """
+    collection = get_mongo_client()["analysis_reports_db"]["analysis_reports"]
+    cursor = collection.find({}, projection or ANALYSIS_REPORT_LIST_FIELDS).sort([("timestamp", -1), ("_id", -1)])
+    return await cursor.to_list(length=None)
+
+@timed_storage_call
+async def get_analysis_reports_page(limit, after=None, projection=None):
+    """
+    Retrieves one page of deep analysis reports, newest first.
+
+    Returns:
+        A tuple containing (reports, next_cursor); next_cursor is None on the last page
+    """
+    collection = get_mongo_client()["analysis_reports_db"]["analysis_reports"]
+    cursor = _page_cursor(
+        collection, {}, "timestamp", -1, limit, after, projection or ANALYSIS_REPORT_LIST_FIELDS
+    )
+    return _page_result(await cursor.to_list(length=None), "timestamp", limit)
+
+@timed_storage_call
+async def enqueue_job(job_type, payload, max_active=None, **fields):
+    """
+    Queues a background job.
+
+    Raises:
+        JobQueueFull: If max_active jobs are already queued or running
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    job = _new_job(job_type, payload, fields)
+    if max_active is None:
+        await collection.insert_one(job)
+        return job
+
+    taken = await collection.find(
+        {"type": job_type, "active_slot": {"$exists": True}}, {"active_slot": 1}
+    ).to_list(length=None)
+    for slot in _free_job_slots(job_type, max_active, taken):
+        try:
+            await collection.insert_one({**job, "active_slot": slot})
+        except DuplicateKeyError:
+            continue
+        job["active_slot"] = slot
+        return job
+    raise _job_queue_full(job_type, max_active)
+
+@timed_storage_call
+async def claim_next_job(job_type, worker_id):
+    """
+    Atomically takes the oldest queued job of a type and marks it as running.
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    now = datetime.utcnow()
+    return await collection.find_one_and_update(
+        {"type": job_type, "status": "queued"},
+        {
+            "$set": {"status": "running", "started_at": now, "heartbeat_at": now, "worker": worker_id},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+@timed_storage_call
+async def heartbeat_job(job_id, worker_id):
+    """
+    Records that a worker is still running a job, so it is not considered abandoned.
+
+    Returns:
+        False if the job is no longer running under this worker, True otherwise
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    result = await collection.update_one(
+        _running_job_query(job_id, worker_id), {"$set": {"heartbeat_at": datetime.utcnow()}}
+    )
+    return result.matched_count == 1
+
+@timed_storage_call
+async def finish_job(job_id, worker_id, status, retention, **fields):
+    """
+    Records the outcome of a job, releases its slot and schedules it for removal.
+
+    Returns:
+        False if the job is no longer running under this worker, True otherwise
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    result = await collection.update_one(
+        _running_job_query(job_id, worker_id), _finished_job_update(status, retention, fields)
+    )
+    return result.matched_count == 1
+
+@timed_storage_call
+async def requeue_stale_jobs(job_type, stale_after, max_attempts, retention):
+    """
+    Queues running jobs again whose worker has not sent a heartbeat within
+    stale_after, or marks them as failed once they were attempted max_attempts times.
+
+    Returns:
+        A tuple containing (the number of jobs queued again, the number of jobs given up)
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    failed = await collection.update_many(
+        _stale_jobs_query(job_type, stale_after, {"$gte": max_attempts}),
+        _finished_job_update("error", retention, {"error": f"Abandoned after {max_attempts} attempts"})
+    )
+    requeued = await collection.update_many(
+        _stale_jobs_query(job_type, stale_after, {"$lt": max_attempts}),
+        {"$set": {"status": "queued"}, "$unset": {"started_at": "", "heartbeat_at": "", "worker": ""}}
+    )
+    return requeued.modified_count, failed.modified_count
+
+@timed_storage_call
+async def get_job(job_id, projection=None):
+    """
+    Retrieves a job by its ID, or None if it does not exist (or has expired).
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    return await collection.find_one({"_id": job_id}, projection)
+
+@timed_storage_call
+async def count_active_jobs(job_type):
+    """
+    Counts the queued and running jobs of a type.
+    """
+    collection = get_mongo_client()["jobs_db"]["jobs"]
+    counts = {status: 0 for status in ACTIVE_JOB_STATUSES}
+    pipeline = [
+        {"$match": {"type": job_type, "status": {"$in": ACTIVE_JOB_STATUSES}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    async for row in collection.aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+@timed_storage_call
+async def store_intent_classification(data, retention):
+    """
+    Logs the intent classification of a chat message.
+    """
+    collection = get_mongo_client()["intent_db"]["intent_classifications"]
+    timestamp = data.get("timestamp") or datetime.utcnow()
+    result = await collection.insert_one({**data, "timestamp": timestamp, "expires_at": timestamp + retention})
+    return result.inserted_id
+
+@timed_storage_call
+async def get_intent_classifications(source=None, min_confidence=None, projection=None):
+    """
+    Retrieves logged intent classifications, oldest first.
+    """
+    collection = get_mongo_client()["intent_db"]["intent_classifications"]
+    query = {}
+    if source is not None:
+        query["source"] = source
+    if min_confidence is not None:
+        query["confidence"] = {"$gte": min_confidence}
+    return await collection.find(query, projection).sort("timestamp", 1).to_list(length=None)
@@ -1,21 +1,165 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne, ReplaceOne, DeleteOne
+from pymongo.errors import DuplicateKeyError
+from bson.objectid import ObjectId
 from datetime import datetime, timedelta
+import base64
+import hashlib
+import json
 import os
 import shutil
+import threading
 import uuid
 
+from config import (
+    MONGO_URI, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, BULK_INSERT_BATCH_SIZE,
+    STORAGE_CACHE_TTL_SECONDS, STORAGE_CACHE_MAX_ENTRIES, MEDICAL_REPORT_MAX_BYTES, UPLOAD_CHUNK_SIZE
+)
+from storage.cache import TTLCache
+from metrics import timed_storage_call
+
 # Connect to MongoDB
+#
+# A single MongoClient is shared by the whole process. MongoClient is thread-safe and
+# maintains its own connection pool, so creating one per call only adds handshakes,
+# server discovery and leaked monitor threads. The client is not fork-safe, so the
+# owning PID is recorded and a child process lazily builds its own client.
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def create_mongo_client():
+    """
+    Builds a new MongoDB client from the configured URI, pool size and timeouts.
+    Prefer get_mongo_client(), which returns the shared instance.
+    """
+    return MongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+    )
 
 def get_mongo_client():
     """
-    Returns a MongoDB client instance.
+    Returns the process-wide MongoDB client instance, creating it on first use.
+    """
+    global _client, _client_pid
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            # A client inherited across fork() must not be used or closed by the child
+            _client = create_mongo_client()
+            _client_pid = pid
+    return _client
+
+def close_mongo_client():
+    """
+    Closes the process-wide MongoDB client, if one was created by this process.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def _reset_mongo_client_after_fork():
+    """
+    Drops the parent's client reference in a freshly forked child process.
+    """
+    global _client, _client_pid, _client_lock
+
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_mongo_client_after_fork)
+
+# Read-through caches for data that is read on nearly every request but changes
+# rarely. The store_* functions below invalidate them; the TTL bounds staleness
+# for writes made by other processes.
+user_profile_cache = TTLCache("user_profile", STORAGE_CACHE_MAX_ENTRIES, STORAGE_CACHE_TTL_SECONDS)
+medical_conditions_cache = TTLCache("medical_conditions", STORAGE_CACHE_MAX_ENTRIES, STORAGE_CACHE_TTL_SECONDS)
+
+def _projection_cache_key(projection):
+    """
+    Returns a hashable cache key for a projection argument.
+    """
+    if projection is None:
+        return None
+    if isinstance(projection, dict):
+        return tuple(sorted(projection.items()))
+    return tuple(projection)
+
+def get_cache_stats():
+    """
+    Returns the hit/miss counters of the storage read caches.
+    """
+    return {
+        cache.name: cache.stats()
+        for cache in (user_profile_cache, medical_conditions_cache)
+    }
+
+def _nutrition_rollup_date(timestamp):
+    """
+    Returns the "YYYY-MM-DD" rollup key for a nutrition entry timestamp.
+    """
+    if isinstance(timestamp, str):
+        return timestamp.split('T')[0]
+    return (timestamp or datetime.utcnow()).strftime("%Y-%m-%d")
+
+def _nutrition_rollup_updates(entries):
+    """
+    Builds the atomic $inc upserts that add nutrition entries to the
+    nutrition_daily_rollup collection, one update per day touched by the entries.
+    
+    Args:
+        entries (list): Nutrition data dictionaries that were just stored
+    
+    Returns:
+        A list of UpdateOne operations for bulk_write
+    """
+    increments = {}
+    for entry in entries:
+        date = _nutrition_rollup_date(entry.get('timestamp'))
+        day = increments.setdefault(date, {'calories': 0, 'protein': 0, 'carbohydrates': 0, 'fats': 0, 'entries': 0})
+        day['calories'] += entry.get('calories') or 0
+        day['protein'] += entry.get('protein') or 0
+        day['carbohydrates'] += entry.get('carbohydrates') or 0
+        day['fats'] += entry.get('fats') or 0
+        day['entries'] += 1
+    
+    return [
+        UpdateOne({"date": date}, {"$inc": totals}, upsert=True)
+        for date, totals in increments.items()
+    ]
+
+def _increment_nutrition_rollup(db, entries):
+    """
+    Adds nutrition entries to the nutrition_daily_rollup collection.
+    
+    Args:
+        db: The nutrition database
+        entries (list): Nutrition data dictionaries that were just stored
     """
-    # Replace with your MongoDB connection string if needed
-    return MongoClient("mongodb://localhost:27017/")
+    updates = _nutrition_rollup_updates(entries)
+    if updates:
+        db["nutrition_daily_rollup"].bulk_write(updates, ordered=False)
 
+@timed_storage_call
 def store_nutrition_data(data):
     """
-    Stores nutrition data in MongoDB.
+    Stores nutrition data in MongoDB and adds it to the daily rollup.
     """
     client = get_mongo_client()
     db = client["nutrition_db"]
@@ -24,8 +168,12 @@ def store_nutrition_data(data):
     # Insert the data into the collection
     result = collection.insert_one(data)
     
+    # Keep the per-day totals in step with the raw entries
+    _increment_nutrition_rollup(db, [data])
+    
     return result.inserted_id
 
+@timed_storage_call
 def store_medical_conditions_data(data):
     """
     Stores medical conditions data in MongoDB.
@@ -35,64 +183,161 @@ def store_medical_conditions_data(data):
     collection = db["medical_conditions_data"]
     
     # Insert the data into the collection
-    result = collection.insert_one(data)
+    try:
+        result = collection.insert_one(data)
+    finally:
+        medical_conditions_cache.invalidate()
     
     return result.inserted_id
 
+def _insert_many_batched(collection, records, batch_size, after_batch=None):
+    """
+    Inserts records with unordered insert_many calls of at most batch_size documents.
+    
+    Args:
+        collection: The MongoDB collection to insert into
+        records (iterable): The documents to insert; may be a generator
+        batch_size (int): The maximum number of documents sent per round trip
+        after_batch (callable, optional): Called with each batch once it is stored
+    
+    Returns:
+        A list of the inserted IDs
+    """
+    inserted_ids = []
+    batch = []
+    
+    def flush(batch):
+        inserted_ids.extend(collection.insert_many(batch, ordered=False).inserted_ids)
+        if after_batch:
+            after_batch(batch)
+    
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    
+    return inserted_ids
+
+@timed_storage_call
+def store_nutrition_data_many(records, batch_size=BULK_INSERT_BATCH_SIZE):
+    """
+    Stores many nutrition data entries in MongoDB, one round trip per batch.
+    
+    Args:
+        records (iterable): Nutrition data dictionaries
+        batch_size (int, optional): The maximum number of entries per insert_many call
+    
+    Returns:
+        A list of the inserted IDs
+    """
+    client = get_mongo_client()
+    db = client["nutrition_db"]
+    collection = db["nutrition_data"]
+    
+    return _insert_many_batched(
+        collection, records, batch_size,
+        after_batch=lambda batch: _increment_nutrition_rollup(db, batch)
+    )
+
+@timed_storage_call
+def store_medical_conditions_data_many(records, batch_size=BULK_INSERT_BATCH_SIZE):
+    """
+    Stores many medical conditions entries in MongoDB, one round trip per batch.
+    
+    Args:
+        records (iterable): Medical conditions dictionaries
+        batch_size (int, optional): The maximum number of entries per insert_many call
+    
+    Returns:
+        A list of the inserted IDs
+    """
+    client = get_mongo_client()
+    db = client["medical_conditions_db"]
+    collection = db["medical_conditions_data"]
+    
+    try:
+        return _insert_many_batched(collection, records, batch_size)
+    finally:
+        medical_conditions_cache.invalidate()
+
+# Single-user deployment: the profile document is addressed by a fixed key rather than
+# by "most recent timestamp", so reads and writes are single, index-backed lookups
+USER_PROFILE_ID = "default"
+USER_PROFILE_FIELDS = ['age', 'gender', 'height', 'weight']
+
+def _user_profile_update(data):
+    """
+    Builds the upsert update document for store_user_profile_data.
+    """
+    # Update only the fields that are provided in the new data
+    update_data = {
+        field: data[field] for field in USER_PROFILE_FIELDS
+        if field in data and data[field] is not None
+    }
+    
+    # Add timestamp
+    update_data['timestamp'] = data.get('timestamp') or datetime.utcnow()
+    
+    # Fields that were not provided start out empty on a new profile
+    insert_data = {field: None for field in USER_PROFILE_FIELDS if field not in update_data}
+    
+    update = {'$set': update_data}
+    if insert_data:
+        update['$setOnInsert'] = insert_data
+    return update
+
+@timed_storage_call
 def store_user_profile_data(data):
     """
-    Stores or updates user profile data in MongoDB.
+    Stores or updates user profile data in MongoDB with a single atomic upsert.
     If a profile already exists, it updates only the fields that are provided in the new data.
     If no profile exists, it creates a new one.
+    
+    Returns:
+        The merged profile document after the update
     """
     client = get_mongo_client()
     db = client["user_profile_db"]
     collection = db["user_profile_data"]
     
-    # Get the most recent profile data
-    existing_profile = collection.find_one(sort=[("timestamp", -1)])
-    
-    if existing_profile:
-        # Update only the fields that are provided in the new data
-        update_data = {}
-        if 'age' in data and data['age'] is not None:
-            update_data['age'] = data['age']
-        if 'gender' in data and data['gender'] is not None:
-            update_data['gender'] = data['gender']
-        if 'height' in data and data['height'] is not None:
-            update_data['height'] = data['height']
-        if 'weight' in data and data['weight'] is not None:
-            update_data['weight'] = data['weight']
-        
-        # Add timestamp
-        update_data['timestamp'] = data['timestamp']
-        
-        # Update the existing profile
-        result = collection.update_one(
-            {'_id': existing_profile['_id']},
-            {'$set': update_data}
+    try:
+        return collection.find_one_and_update(
+            {'profile_id': USER_PROFILE_ID},
+            _user_profile_update(data),
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        
-        return existing_profile['_id']
-    else:
-        # Insert the data into the collection
-        result = collection.insert_one(data)
-        
-        return result.inserted_id
+    finally:
+        user_profile_cache.invalidate()
 
-def get_user_profile_data():
+@timed_storage_call
+def get_user_profile_data(projection=None):
     """
-    Retrieves the latest user profile data from MongoDB.
+    Retrieves the user profile data, from the read cache when possible.
+    
+    Args:
+        projection (dict or list, optional): The fields to return; all fields when omitted
     """
+    cache_key = _projection_cache_key(projection)
+    found, profile_data = user_profile_cache.get(cache_key)
+    if found:
+        return profile_data
+    generation = user_profile_cache.generation
+    
     client = get_mongo_client()
     db = client["user_profile_db"]
     collection = db["user_profile_data"]
     
-    # Get the most recent profile data
-    profile_data = collection.find_one(sort=[("timestamp", -1)])
+    # Get the profile data
+    profile_data = collection.find_one({'profile_id': USER_PROFILE_ID}, projection)
     
+    user_profile_cache.set(cache_key, profile_data, generation)
     return profile_data
 
+@timed_storage_call
 def store_insights_data(data):
     """
     Stores insights data in MongoDB.
@@ -116,13 +361,15 @@ def store_insights_data(data):
     
     return result.inserted_id
 
-def get_daily_insights_for_range(start_date, end_date):
+@timed_storage_call
+def get_daily_insights_for_range(start_date, end_date, projection=None):
     """
     Retrieves daily insights for a specific date range.
     
     Args:
         start_date (datetime): The start date of the range
         end_date (datetime): The end date of the range
+        projection (dict or list, optional): The fields to return; all fields when omitted
     
     Returns:
         A list of daily insights within the specified date range
@@ -135,56 +382,94 @@ def get_daily_insights_for_range(start_date, end_date):
     insights = collection.find({
         "analysis_type": "daily",
         "date": {"$gte": start_date, "$lte": end_date}
-    }).sort("date", 1)
+    }, projection).sort("date", 1)
     
     return list(insights)
 
-def get_most_recent_daily_insights():
+@timed_storage_call
+def get_most_recent_insights(analysis_type, projection=None):
     """
-    Retrieves the most recent daily insights from MongoDB.
+    Retrieves the most recent insights of one type from MongoDB.
+    
+    Args:
+        analysis_type (str): "daily" or "weekly"
+        projection (dict or list, optional): The fields to return; all fields when omitted
     
     Returns:
-        The most recent daily insights document, or None if no insights exist
+        The most recent insights document, or None if no insights exist
     """
     client = get_mongo_client()
     db = client["insights_db"]
     collection = db["insights_data"]
     
-    # Get the most recent daily insights
+    # Get the most recent insights
     insights = collection.find_one(
-        {"analysis_type": "daily"},
+        {"analysis_type": analysis_type},
+        projection=projection,
         sort=[("date", -1)]
     )
     
     return insights
 
-def get_medical_conditions_data():
+@timed_storage_call
+def get_most_recent_daily_insights(projection=None):
+    """
+    Retrieves the most recent daily insights from MongoDB.
+    
+    Args:
+        projection (dict or list, optional): The fields to return; all fields when omitted
+    
+    Returns:
+        The most recent daily insights document, or None if no insights exist
+    """
+    return get_most_recent_insights("daily", projection)
+
+@timed_storage_call
+def get_most_recent_weekly_insights(projection=None):
+    """
+    Retrieves the most recent weekly insights from MongoDB.
+    
+    Args:
+        projection (dict or list, optional): The fields to return; all fields when omitted
+    
+    Returns:
+        The most recent weekly insights document, or None if no insights exist
+    """
+    return get_most_recent_insights("weekly", projection)
+
+@timed_storage_call
+def get_medical_conditions_data(projection=None):
     """
-    Retrieves the medical conditions data from MongoDB.
+    Retrieves the medical conditions data, from the read cache when possible.
+    
+    Args:
+        projection (dict or list, optional): The fields to return; all fields when omitted
     """
+    cache_key = _projection_cache_key(projection)
+    found, conditions = medical_conditions_cache.get(cache_key)
+    if found:
+        return conditions
+    generation = medical_conditions_cache.generation
+    
     client = get_mongo_client()
     db = client["medical_conditions_db"]
     collection = db["medical_conditions_data"]
     
     # Get all medical conditions
-    conditions = list(collection.find())
-    
-    # Convert ObjectId to string for JSON serialization
-    for condition in conditions:
-        if '_id' in condition:
-            condition['_id'] = str(condition['_id'])
-        if 'timestamp' in condition:
-            condition['timestamp'] = condition['timestamp'].isoformat()
+    conditions = list(collection.find({}, projection))
     
+    medical_conditions_cache.set(cache_key, conditions, generation)
     return conditions
 
-def get_nutrition_data_for_period(start_date, end_date):
+@timed_storage_call
+def get_nutrition_data_for_period(start_date, end_date, projection=None):
     """
     Retrieves nutrition data for a specific date range.
     
     Args:
         start_date (datetime): The start date of the range
         end_date (datetime): The end date of the range
+        projection (dict or list, optional): The fields to return; all fields when omitted
     
     Returns:
         A list of nutrition data entries within the specified date range
@@ -196,17 +481,162 @@ def get_nutrition_data_for_period(start_date, end_date):
     # Get nutrition data within the date range
     nutrition_data = collection.find({
         "timestamp": {"$gte": start_date, "$lte": end_date}
-    }).sort("timestamp", 1)
+    }, projection).sort("timestamp", 1)
+    
+    return list(nutrition_data)
+
+@timed_storage_call
+def get_latest_nutrition_data(start_date, end_date, limit, projection=None):
+    """
+    Retrieves the most recent nutrition entries in a date range, newest first.
+    
+    Args:
+        start_date (datetime): The start date of the range
+        end_date (datetime): The end date of the range
+        limit (int): The maximum number of entries to return
+        projection (dict or list, optional): The fields to return; all fields when omitted
+    
+    Returns:
+        A list of at most limit nutrition data entries
+    """
+    client = get_mongo_client()
+    db = client["nutrition_db"]
+    collection = db["nutrition_data"]
+    
+    nutrition_data = collection.find({
+        "timestamp": {"$gte": start_date, "$lte": end_date}
+    }, projection).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+    
+    return list(nutrition_data)
+
+def _encode_page_cursor(sort_value, document_id):
+    """
+    Encodes the keyset position of the last document on a page as an opaque cursor.
+    
+    Args:
+        sort_value (datetime): The sort key of the last document
+        document_id (ObjectId): The _id of the last document, used as a tie-breaker
+    
+    Returns:
+        A URL-safe cursor string
+    """
+    position = json.dumps({"v": sort_value.isoformat(), "id": str(document_id)})
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def _decode_page_cursor(cursor):
+    """
+    Decodes a cursor created by _encode_page_cursor.
+    
+    Args:
+        cursor (str): The cursor string
+    
+    Returns:
+        A tuple containing (sort_value, document_id)
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(position["v"]), ObjectId(position["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid page cursor: {cursor}") from e
+
+def _keyset_filter(field, cursor, direction):
+    """
+    Builds the filter selecting documents after a cursor for a (field, _id) sort.
+    
+    Args:
+        field (str): The sort field
+        cursor (str): The cursor of the previous page, or None for the first page
+        direction (int): 1 for ascending, -1 for descending
+    
+    Returns:
+        A MongoDB filter dictionary
+    """
+    if not cursor:
+        return {}
+    sort_value, document_id = _decode_page_cursor(cursor)
+    operator = "$gt" if direction == 1 else "$lt"
+    return {"$or": [
+        {field: {operator: sort_value}},
+        {field: sort_value, "_id": {operator: document_id}}
+    ]}
+
+def _include_fields(projection, *fields):
+    """
+    Makes sure an inclusion projection also returns the given fields.
+    """
+    if projection is None:
+        return None
+    if isinstance(projection, dict):
+        projection = dict(projection)
+        if any(value for key, value in projection.items() if key != "_id"):
+            projection.update({field: 1 for field in fields})
+        else:
+            for field in fields:
+                projection.pop(field, None)
+        projection.pop("_id", None)
+        return projection
+    return list(projection) + [field for field in fields if field not in projection]
+
+def _page_cursor(collection, query, field, direction, limit, after, projection):
+    """
+    Builds the cursor for a keyset-paginated query sorted by (field, _id).
+    One extra document is requested to tell whether another page follows.
+    """
+    keyset = _keyset_filter(field, after, direction)
+    if keyset:
+        query = {"$and": [query, keyset]} if query else keyset
+    
+    return (
+        collection.find(query, _include_fields(projection, field))
+        .sort([(field, direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+
+def _page_result(documents, field, limit):
+    """
+    Trims the documents fetched by _page_cursor to a page.
+    
+    Returns:
+        A tuple containing (documents, next_cursor); next_cursor is None on the last page
+    """
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = _encode_page_cursor(documents[-1][field], documents[-1]["_id"])
+    
+    return documents, next_cursor
+
+@timed_storage_call
+def get_nutrition_data_page(start_date, end_date, limit, after=None, projection=None):
+    """
+    Retrieves one page of nutrition data for a date range, oldest first.
+    
+    Args:
+        start_date (datetime): The start date of the range
+        end_date (datetime): The end date of the range
+        limit (int): The maximum number of entries to return
+        after (str, optional): The next_cursor returned with the previous page
+        projection (dict or list, optional): The fields to return; all fields when omitted
     
-    # Convert ObjectId to string for JSON serialization
-    result = list(nutrition_data)
-    for entry in result:
-        if '_id' in entry:
-            entry['_id'] = str(entry['_id'])
-        if 'timestamp' in entry:
-            entry['timestamp'] = entry['timestamp'].isoformat()
+    Returns:
+        A tuple containing (entries, next_cursor); next_cursor is None on the last page
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    client = get_mongo_client()
+    db = client["nutrition_db"]
+    collection = db["nutrition_data"]
     
-    return result
+    cursor = _page_cursor(
+        collection,
+        {"timestamp": {"$gte": start_date, "$lte": end_date}},
+        "timestamp", 1, limit, after, projection
+    )
+    return _page_result(list(cursor), "timestamp", limit)
 
 def analyze_nutrition_data(data):
     """
@@ -225,6 +655,8 @@ def analyze_nutrition_data(data):
     for entry in data:
         if 'timestamp' in entry and isinstance(entry['timestamp'], str):
             entry['date'] = entry['timestamp'].split('T')[0]
+        elif 'timestamp' in entry and isinstance(entry['timestamp'], datetime):
+            entry['date'] = _nutrition_rollup_date(entry['timestamp'])
     
     # Group by date
     dates = {}
@@ -268,95 +700,477 @@ def analyze_nutrition_data(data):
         }
     }
 
-def ensure_upload_dir():
+def _nutrition_daily_totals_pipeline(start_date=None, end_date=None):
     """
-    Ensures that the uploads directory exists.
+    Builds the aggregation stages that total nutrition entries per UTC day.
+    
+    Args:
+        start_date (datetime, optional): The start date of the range
+        end_date (datetime, optional): The end date of the range
     
     Returns:
-        The path to the uploads directory
+        A list of pipeline stages producing one document per day, keyed by "YYYY-MM-DD"
     """
-    # Create uploads directory in the root of the project if it doesn't exist
-    uploads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../uploads'))
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-    return uploads_dir
+    timestamp_filter = {}
+    if start_date is not None:
+        timestamp_filter["$gte"] = start_date
+    if end_date is not None:
+        timestamp_filter["$lte"] = end_date
+    
+    return [
+        {"$match": {"timestamp": timestamp_filter} if timestamp_filter else {}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+            "calories": {"$sum": {"$ifNull": ["$calories", 0]}},
+            "protein": {"$sum": {"$ifNull": ["$protein", 0]}},
+            "carbohydrates": {"$sum": {"$ifNull": ["$carbohydrates", 0]}},
+            "fats": {"$sum": {"$ifNull": ["$fats", 0]}},
+            "entries": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
 
-def store_medical_report(file_data, filename, file_type, file_size, description=None):
+def _nutrition_analysis_pipeline(start_date, end_date):
     """
-    Stores a medical report file in the filesystem and metadata in MongoDB.
-    
-    Args:
-        file_data (bytes or file-like object): The file data or file object
-        filename (str): The name of the file
-        file_type (str): The MIME type of the file
-        file_size (int): The size of the file in bytes
-        description (str, optional): A description of the file
+    Builds the pipeline that reduces a date range to a single analysis document.
+    """
+    return _nutrition_daily_totals_pipeline(start_date, end_date) + [
+        {"$group": {
+            "_id": None,
+            "total_entries": {"$sum": "$entries"},
+            "total_days": {"$sum": 1},
+            "avg_calories": {"$avg": "$calories"},
+            "avg_protein": {"$avg": "$protein"},
+            "avg_carbohydrates": {"$avg": "$carbohydrates"},
+            "avg_fats": {"$avg": "$fats"},
+            "daily_totals": {"$push": {
+                "date": "$_id",
+                "calories": "$calories",
+                "protein": "$protein",
+                "carbohydrates": "$carbohydrates",
+                "fats": "$fats",
+                "entries": "$entries"
+            }}
+        }}
+    ]
+
+def _format_nutrition_analysis(summary):
+    """
+    Converts the document produced by _nutrition_analysis_pipeline to the
+    structure returned by analyze_nutrition_data.
+    """
+    if not summary:
+        return {"message": "No nutrition data available for the specified period."}
     
-    Returns:
-        The ID of the inserted metadata record
+    return {
+        "total_entries": summary["total_entries"],
+        "total_days": summary["total_days"],
+        "daily_totals": {
+            day.pop("date"): day for day in summary["daily_totals"]
+        },
+        "average_daily": {
+            "calories": summary["avg_calories"],
+            "protein": summary["avg_protein"],
+            "carbohydrates": summary["avg_carbohydrates"],
+            "fats": summary["avg_fats"]
+        }
+    }
+
+@timed_storage_call
+def analyze_nutrition_data_for_period(start_date, end_date):
     """
-    # Generate a unique filename to avoid collisions
-    unique_filename = f"{uuid.uuid4()}_{filename}"
+    Analyzes nutrition data for a date range inside MongoDB.
     
-    # Ensure uploads directory exists
-    uploads_dir = ensure_upload_dir()
-    file_path = os.path.join(uploads_dir, unique_filename)
+    Returns the same structure as analyze_nutrition_data, but the per-day totals and
+    the averages across days are computed by an aggregation pipeline, so only one
+    small document per day is sent back regardless of the number of entries.
     
-    # Save the file to the filesystem
-    if hasattr(file_data, 'read'):
-        # If file_data is a file-like object
-        with open(file_path, 'wb') as f:
-            shutil.copyfileobj(file_data, f)
-    else:
-        # If file_data is bytes
-        with open(file_path, 'wb') as f:
-            f.write(file_data)
+    Args:
+        start_date (datetime): The start date of the range
+        end_date (datetime): The end date of the range
     
-    # Store metadata in MongoDB
+    Returns:
+        A dictionary containing the analysis results
+    """
     client = get_mongo_client()
-    db = client["medical_reports_db"]
-    collection = db["medical_reports_metadata"]
-    
-    metadata = {
-        "filename": filename,
-        "stored_filename": unique_filename,
-        "file_type": file_type,
-        "file_size": file_size,
-        "description": description,
-        "uploadDate": datetime.utcnow()
-    }
+    db = client["nutrition_db"]
+    collection = db["nutrition_data"]
     
-    result = collection.insert_one(metadata)
-    return result.inserted_id
+    pipeline = _nutrition_analysis_pipeline(start_date, end_date)
+    return _format_nutrition_analysis(next(collection.aggregate(pipeline), None))
 
-def get_medical_reports():
+@timed_storage_call
+def get_nutrition_daily_rollup(start_date, end_date, projection=None):
     """
-    Retrieves a list of all medical reports metadata.
+    Retrieves the per-day nutrition totals for a date range from the rollup collection.
+    
+    Args:
+        start_date (datetime): The start date of the range
+        end_date (datetime): The end date of the range
+        projection (dict or list, optional): The fields to return; all totals when omitted
     
     Returns:
-        A list of medical report metadata
+        A list of daily totals ("date", "calories", "protein", "carbohydrates", "fats", "entries"),
+        oldest first
+    """
+    client = get_mongo_client()
+    db = client["nutrition_db"]
+    collection = db["nutrition_daily_rollup"]
+    
+    return list(collection.find(
+        _nutrition_rollup_range_query(start_date, end_date),
+        projection or {"_id": 0}
+    ).sort("date", 1))
+
+def _nutrition_rollup_range_query(start_date, end_date):
+    """
+    Builds the filter selecting the rollup documents of the days in a date range.
+    """
+    return {"date": {"$gte": _nutrition_rollup_date(start_date), "$lte": _nutrition_rollup_date(end_date)}}
+
+@timed_storage_call
+def summarize_nutrition_for_period(start_date, end_date):
+    """
+    Summarizes nutrition data for a date range from the daily rollup collection.
+    
+    Returns the same structure as analyze_nutrition_data, reading one small
+    document per day instead of every raw entry. Days are whole UTC days.
+    
+    Args:
+        start_date (datetime): The start date of the range
+        end_date (datetime): The end date of the range
+    
+    Returns:
+        A dictionary containing the analysis results
+    """
+    return _summarize_nutrition_rollup(get_nutrition_daily_rollup(start_date, end_date))
+
+def _summarize_nutrition_rollup(days):
+    """
+    Converts daily rollup documents to the structure returned by analyze_nutrition_data.
+    """
+    if not days:
+        return {"message": "No nutrition data available for the specified period."}
+    
+    total_days = len(days)
+    daily_totals = {
+        day["date"]: {
+            'calories': day.get('calories', 0),
+            'protein': day.get('protein', 0),
+            'carbohydrates': day.get('carbohydrates', 0),
+            'fats': day.get('fats', 0),
+            'entries': day.get('entries', 0)
+        }
+        for day in days
+    }
+    
+    return {
+        "total_entries": sum(day['entries'] for day in daily_totals.values()),
+        "total_days": total_days,
+        "daily_totals": daily_totals,
+        "average_daily": {
+            "calories": sum(day['calories'] for day in daily_totals.values()) / total_days,
+            "protein": sum(day['protein'] for day in daily_totals.values()) / total_days,
+            "carbohydrates": sum(day['carbohydrates'] for day in daily_totals.values()) / total_days,
+            "fats": sum(day['fats'] for day in daily_totals.values()) / total_days
+        }
+    }
+
+@timed_storage_call
+def rebuild_nutrition_daily_rollup(start_date=None, end_date=None):
+    """
+    Recomputes the nutrition_daily_rollup collection from the raw nutrition entries.
+    Used to backfill the rollup for data stored before it existed, or to repair it.
+    The range is widened to whole UTC days; without a range every day is rebuilt.
+    
+    Each day's document is replaced on its own, so readers never see a day missing
+    while the rebuild runs. The totals are read before they are written, though, and
+    an entry stored in between is counted by neither the rebuild nor its own $inc:
+    pause nutrition writes for the rebuilt range while this runs.
+    
+    Args:
+        start_date (datetime, optional): The first day to rebuild
+        end_date (datetime, optional): The last day to rebuild
+    
+    Returns:
+        The number of days in the rebuilt range that have nutrition data
+    """
+    client = get_mongo_client()
+    db = client["nutrition_db"]
+    rollup = db["nutrition_daily_rollup"]
+    
+    date_query, pipeline = _nutrition_rollup_rebuild_plan(start_date, end_date)
+    
+    # The replacements upsert on "date", which must be unique
+    rollup.create_index("date", unique=True, name="date_1")
+    days = list(db["nutrition_data"].aggregate(pipeline))
+    existing = rollup.find(date_query, {"date": 1, "_id": 0})
+    updates = _nutrition_rollup_replacements(days, existing)
+    if updates:
+        rollup.bulk_write(updates, ordered=False)
+    
+    return len(days)
+
+def _nutrition_rollup_replacements(days, existing):
+    """
+    Builds the bulk operations that replace the rollup documents of the rebuilt days
+    and delete those of days in the range that no longer have entries.
+    
+    Args:
+        days (list): The recomputed daily totals
+        existing (iterable): The rollup documents in the rebuilt range, with their "date"
+    
+    Returns:
+        A list of ReplaceOne and DeleteOne operations for bulk_write
+    """
+    rebuilt = {day["date"] for day in days}
+    return [ReplaceOne({"date": day["date"]}, day, upsert=True) for day in days] + [
+        DeleteOne({"date": day["date"]}) for day in existing if day["date"] not in rebuilt
+    ]
+
+def _nutrition_rollup_rebuild_plan(start_date, end_date):
+    """
+    Builds the rollup filter of the rebuilt range and the pipeline computing its
+    daily totals for rebuild_nutrition_daily_rollup.
+    
+    Returns:
+        A tuple containing (date_query, pipeline)
+    """
+    # Rebuild whole days so a partial range never replaces a full day's totals
+    if start_date is not None:
+        start_date = datetime(start_date.year, start_date.month, start_date.day)
+    if end_date is not None:
+        end_date = datetime(end_date.year, end_date.month, end_date.day) + timedelta(days=1) - timedelta(microseconds=1)
+    
+    date_filter = {}
+    if start_date is not None:
+        date_filter["$gte"] = _nutrition_rollup_date(start_date)
+    if end_date is not None:
+        date_filter["$lte"] = _nutrition_rollup_date(end_date)
+    
+    pipeline = _nutrition_daily_totals_pipeline(start_date, end_date) + [
+        {"$project": {
+            "_id": 0,
+            "date": "$_id",
+            "calories": 1,
+            "protein": 1,
+            "carbohydrates": 1,
+            "fats": 1,
+            "entries": 1
+        }}
+    ]
+    
+    return ({"date": date_filter} if date_filter else {}), pipeline
+
+def ensure_upload_dir():
+    """
+    Ensures that the uploads directory exists.
+    
+    Returns:
+        The path to the uploads directory
+    """
+    # Create uploads directory in the root of the project if it doesn't exist
+    uploads_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../uploads'))
+    if not os.path.exists(uploads_dir):
+        os.makedirs(uploads_dir)
+    return uploads_dir
+
+def _write_medical_report_file(file_data, filename):
+    """
+    Saves a medical report file in the uploads directory under a unique name.
+    
+    Returns:
+        The unique stored filename
+    """
+    # Generate a unique filename to avoid collisions
+    unique_filename = f"{uuid.uuid4()}_{filename}"
+    
+    # Ensure uploads directory exists
+    uploads_dir = ensure_upload_dir()
+    file_path = os.path.join(uploads_dir, unique_filename)
+    
+    # Save the file to the filesystem
+    if hasattr(file_data, 'read'):
+        # If file_data is a file-like object
+        with open(file_path, 'wb') as f:
+            shutil.copyfileobj(file_data, f)
+    else:
+        # If file_data is bytes
+        with open(file_path, 'wb') as f:
+            f.write(file_data)
+    
+    return unique_filename
+
+class ReportTooLarge(ValueError):
+    """Raised when a medical report upload exceeds the configured maximum size."""
+
+def _copy_medical_report_stream(stream, filename, max_size, chunk_size):
+    """
+    Copies a medical report from a stream into the uploads directory in fixed-size
+    chunks, computing its size and SHA-256 on the way. The file is written under a
+    temporary name and only renamed into place once it is complete, so a failed or
+    oversized upload never leaves a partial report behind.
+    
+    Returns:
+        A tuple containing (stored_filename, file_size, sha256)
+    
+    Raises:
+        ReportTooLarge: If the stream is longer than max_size bytes
+    """
+    unique_filename = f"{uuid.uuid4()}_{filename}"
+    uploads_dir = ensure_upload_dir()
+    file_path = os.path.join(uploads_dir, unique_filename)
+    partial_path = file_path + ".part"
+    
+    digest = hashlib.sha256()
+    file_size = 0
+    try:
+        with open(partial_path, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise ReportTooLarge(f"File exceeds the maximum size of {max_size} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(partial_path, file_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    
+    return unique_filename, file_size, digest.hexdigest()
+
+def _medical_report_metadata(filename, stored_filename, file_type, file_size, description, sha256=None):
+    """
+    Builds the metadata document stored for a medical report.
+    """
+    metadata = {
+        "filename": filename,
+        "stored_filename": stored_filename,
+        "file_type": file_type,
+        "file_size": file_size,
+        "description": description,
+        "uploadDate": datetime.utcnow()
+    }
+    if sha256:
+        metadata["sha256"] = sha256
+    return metadata
+
+@timed_storage_call
+def store_medical_report(file_data, filename, file_type, file_size, description=None):
+    """
+    Stores a medical report file in the filesystem and metadata in MongoDB.
+    
+    Args:
+        file_data (bytes or file-like object): The file data or file object
+        filename (str): The name of the file
+        file_type (str): The MIME type of the file
+        file_size (int): The size of the file in bytes
+        description (str, optional): A description of the file
+    
+    Returns:
+        The ID of the inserted metadata record
+    """
+    unique_filename = _write_medical_report_file(file_data, filename)
+    
+    # Store metadata in MongoDB
+    client = get_mongo_client()
+    db = client["medical_reports_db"]
+    collection = db["medical_reports_metadata"]
+    
+    metadata = _medical_report_metadata(filename, unique_filename, file_type, file_size, description)
+    
+    result = collection.insert_one(metadata)
+    return result.inserted_id
+
+@timed_storage_call
+def store_medical_report_stream(stream, filename, file_type, description=None,
+                                max_size=MEDICAL_REPORT_MAX_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Stores a medical report read from a stream, without holding the whole file in
+    memory, and records its size and SHA-256 in the metadata.
+    
+    Args:
+        stream (file-like object): The file contents, read with stream.read(chunk_size)
+        filename (str): The name of the file
+        file_type (str): The MIME type of the file
+        description (str, optional): A description of the file
+        max_size (int, optional): The maximum accepted size in bytes
+        chunk_size (int, optional): The number of bytes read and written at a time
+    
+    Returns:
+        The stored metadata document, including its _id
+    
+    Raises:
+        ReportTooLarge: If the file is longer than max_size bytes
+    """
+    unique_filename, file_size, sha256 = _copy_medical_report_stream(stream, filename, max_size, chunk_size)
+    
+    # Store metadata in MongoDB
+    client = get_mongo_client()
+    db = client["medical_reports_db"]
+    collection = db["medical_reports_metadata"]
+    
+    metadata = _medical_report_metadata(filename, unique_filename, file_type, file_size, description, sha256)
+    try:
+        collection.insert_one(metadata)
+    except Exception:
+        os.remove(os.path.join(ensure_upload_dir(), unique_filename))
+        raise
+    return metadata
+
+# Metadata fields returned when listing medical reports
+MEDICAL_REPORT_LIST_FIELDS = ["filename", "file_type", "file_size", "description", "uploadDate"]
+
+@timed_storage_call
+def get_medical_reports(projection=None):
+    """
+    Retrieves a list of all medical reports metadata.
+    
+    Args:
+        projection (dict or list, optional): The fields to return; MEDICAL_REPORT_LIST_FIELDS when omitted
+    
+    Returns:
+        A list of medical report metadata
     """
     client = get_mongo_client()
     db = client["medical_reports_db"]
     collection = db["medical_reports_metadata"]
     
     # Get all metadata records
-    reports = collection.find().sort("uploadDate", -1)
-    
-    # Convert to list and format for JSON serialization
-    result = []
-    for report in reports:
-        result.append({
-            "_id": str(report["_id"]),
-            "filename": report["filename"],
-            "file_type": report["file_type"],
-            "file_size": report["file_size"],
-            "description": report.get("description"),
-            "uploadDate": report["uploadDate"].isoformat()
-        })
-    
-    return result
+    reports = collection.find({}, projection or MEDICAL_REPORT_LIST_FIELDS).sort("uploadDate", -1)
+    
+    return list(reports)
 
+@timed_storage_call
+def get_medical_reports_page(limit, after=None, projection=None):
+    """
+    Retrieves one page of medical reports metadata, newest first.
+    
+    Args:
+        limit (int): The maximum number of reports to return
+        after (str, optional): The next_cursor returned with the previous page
+        projection (dict or list, optional): The fields to return; MEDICAL_REPORT_LIST_FIELDS when omitted
+    
+    Returns:
+        A tuple containing (reports, next_cursor); next_cursor is None on the last page
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    client = get_mongo_client()
+    db = client["medical_reports_db"]
+    collection = db["medical_reports_metadata"]
+    
+    cursor = _page_cursor(
+        collection, {}, "uploadDate", -1, limit, after, projection or MEDICAL_REPORT_LIST_FIELDS
+    )
+    return _page_result(list(cursor), "uploadDate", limit)
+
+@timed_storage_call
 def get_medical_report(file_id):
     """
     Retrieves a specific medical report file.
@@ -367,14 +1181,15 @@ def get_medical_report(file_id):
     Returns:
         A tuple containing (file_path, filename, content_type)
     """
-    from bson.objectid import ObjectId
-    
     client = get_mongo_client()
     db = client["medical_reports_db"]
     collection = db["medical_reports_metadata"]
     
     # Get the metadata record
-    metadata = collection.find_one({"_id": ObjectId(file_id)})
+    metadata = collection.find_one(
+        {"_id": ObjectId(file_id)},
+        ["stored_filename", "filename", "file_type"]
+    )
     if not metadata:
         return None, None, None
     
@@ -388,6 +1203,48 @@ def get_medical_report(file_id):
     
     return file_path, metadata["filename"], metadata["file_type"]
 
+@timed_storage_call
+def get_medical_report_download(file_id):
+    """
+    Retrieves what is needed to serve a medical report download, including its
+    validators (SHA-256 and upload date), without touching the filesystem.
+    
+    Args:
+        file_id (str): The ID of the metadata record
+    
+    Returns:
+        A dictionary with file_path, stored_filename, filename, file_type, file_size,
+        sha256 (None for reports uploaded before hashes were recorded) and uploadDate,
+        or None if no such report exists
+    """
+    client = get_mongo_client()
+    db = client["medical_reports_db"]
+    collection = db["medical_reports_metadata"]
+    
+    metadata = collection.find_one(
+        {"_id": ObjectId(file_id)},
+        ["stored_filename", "filename", "file_type", "file_size", "sha256", "uploadDate"]
+    )
+    if not metadata:
+        return None
+    
+    return _medical_report_download(metadata)
+
+def _medical_report_download(metadata):
+    """
+    Builds the download description returned by get_medical_report_download.
+    """
+    return {
+        "file_path": os.path.join(ensure_upload_dir(), metadata["stored_filename"]),
+        "stored_filename": metadata["stored_filename"],
+        "filename": metadata["filename"],
+        "file_type": metadata["file_type"],
+        "file_size": metadata.get("file_size"),
+        "sha256": metadata.get("sha256"),
+        "uploadDate": metadata["uploadDate"],
+    }
+
+@timed_storage_call
 def delete_medical_report(file_id):
     """
     Deletes a specific medical report file.
@@ -398,14 +1255,12 @@ def delete_medical_report(file_id):
     Returns:
         True if the file was deleted, False otherwise
     """
-    from bson.objectid import ObjectId
-    
     client = get_mongo_client()
     db = client["medical_reports_db"]
     collection = db["medical_reports_metadata"]
     
     # Get the metadata record
-    metadata = collection.find_one({"_id": ObjectId(file_id)})
+    metadata = collection.find_one({"_id": ObjectId(file_id)}, ["stored_filename"])
     if not metadata:
         return False
     
@@ -420,4 +1275,396 @@ def delete_medical_report(file_id):
     # Delete the metadata record
     collection.delete_one({"_id": ObjectId(file_id)})
     
-    return True
\ No newline at end of file
+    return True
+
+# Deep analysis reports
+#
+# Each finished deep analysis is one document in analysis_reports_db.analysis_reports,
+# looked up by its unique report_id and listed newest first by timestamp.
+
+# Fields returned when listing deep analysis reports (the analysis content is left out)
+ANALYSIS_REPORT_LIST_FIELDS = ["report_id", "timestamp", "filenames", "file_count"]
+
+@timed_storage_call
+def store_analysis_report(report):
+    """
+    Stores a finished deep analysis report.
+    
+    Args:
+        report (dict): The report, with report_id, timestamp (datetime), file_ids,
+            filenames and content
+    
+    Returns:
+        The ID of the inserted report document
+    """
+    client = get_mongo_client()
+    db = client["analysis_reports_db"]
+    collection = db["analysis_reports"]
+    
+    report = dict(report, file_count=len(report.get("filenames", [])))
+    result = collection.insert_one(report)
+    return result.inserted_id
+
+@timed_storage_call
+def get_analysis_report(report_id):
+    """
+    Retrieves a deep analysis report by its report_id.
+    
+    Args:
+        report_id (str): The report ID
+    
+    Returns:
+        The report, or None if it does not exist
+    """
+    client = get_mongo_client()
+    db = client["analysis_reports_db"]
+    collection = db["analysis_reports"]
+    
+    return collection.find_one({"report_id": report_id}, {"_id": 0, "file_count": 0})
+
+@timed_storage_call
+def get_analysis_reports(projection=None):
+    """
+    Retrieves all deep analysis reports, newest first.
+    
+    Args:
+        projection (dict or list, optional): The fields to return; ANALYSIS_REPORT_LIST_FIELDS when omitted
+    
+    Returns:
+        A list of reports
+    """
+    client = get_mongo_client()
+    db = client["analysis_reports_db"]
+    collection = db["analysis_reports"]
+    
+    reports = collection.find({}, projection or ANALYSIS_REPORT_LIST_FIELDS).sort([("timestamp", -1), ("_id", -1)])
+    return list(reports)
+
+@timed_storage_call
+def get_analysis_reports_page(limit, after=None, projection=None):
+    """
+    Retrieves one page of deep analysis reports, newest first.
+    
+    Args:
+        limit (int): The maximum number of reports to return
+        after (str, optional): The next_cursor returned with the previous page
+        projection (dict or list, optional): The fields to return; ANALYSIS_REPORT_LIST_FIELDS when omitted
+    
+    Returns:
+        A tuple containing (reports, next_cursor); next_cursor is None on the last page
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    client = get_mongo_client()
+    db = client["analysis_reports_db"]
+    collection = db["analysis_reports"]
+    
+    cursor = _page_cursor(
+        collection, {}, "timestamp", -1, limit, after, projection or ANALYSIS_REPORT_LIST_FIELDS
+    )
+    return _page_result(list(cursor), "timestamp", limit)
+
+# Background jobs
+#
+# Jobs are documents in jobs_db.jobs, so every worker process sees the same queue.
+# Workers claim queued jobs atomically with find_one_and_update. Finished jobs get
+# an expires_at date and are removed by a TTL index (see storage/indexes.py).
+#
+# Jobs queued with max_active hold one of max_active slots, "<type>:<n>", in their
+# active_slot field until they finish. A sparse unique index on active_slot makes
+# taking a slot atomic: of two processes queueing a job into the last free slot,
+# one insert fails with a duplicate key error and that job is refused.
+#
+# A running job belongs to the worker that claimed it, which refreshes its
+# heartbeat_at while it runs. Jobs whose heartbeat stopped are queued again, up to
+# a maximum number of attempts; heartbeat and finish_job only apply while the job
+# is still running under the same worker, so a job that was taken over is not
+# finished (nor its slot released) by its previous worker.
+
+ACTIVE_JOB_STATUSES = ["queued", "running"]
+
+class JobQueueFull(Exception):
+    """Raised when a job cannot be queued because too many jobs are already active."""
+
+def _new_job(job_type, payload, fields):
+    return {
+        "_id": str(uuid.uuid4()),
+        "type": job_type,
+        "status": "queued",
+        "payload": payload,
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+        **fields
+    }
+
+def _free_job_slots(job_type, max_active, taken):
+    """Returns the slots of a job type not in taken, the active_slot documents of its active jobs."""
+    taken = {job["active_slot"] for job in taken}
+    slots = [f"{job_type}:{n}" for n in range(max_active)]
+    return [slot for slot in slots if slot not in taken]
+
+def _job_queue_full(job_type, max_active):
+    return JobQueueFull(f"Too many {job_type} jobs in progress ({max_active}); try again later")
+
+@timed_storage_call
+def enqueue_job(job_type, payload, max_active=None, **fields):
+    """
+    Queues a background job.
+    
+    Args:
+        job_type (str): The kind of job, e.g. "deep_analysis"
+        payload (dict): The job's input, passed to the worker
+        max_active (int, optional): Refuse the job if this many jobs of the type,
+            queued with max_active, are already queued or running
+        **fields: Extra fields stored on the job document
+    
+    Returns:
+        The job document, with its ID in _id
+    
+    Raises:
+        JobQueueFull: If max_active jobs are already queued or running
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    job = _new_job(job_type, payload, fields)
+    if max_active is None:
+        collection.insert_one(job)
+        return job
+    
+    taken = collection.find({"type": job_type, "active_slot": {"$exists": True}}, {"active_slot": 1})
+    for slot in _free_job_slots(job_type, max_active, taken):
+        try:
+            collection.insert_one({**job, "active_slot": slot})
+        except DuplicateKeyError:
+            # Another process took this slot since the lookup
+            continue
+        job["active_slot"] = slot
+        return job
+    raise _job_queue_full(job_type, max_active)
+
+@timed_storage_call
+def claim_next_job(job_type, worker_id):
+    """
+    Atomically takes the oldest queued job of a type and marks it as running.
+    
+    Args:
+        job_type (str): The kind of job to claim
+        worker_id (str): Identifies the claiming worker, for debugging
+    
+    Returns:
+        The claimed job document, or None if no job is queued
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    now = datetime.utcnow()
+    return collection.find_one_and_update(
+        {"type": job_type, "status": "queued"},
+        {
+            "$set": {"status": "running", "started_at": now, "heartbeat_at": now, "worker": worker_id},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+@timed_storage_call
+def heartbeat_job(job_id, worker_id):
+    """
+    Records that a worker is still running a job, so it is not considered abandoned.
+    
+    Args:
+        job_id (str): The ID of the job
+        worker_id (str): The worker that claimed the job
+    
+    Returns:
+        False if the job is no longer running under this worker, True otherwise
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    result = collection.update_one(
+        _running_job_query(job_id, worker_id), {"$set": {"heartbeat_at": datetime.utcnow()}}
+    )
+    return result.matched_count == 1
+
+@timed_storage_call
+def finish_job(job_id, worker_id, status, retention, **fields):
+    """
+    Records the outcome of a job, releases its slot and schedules it for removal.
+    
+    Args:
+        job_id (str): The ID of the job
+        worker_id (str): The worker that claimed the job
+        status (str): The final status, e.g. "completed" or "error"
+        retention (timedelta): How long the finished job is kept
+        **fields: Result fields stored on the job document
+    
+    Returns:
+        False if the job is no longer running under this worker (it was queued
+        again and taken over, or already finished), in which case nothing is
+        recorded; True otherwise
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    result = collection.update_one(
+        _running_job_query(job_id, worker_id), _finished_job_update(status, retention, fields)
+    )
+    return result.matched_count == 1
+
+@timed_storage_call
+def requeue_stale_jobs(job_type, stale_after, max_attempts, retention):
+    """
+    Queues running jobs again whose worker has not sent a heartbeat within
+    stale_after, e.g. because its process was restarted. Jobs that have already
+    been attempted max_attempts times are marked as failed instead, so a job that
+    crashes its worker is not retried forever.
+    
+    Args:
+        job_type (str): The kind of job
+        stale_after (timedelta): How long a job may go without a heartbeat before it is considered abandoned
+        max_attempts (int): How many times a job is started before it is given up
+        retention (timedelta): How long a job that is given up is kept
+    
+    Returns:
+        A tuple containing (the number of jobs queued again, the number of jobs given up)
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    failed = collection.update_many(
+        _stale_jobs_query(job_type, stale_after, {"$gte": max_attempts}),
+        _finished_job_update("error", retention, {"error": f"Abandoned after {max_attempts} attempts"})
+    )
+    requeued = collection.update_many(
+        _stale_jobs_query(job_type, stale_after, {"$lt": max_attempts}),
+        {"$set": {"status": "queued"}, "$unset": {"started_at": "", "heartbeat_at": "", "worker": ""}}
+    )
+    return requeued.modified_count, failed.modified_count
+
+def _running_job_query(job_id, worker_id):
+    return {"_id": job_id, "worker": worker_id, "status": "running"}
+
+def _finished_job_update(status, retention, fields):
+    finished_at = datetime.utcnow()
+    return {
+        "$set": {"status": status, "finished_at": finished_at, "expires_at": finished_at + retention, **fields},
+        "$unset": {"active_slot": ""}
+    }
+
+def _stale_jobs_query(job_type, stale_after, attempts):
+    """
+    Builds the filter selecting the running jobs of a type whose last heartbeat (or
+    start, for jobs claimed before heartbeats were recorded) is older than stale_after.
+    """
+    cutoff = datetime.utcnow() - stale_after
+    return {
+        "type": job_type,
+        "status": "running",
+        "attempts": attempts,
+        "$or": [
+            {"heartbeat_at": {"$lt": cutoff}},
+            {"heartbeat_at": {"$exists": False}, "started_at": {"$lt": cutoff}}
+        ]
+    }
+
+@timed_storage_call
+def get_job(job_id, projection=None):
+    """
+    Retrieves a job by its ID.
+    
+    Args:
+        job_id (str): The ID of the job
+        projection (dict or list, optional): The fields to return; all fields when omitted
+    
+    Returns:
+        The job document, or None if it does not exist (or has expired)
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    return collection.find_one({"_id": job_id}, projection)
+
+@timed_storage_call
+def count_active_jobs(job_type):
+    """
+    Counts the queued and running jobs of a type.
+    
+    Args:
+        job_type (str): The kind of job
+    
+    Returns:
+        dict: The number of jobs per active status, e.g. {"queued": 3, "running": 2}
+    """
+    client = get_mongo_client()
+    db = client["jobs_db"]
+    collection = db["jobs"]
+    
+    counts = {status: 0 for status in ACTIVE_JOB_STATUSES}
+    pipeline = [
+        {"$match": {"type": job_type, "status": {"$in": ACTIVE_JOB_STATUSES}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    for row in collection.aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+# Intent classifications of chat messages
+#
+# Every chat message's classification is logged with its source: "local" for the
+# in-process intent model, "llm" for the intent classifier agent. The LLM-labelled
+# messages are the training data of the local model (scripts/train_intent_classifier.py).
+# Entries are removed by a TTL index on expires_at (see storage/indexes.py).
+
+@timed_storage_call
+def store_intent_classification(data, retention):
+    """
+    Logs the intent classification of a chat message.
+    
+    Args:
+        data (dict): The message, intent, confidence and source
+        retention (timedelta): How long the entry is kept
+    
+    Returns:
+        The ID of the inserted document
+    """
+    client = get_mongo_client()
+    db = client["intent_db"]
+    collection = db["intent_classifications"]
+    
+    timestamp = data.get("timestamp") or datetime.utcnow()
+    result = collection.insert_one({**data, "timestamp": timestamp, "expires_at": timestamp + retention})
+    return result.inserted_id
+
+@timed_storage_call
+def get_intent_classifications(source=None, min_confidence=None, projection=None):
+    """
+    Retrieves logged intent classifications, oldest first.
+    
+    Args:
+        source (str, optional): Only classifications from this source ("local" or "llm")
+        min_confidence (float, optional): Only classifications at least this confident
+        projection (dict or list, optional): The fields to return; all fields when omitted
+    
+    Returns:
+        A list of classification documents
+    """
+    client = get_mongo_client()
+    db = client["intent_db"]
+    collection = db["intent_classifications"]
+    
+    query = {}
+    if source is not None:
+        query["source"] = source
+    if min_confidence is not None:
+        query["confidence"] = {"$gte": min_confidence}
+    return list(collection.find(query, projection).sort("timestamp", 1))
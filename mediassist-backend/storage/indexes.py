@@ -0,0 +1,374 @@
+import sys
+import os
+import argparse
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage.client import get_mongo_client, USER_PROFILE_ID
+from storage.migrations import run_migrations
+
+# Index definitions for every MediAssist collection.
+#
+# Each entry lists the indexes a collection needs together with representative
+# queries taken from storage/client.py and tools/tools.py. verify_indexes() runs
+# explain() on those queries to check that they are served by the expected index.
+# Queries with a "projection" read only indexed fields and must be covered, i.e.
+# answered from the index without fetching any document.
+# Indexes listed under "obsolete" were superseded and are dropped by ensure_indexes().
+_SAMPLE_DATE = datetime(1970, 1, 1)
+
+INDEXES = [
+    {
+        "db": "nutrition_db",
+        "collection": "nutrition_data",
+        "indexes": [
+            IndexModel([("timestamp", ASCENDING), ("_id", ASCENDING)], name="timestamp_1__id_1"),
+        ],
+        "obsolete": ["timestamp_1"],
+        "queries": [
+            # get_nutrition_data_for_period, get_nutritional_info
+            {
+                "index": "timestamp_1__id_1",
+                "filter": {"timestamp": {"$gte": _SAMPLE_DATE, "$lte": _SAMPLE_DATE}},
+                "sort": [("timestamp", ASCENDING)],
+            },
+            # get_nutrition_data_page
+            {
+                "index": "timestamp_1__id_1",
+                "filter": {"timestamp": {"$gte": _SAMPLE_DATE, "$lte": _SAMPLE_DATE}},
+                "sort": [("timestamp", ASCENDING), ("_id", ASCENDING)],
+            },
+            # get_latest_nutrition_data
+            {
+                "index": "timestamp_1__id_1",
+                "filter": {"timestamp": {"$gte": _SAMPLE_DATE, "$lte": _SAMPLE_DATE}},
+                "sort": [("timestamp", DESCENDING), ("_id", DESCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "nutrition_db",
+        "collection": "nutrition_daily_rollup",
+        "indexes": [
+            IndexModel([("date", ASCENDING)], name="date_1", unique=True),
+        ],
+        "queries": [
+            # get_nutrition_daily_rollup
+            {
+                "index": "date_1",
+                "filter": {"date": {"$gte": "1970-01-01", "$lte": "1970-01-31"}},
+                "sort": [("date", ASCENDING)],
+            },
+            # rebuild_nutrition_daily_rollup, the days already in the rollup
+            {
+                "index": "date_1",
+                "filter": {"date": {"$gte": "1970-01-01", "$lte": "1970-01-31"}},
+                "sort": None,
+                "projection": {"date": 1, "_id": 0},
+            },
+        ],
+    },
+    {
+        "db": "insights_db",
+        "collection": "insights_data",
+        "indexes": [
+            IndexModel([("analysis_type", ASCENDING), ("date", DESCENDING)], name="analysis_type_1_date_-1"),
+        ],
+        "queries": [
+            # get_most_recent_insights, get_most_recent_daily_insights, get_most_recent_weekly_insights
+            {
+                "index": "analysis_type_1_date_-1",
+                "filter": {"analysis_type": "daily"},
+                "sort": [("date", DESCENDING)],
+            },
+            # get_daily_insights_for_range
+            {
+                "index": "analysis_type_1_date_-1",
+                "filter": {"analysis_type": "daily", "date": {"$gte": _SAMPLE_DATE, "$lte": _SAMPLE_DATE}},
+                "sort": [("date", ASCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "user_profile_db",
+        "collection": "user_profile_data",
+        "indexes": [
+            IndexModel(
+                [("profile_id", ASCENDING)],
+                name="profile_id_1",
+                unique=True,
+                partialFilterExpression={"profile_id": {"$exists": True}},
+            ),
+        ],
+        "obsolete": ["timestamp_-1"],
+        "queries": [
+            # get_user_profile_data, store_user_profile_data
+            {
+                "index": "profile_id_1",
+                "filter": {"profile_id": USER_PROFILE_ID},
+                "sort": None,
+            },
+        ],
+    },
+    {
+        "db": "medical_conditions_db",
+        "collection": "medical_conditions_data",
+        "indexes": [
+            IndexModel([("condition_type", ASCENDING)], name="condition_type_1"),
+        ],
+        "queries": [
+            # get_medical_conditions tool
+            {
+                "index": "condition_type_1",
+                "filter": {"condition_type": "chronic"},
+                "sort": None,
+            },
+        ],
+    },
+    {
+        "db": "medical_reports_db",
+        "collection": "medical_reports_metadata",
+        "indexes": [
+            IndexModel([("uploadDate", DESCENDING), ("_id", DESCENDING)], name="uploadDate_-1__id_-1"),
+        ],
+        "obsolete": ["uploadDate_-1"],
+        "queries": [
+            # get_medical_reports
+            {
+                "index": "uploadDate_-1__id_-1",
+                "filter": {},
+                "sort": [("uploadDate", DESCENDING)],
+            },
+            # get_medical_reports_page
+            {
+                "index": "uploadDate_-1__id_-1",
+                "filter": {},
+                "sort": [("uploadDate", DESCENDING), ("_id", DESCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "analysis_reports_db",
+        "collection": "analysis_reports",
+        "indexes": [
+            IndexModel([("report_id", ASCENDING)], name="report_id_1", unique=True),
+            IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_-1__id_-1"),
+        ],
+        "queries": [
+            # get_analysis_report
+            {
+                "index": "report_id_1",
+                "filter": {"report_id": "19700101_000000"},
+                "sort": None,
+            },
+            # import_analysis_report_files (storage/migrations.py), the reports already stored
+            {
+                "index": "report_id_1",
+                "filter": {"report_id": {"$in": ["19700101_000000", "19700102_000000"]}},
+                "sort": None,
+                "projection": {"report_id": 1, "_id": 0},
+            },
+            # get_analysis_reports, get_analysis_reports_page
+            {
+                "index": "timestamp_-1__id_-1",
+                "filter": {},
+                "sort": [("timestamp", DESCENDING), ("_id", DESCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "jobs_db",
+        "collection": "jobs",
+        "indexes": [
+            IndexModel(
+                [("type", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)],
+                name="type_1_status_1_created_at_1",
+            ),
+            # Removes finished jobs once their expires_at date has passed
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+            # Lets each max_active slot be held by one active job (see enqueue_job)
+            IndexModel([("active_slot", ASCENDING)], name="active_slot_1", unique=True, sparse=True),
+        ],
+        "queries": [
+            # claim_next_job
+            {
+                "index": "type_1_status_1_created_at_1",
+                "filter": {"type": "deep_analysis", "status": "queued"},
+                "sort": [("created_at", ASCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "intent_db",
+        "collection": "intent_classifications",
+        "indexes": [
+            IndexModel([("source", ASCENDING), ("timestamp", ASCENDING)], name="source_1_timestamp_1"),
+            # Removes logged classifications once their expires_at date has passed
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+        ],
+        "queries": [
+            # get_intent_classifications
+            {
+                "index": "source_1_timestamp_1",
+                "filter": {"source": "llm", "confidence": {"$gte": 0.8}},
+                "sort": [("timestamp", ASCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "checkpoint_db",
+        "collection": "checkpoints",
+        "indexes": [
+            IndexModel(
+                [("graph", ASCENDING), ("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", ASCENDING)],
+                name="graph_1_thread_id_1_checkpoint_ns_1_checkpoint_id_1",
+                unique=True,
+            ),
+            # Removes checkpoints once their expires_at date has passed (see graphs/checkpointer.py)
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+        ],
+        "queries": [
+            # MongoSaver.get_tuple, the thread's latest checkpoint
+            {
+                "index": "graph_1_thread_id_1_checkpoint_ns_1_checkpoint_id_1",
+                "filter": {"graph": "frontend", "thread_id": "1", "checkpoint_ns": ""},
+                "sort": [("checkpoint_id", DESCENDING)],
+            },
+        ],
+    },
+    {
+        "db": "checkpoint_db",
+        "collection": "checkpoint_writes",
+        "indexes": [
+            IndexModel(
+                [("graph", ASCENDING), ("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                 ("checkpoint_id", ASCENDING), ("task_id", ASCENDING), ("idx", ASCENDING)],
+                name="graph_1_thread_id_1_checkpoint_ns_1_checkpoint_id_1_task_id_1_idx_1",
+                unique=True,
+            ),
+            IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+        ],
+        "queries": [
+            # MongoSaver.get_tuple, the pending writes of a checkpoint
+            {
+                "index": "graph_1_thread_id_1_checkpoint_ns_1_checkpoint_id_1_task_id_1_idx_1",
+                "filter": {"graph": "frontend", "thread_id": "1", "checkpoint_ns": "", "checkpoint_id": "1"},
+                "sort": [("task_id", ASCENDING), ("idx", ASCENDING)],
+            },
+        ],
+    },
+]
+
+def bootstrap_storage():
+    """
+    Prepares the database for the application: runs data migrations, then creates indexes.
+
+    Returns:
+        A list of "db.collection.index" names that are in place
+    """
+    for name in run_migrations():
+        print(f"Migration applied: {name}")
+    return ensure_indexes()
+
+def ensure_indexes():
+    """
+    Creates all indexes defined in INDEXES and drops superseded ones. Safe to run
+    repeatedly: MongoDB treats creating an index that already exists with the same
+    spec as a no-op.
+
+    Returns:
+        A list of "db.collection.index" names that are in place
+    """
+    client = get_mongo_client()
+    ensured = []
+
+    for spec in INDEXES:
+        collection = client[spec["db"]][spec["collection"]]
+        names = collection.create_indexes(spec["indexes"])
+
+        existing = collection.index_information()
+        for obsolete in spec.get("obsolete", []):
+            if obsolete in existing:
+                collection.drop_index(obsolete)
+        ensured.extend(f"{spec['db']}.{spec['collection']}.{name}" for name in names)
+
+    return ensured
+
+def _plan_stages(plan):
+    """
+    Flattens a query plan tree into a list of (stage, indexName) tuples.
+    """
+    stages = [(plan.get("stage"), plan.get("indexName"))]
+    if "inputStage" in plan:
+        stages.extend(_plan_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    # Slot-based execution engine wraps the classic plan in queryPlan
+    if "queryPlan" in plan:
+        stages.extend(_plan_stages(plan["queryPlan"]))
+    return stages
+
+def verify_indexes():
+    """
+    Runs explain() on the representative queries of every collection and checks
+    that each one is served by its expected index, without a collection scan or
+    an in-memory sort, and without fetching documents when it has a projection.
+
+    Returns:
+        A list of dictionaries describing each checked query, with an "ok" flag
+    """
+    client = get_mongo_client()
+    results = []
+
+    for spec in INDEXES:
+        collection = client[spec["db"]][spec["collection"]]
+        for query in spec["queries"]:
+            projection = query.get("projection")
+            cursor = collection.find(query["filter"], projection)
+            if query["sort"]:
+                cursor = cursor.sort(query["sort"])
+            explanation = cursor.explain()
+
+            stages = _plan_stages(explanation["queryPlanner"]["winningPlan"])
+            stage_names = [stage for stage, _ in stages]
+            uses_index = any(stage == "IXSCAN" and name == query["index"] for stage, name in stages)
+            covered = projection is None or "FETCH" not in stage_names
+
+            results.append({
+                "collection": f"{spec['db']}.{spec['collection']}",
+                "index": query["index"],
+                "filter": query["filter"],
+                "sort": query["sort"],
+                "projection": projection,
+                "stages": stage_names,
+                "ok": uses_index and covered and "COLLSCAN" not in stage_names and "SORT" not in stage_names,
+            })
+
+    return results
+
+def main():
+    """Run data migrations, create MediAssist indexes and optionally verify them with explain()"""
+    parser = argparse.ArgumentParser(description="Migrate MediAssist data, then create and verify MongoDB indexes")
+    parser.add_argument("--verify", action="store_true", help="Check query plans with explain() after creating indexes")
+    args = parser.parse_args()
+
+    for name in bootstrap_storage():
+        print(f"Index ready: {name}")
+
+    if args.verify:
+        failures = 0
+        for result in verify_indexes():
+            status = "OK  " if result["ok"] else "FAIL"
+            print(f"{status} {result['collection']} via {result['index']}: {' -> '.join(result['stages'])}")
+            if not result["ok"]:
+                failures += 1
+        if failures:
+            print(f"{failures} queries are not served by their expected index.")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
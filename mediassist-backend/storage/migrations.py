@@ -0,0 +1,102 @@
+"""
+Data migrations, applied by bootstrap_storage() (see storage/indexes.py) before the
+indexes are created.
+
+Each migration is idempotent and returns True if it changed data, so it can run on
+every startup.
+"""
+import sys
+import os
+import json
+from datetime import datetime
+
+from pymongo import DESCENDING
+
+# Add the mediassist-backend directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage.client import get_mongo_client, USER_PROFILE_ID
+
+def migrate_user_profile_key():
+    """
+    Assigns the fixed profile key to the most recent legacy profile document, which
+    was previously selected by sorting on timestamp. Does nothing once a keyed
+    profile exists.
+
+    Returns:
+        True if a legacy profile was migrated, False otherwise
+    """
+    collection = get_mongo_client()["user_profile_db"]["user_profile_data"]
+
+    if collection.find_one({"profile_id": USER_PROFILE_ID}, {"_id": 1}):
+        return False
+
+    migrated = collection.find_one_and_update(
+        {"profile_id": {"$exists": False}},
+        {"$set": {"profile_id": USER_PROFILE_ID}},
+        sort=[("timestamp", DESCENDING)],
+    )
+    return migrated is not None
+
+# Directory where deep analysis reports were written as JSON files before they were stored in MongoDB
+LEGACY_ANALYSIS_REPORTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'reports'))
+
+def import_analysis_report_files():
+    """
+    Imports deep analysis reports written as deep_analysis_<report_id>.json files
+    into the analysis_reports collection. Files whose report_id is already stored
+    are not read again. The files are left in place.
+
+    Returns:
+        True if any report was imported, False otherwise
+    """
+    if not os.path.isdir(LEGACY_ANALYSIS_REPORTS_DIR):
+        return False
+
+    report_files = {
+        filename[len("deep_analysis_"):-len(".json")]: filename
+        for filename in os.listdir(LEGACY_ANALYSIS_REPORTS_DIR)
+        if filename.startswith("deep_analysis_") and filename.endswith(".json")
+    }
+    if not report_files:
+        return False
+
+    collection = get_mongo_client()["analysis_reports_db"]["analysis_reports"]
+    stored = {
+        report["report_id"]
+        for report in collection.find({"report_id": {"$in": list(report_files)}}, {"report_id": 1, "_id": 0})
+    }
+
+    imported = False
+    for report_id, filename in report_files.items():
+        if report_id in stored:
+            continue
+        try:
+            with open(os.path.join(LEGACY_ANALYSIS_REPORTS_DIR, filename)) as f:
+                report = json.load(f)
+            report["report_id"] = report.get("report_id") or report_id
+            report["timestamp"] = datetime.fromisoformat(report["timestamp"])
+            report["file_count"] = len(report.get("filenames", []))
+        except Exception as e:
+            print(f"Skipping unreadable analysis report {filename}: {e}")
+            continue
+
+        result = collection.update_one({"report_id": report["report_id"]}, {"$setOnInsert": report}, upsert=True)
+        imported = imported or result.upserted_id is not None
+
+    return imported
+
+# Data migrations run before the indexes are created, in order
+MIGRATIONS = [
+    migrate_user_profile_key,
+    import_analysis_report_files,
+]
+
+def run_migrations():
+    """
+    Runs every data migration in MIGRATIONS. Each migration is idempotent.
+
+    Returns:
+        A list of the names of migrations that changed data
+    """
+    return [migration.__name__ for migration in MIGRATIONS if migration()]
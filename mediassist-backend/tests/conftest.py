@@ -0,0 +1,93 @@
+"""
+Shared fixtures for the storage tests.
+
+The `storage` fixture runs each test twice, once through storage.client and once
+through storage.aio, against an in-memory MongoDB (mongomock and
+mongomock-motor), so both backends are held to the same behaviour.
+"""
+import asyncio
+import os
+import sys
+
+import mongomock
+import pytest
+from mongomock.collection import BulkOperationBuilder
+from mongomock_motor import AsyncMongoMockClient
+
+# Add the mediassist-backend directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import storage.client as storage_client
+from storage import aio as storage_aio
+from storage.indexes import INDEXES
+
+# PyMongo passes a sort argument with every bulk update and replace, which mongomock does not accept
+_add_update = BulkOperationBuilder.add_update
+BulkOperationBuilder.add_update = lambda self, *args, sort=None, **kwargs: _add_update(self, *args, **kwargs)
+_add_replace = BulkOperationBuilder.add_replace
+BulkOperationBuilder.add_replace = lambda self, *args, sort=None, **kwargs: _add_replace(self, *args, **kwargs)
+
+def _index_arguments(spec):
+    """
+    Yields the create_index arguments of a collection's indexes. mongomock stores
+    indexes made by create_indexes with different key options than create_index,
+    so the storage functions' own create_index calls would conflict with them.
+    """
+    for index in spec["indexes"]:
+        options = dict(index.document)
+        yield list(options.pop("key").items()), options
+
+class SyncStorage:
+    """Calls storage.client functions."""
+
+    name = "sync"
+
+    def __getattr__(self, function):
+        return getattr(storage_client, function)
+
+class AsyncStorage:
+    """Calls storage.aio functions, running each coroutine to completion."""
+
+    name = "async"
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def __getattr__(self, function):
+        coroutine_function = getattr(storage_aio, function)
+        return lambda *args, **kwargs: self.loop.run_until_complete(coroutine_function(*args, **kwargs))
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    """Stores medical report files in a temporary directory."""
+    ensure = lambda: str(tmp_path)
+    monkeypatch.setattr(storage_client, "ensure_upload_dir", ensure)
+    monkeypatch.setattr(storage_aio, "ensure_upload_dir", ensure)
+    return tmp_path
+
+@pytest.fixture(params=["sync", "async"])
+def storage(request, monkeypatch):
+    """The storage functions of one backend, on an empty database with its indexes."""
+    storage_client.user_profile_cache.invalidate()
+    storage_client.medical_conditions_cache.invalidate()
+
+    if request.param == "sync":
+        client = mongomock.MongoClient()
+        for spec in INDEXES:
+            for keys, options in _index_arguments(spec):
+                client[spec["db"]][spec["collection"]].create_index(keys, **options)
+        monkeypatch.setattr(storage_client, "_client", client)
+        monkeypatch.setattr(storage_client, "_client_pid", os.getpid())
+        yield SyncStorage()
+        return
+
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(storage_aio, "get_mongo_client", lambda: client)
+    loop = asyncio.new_event_loop()
+    for spec in INDEXES:
+        for keys, options in _index_arguments(spec):
+            loop.run_until_complete(client[spec["db"]][spec["collection"]].create_index(keys, **options))
+    try:
+        yield AsyncStorage(loop)
+    finally:
+        loop.close()
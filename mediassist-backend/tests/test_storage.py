@@ -0,0 +1,172 @@
+import io
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import storage.client as storage_client
+from storage import aio as storage_aio
+from storage.client import JobQueueFull, ReportTooLarge
+
+def test_user_profile_updates_are_merged(storage):
+    storage.store_user_profile_data({"age": 35, "gender": "female"})
+    storage.store_user_profile_data({"weight": 70})
+
+    profile = storage.get_user_profile_data()
+    assert (profile["age"], profile["gender"], profile["weight"]) == (35, "female", 70)
+
+    assert storage.get_user_profile_data(projection={"_id": 0, "weight": 1}) == {"weight": 70}
+
+def test_user_profile_is_none_before_first_store(storage):
+    assert storage.get_user_profile_data() is None
+
+def test_nutrition_pages_cover_every_entry_once(storage):
+    start = datetime(2025, 1, 1, 8)
+    # Two entries share a timestamp, so the cursor has to break the tie on _id
+    timestamps = [start, start, start + timedelta(hours=1), start + timedelta(hours=2), start + timedelta(hours=3)]
+    storage.store_nutrition_data_many([
+        {"food_name": f"food {i}", "calories": 100, "timestamp": timestamp}
+        for i, timestamp in enumerate(timestamps)
+    ])
+
+    pages = []
+    cursor = None
+    while True:
+        entries, cursor = storage.get_nutrition_data_page(start, start + timedelta(days=1), 2, after=cursor)
+        pages.append([entry["food_name"] for entry in entries])
+        if cursor is None:
+            break
+
+    assert pages == [["food 0", "food 1"], ["food 2", "food 3"], ["food 4"]]
+
+def test_nutrition_rollup_adds_up_entries_per_day(storage):
+    day = datetime(2025, 1, 1)
+    storage.store_nutrition_data({"food_name": "oatmeal", "calories": 300, "protein": 10,
+                                  "carbohydrates": 50, "fats": 5, "timestamp": day + timedelta(hours=8)})
+    storage.store_nutrition_data_many([
+        {"food_name": "salad", "calories": 200, "protein": 5, "carbohydrates": 20, "fats": 10,
+         "timestamp": day + timedelta(hours=13)},
+        {"food_name": "pasta", "calories": 600, "protein": 20, "carbohydrates": 90, "fats": 15,
+         "timestamp": day + timedelta(days=1, hours=19)},
+    ])
+
+    rollup = storage.get_nutrition_daily_rollup(day, day + timedelta(days=1))
+    assert [(row["date"], row["calories"], row["protein"], row["entries"]) for row in rollup] == [
+        ("2025-01-01", 500, 15, 2),
+        ("2025-01-02", 600, 20, 1),
+    ]
+
+def test_nutrition_rollup_rebuild_matches_the_entries(storage):
+    day = datetime(2025, 1, 1)
+    storage.store_nutrition_data_many([
+        {"food_name": "oatmeal", "calories": 300, "timestamp": day + timedelta(hours=8)},
+        {"food_name": "salad", "calories": 200, "timestamp": day + timedelta(hours=13)},
+        {"food_name": "pasta", "calories": 600, "timestamp": day + timedelta(days=1, hours=19)},
+    ])
+    before = storage.get_nutrition_daily_rollup(day, day + timedelta(days=1))
+
+    assert storage.rebuild_nutrition_daily_rollup() == 2
+    assert storage.rebuild_nutrition_daily_rollup(day + timedelta(hours=12), day + timedelta(hours=12)) == 1
+    assert storage.get_nutrition_daily_rollup(day, day + timedelta(days=1)) == before
+
+def test_latest_nutrition_data_is_newest_first(storage):
+    start = datetime(2025, 1, 1)
+    storage.store_nutrition_data_many([
+        {"food_name": f"food {i}", "calories": 100, "timestamp": start + timedelta(hours=i)}
+        for i in range(8)
+    ])
+
+    latest = storage.get_latest_nutrition_data(start, start + timedelta(days=1), 3, projection={"food_name": 1, "_id": 0})
+    assert latest == [{"food_name": "food 7"}, {"food_name": "food 6"}, {"food_name": "food 5"}]
+
+def test_jobs_are_claimed_oldest_first(storage):
+    first = storage.enqueue_job("deep_analysis", {"n": 1})
+    storage.enqueue_job("deep_analysis", {"n": 2})
+
+    job = storage.claim_next_job("deep_analysis", "worker-1")
+    assert job["_id"] == first["_id"]
+    assert (job["status"], job["attempts"], job["worker"]) == ("running", 1, "worker-1")
+
+    assert storage.claim_next_job("deep_analysis", "worker-1")["payload"] == {"n": 2}
+    assert storage.claim_next_job("deep_analysis", "worker-1") is None
+
+def test_enqueue_job_refuses_beyond_max_active(storage):
+    storage.enqueue_job("deep_analysis", {}, max_active=2)
+    storage.enqueue_job("deep_analysis", {}, max_active=2)
+    with pytest.raises(JobQueueFull):
+        storage.enqueue_job("deep_analysis", {}, max_active=2)
+
+    # Finished jobs no longer count towards the limit
+    job = storage.claim_next_job("deep_analysis", "worker-1")
+    assert storage.finish_job(job["_id"], "worker-1", "completed", timedelta(days=1)) is True
+    storage.enqueue_job("deep_analysis", {}, max_active=2)
+
+# Treats every running job as stale, whatever the clock resolution of its heartbeat
+ALL_STALE = timedelta(seconds=-1)
+
+def test_jobs_taken_over_are_not_finished_by_their_previous_worker(storage):
+    storage.enqueue_job("deep_analysis", {}, max_active=1)
+    job = storage.claim_next_job("deep_analysis", "worker-1")
+    assert storage.heartbeat_job(job["_id"], "worker-1") is True
+
+    # worker-1 stops sending heartbeats and worker-2 takes the job over
+    assert storage.requeue_stale_jobs("deep_analysis", ALL_STALE, 3, timedelta(days=1)) == (1, 0)
+    assert storage.claim_next_job("deep_analysis", "worker-2")["attempts"] == 2
+
+    assert storage.heartbeat_job(job["_id"], "worker-1") is False
+    assert storage.finish_job(job["_id"], "worker-1", "completed", timedelta(days=1)) is False
+    # The job still holds its slot until worker-2 finishes it
+    with pytest.raises(JobQueueFull):
+        storage.enqueue_job("deep_analysis", {}, max_active=1)
+
+    assert storage.finish_job(job["_id"], "worker-2", "completed", timedelta(days=1)) is True
+    assert storage.get_job(job["_id"])["worker"] == "worker-2"
+
+def test_stale_jobs_are_given_up_after_max_attempts(storage):
+    job = storage.enqueue_job("deep_analysis", {}, max_active=1)
+    for attempt in range(2):
+        storage.claim_next_job("deep_analysis", f"worker-{attempt}")
+        assert storage.requeue_stale_jobs("deep_analysis", ALL_STALE, 2, timedelta(days=1)) == (1 - attempt, attempt)
+
+    job = storage.get_job(job["_id"])
+    assert (job["status"], job["attempts"]) == ("error", 2)
+    assert "active_slot" not in job
+    assert storage.requeue_stale_jobs("deep_analysis", ALL_STALE, 2, timedelta(days=1)) == (0, 0)
+
+def test_enqueue_job_gate_holds_when_a_slot_is_taken_concurrently(storage, monkeypatch):
+    storage.enqueue_job("deep_analysis", {}, max_active=2)
+
+    # As if every slot looked free, e.g. another process queued a job since the lookup
+    all_slots = lambda job_type, max_active, taken: [f"{job_type}:{n}" for n in range(max_active)]
+    monkeypatch.setattr(storage_client, "_free_job_slots", all_slots)
+    monkeypatch.setattr(storage_aio, "_free_job_slots", all_slots)
+
+    assert storage.enqueue_job("deep_analysis", {}, max_active=2)["active_slot"] == "deep_analysis:1"
+    with pytest.raises(JobQueueFull):
+        storage.enqueue_job("deep_analysis", {}, max_active=2)
+
+def test_medical_report_stream_is_stored_with_size_and_checksum(storage, upload_dir):
+    content = b"%PDF-1.4 report" * 1000
+    metadata = storage.store_medical_report_stream(
+        io.BytesIO(content), "report.pdf", "application/pdf", "Blood test", chunk_size=4096
+    )
+
+    assert metadata["file_size"] == len(content)
+    assert metadata["sha256"] == hashlib.sha256(content).hexdigest()
+    download = storage.get_medical_report_download(str(metadata["_id"]))
+    with open(download["file_path"], "rb") as f:
+        assert f.read() == content
+    assert download["filename"] == "report.pdf"
+
+    assert storage.delete_medical_report(str(metadata["_id"])) is True
+    assert os.listdir(upload_dir) == []
+    assert storage.get_medical_report_download(str(metadata["_id"])) is None
+
+def test_oversized_medical_report_leaves_no_file(storage, upload_dir):
+    with pytest.raises(ReportTooLarge):
+        storage.store_medical_report_stream(io.BytesIO(b"x" * 10000), "big.pdf", "application/pdf",
+                                            max_size=4096, chunk_size=1024)
+
+    assert os.listdir(upload_dir) == []
+    assert storage.get_medical_reports() == []
@@ -3,7 +3,16 @@ from langchain_core.tools import tool
 from langgraph.prebuilt import ToolNode
 
 from datetime import datetime, timedelta
-from storage.client import get_mongo_client, get_user_profile_data
+from storage.client import (
+    get_mongo_client, get_user_profile_data, get_nutrition_daily_rollup, get_nutrition_data_for_period,
+    get_medical_conditions_data
+)
+
+# Fields returned to the LLM by the tools below; database IDs are never useful to it
+NUTRITION_ENTRY_FIELDS = {"food_name": 1, "calories": 1, "protein": 1, "carbohydrates": 1, "fats": 1, "timestamp": 1, "_id": 0}
+NUTRITION_ENTRY_NAME_FIELDS = {"food_name": 1, "timestamp": 1, "_id": 0}
+USER_PROFILE_FIELDS = {"age": 1, "gender": 1, "height": 1, "weight": 1, "_id": 0}
+MEDICAL_CONDITION_FIELDS = {"_id": 0}
 
 @tool(parse_docstring=True)
 def get_nutritional_info(time_range: str) -> str:
@@ -12,17 +21,25 @@ def get_nutritional_info(time_range: str) -> str:
     Args:
         time_range: daily or weekly
     """
-    # MongoDB connection setup
-    client = get_mongo_client()
-    db = client["nutrition_db"]
-    collection = db["nutrition_data"]
+    end_date = datetime.utcnow()
     # Fetch data from the collection
     if time_range == "daily":
-        data = collection.find({"timestamp": {"$gte": datetime.utcnow() - timedelta(days=1)}})
-        return json.dumps(list(data), default=str)
+        # The entries of the last 24 hours; the rollup only has whole days, so the
+        # totals are those of both calendar days the window touches
+        start_date = end_date - timedelta(days=1)
+        return json.dumps({
+            "daily_totals": get_nutrition_daily_rollup(start_date, end_date),
+            "daily_totals_note": "Totals of the whole UTC calendar days overlapping the last 24 hours; "
+                                 "entries cover the last 24 hours only.",
+            "entries": get_nutrition_data_for_period(start_date, end_date, NUTRITION_ENTRY_FIELDS)
+        }, default=str)
     elif time_range == "weekly":
-        data = collection.find({"timestamp": {"$gte": datetime.utcnow() - timedelta(weeks=1)}})
-        return json.dumps(list(data), default=str)
+        # Per-day totals from the rollup, and only the names of the foods eaten
+        start_date = end_date - timedelta(weeks=1)
+        return json.dumps({
+            "daily_totals": get_nutrition_daily_rollup(start_date, end_date),
+            "entries": get_nutrition_data_for_period(start_date, end_date, NUTRITION_ENTRY_NAME_FIELDS)
+        }, default=str)
     else:
         return "Invalid time range. Please specify 'daily' or 'weekly'."
 
@@ -31,7 +48,7 @@ def get_user_profile() -> str:
     """Fetches the user profile information from the DB
     """
     # Get user profile data
-    profile_data = get_user_profile_data()
+    profile_data = get_user_profile_data(projection=USER_PROFILE_FIELDS)
     return json.dumps(profile_data, default=str) if profile_data else "{}"
 
 @tool(parse_docstring=True)
@@ -41,20 +58,18 @@ def get_medical_conditions(condition_type: str = None) -> str:
     Args:
         condition_type: Optional. Filter by 'temporary' or 'chronic'. If not provided, returns all conditions.
     """
-    # MongoDB connection setup
-    client = get_mongo_client()
-    db = client["medical_conditions_db"]
-    collection = db["medical_conditions_data"]
-    
     # Fetch data from the collection
     if condition_type and condition_type.lower() in ['temporary', 'chronic']:
         # If condition_type is provided, filter by it
-        data = collection.find({"condition_type": condition_type.lower()})
+        client = get_mongo_client()
+        db = client["medical_conditions_db"]
+        collection = db["medical_conditions_data"]
+        data = list(collection.find({"condition_type": condition_type.lower()}, MEDICAL_CONDITION_FIELDS))
     else:
-        # Otherwise, return all conditions
-        data = collection.find({})
+        # Otherwise, return all conditions (served from the storage read cache)
+        data = get_medical_conditions_data(projection=MEDICAL_CONDITION_FIELDS)
     
-    return json.dumps(list(data), default=str)
+    return json.dumps(data, default=str)
 
 tools = [get_nutritional_info, get_user_profile, get_medical_conditions]
 tool_node = ToolNode(tools)
@@ -20,6 +20,10 @@ const ChatInterface = () => {
     }
   ]);
   const [isLoading, setIsLoading] = useState(false);
+  // Identifies this conversation to the backend, which keeps its history apart from other chats
+  const [conversationId] = useState(
+    () => `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+  );
 
   const handleSendMessage = async (content) => {
     if (!content.trim()) return;
@@ -41,6 +45,7 @@ const ChatInterface = () => {
       const response = await axios.post(API_ENDPOINT, {
         message: content,
         userId: 'user123', // This would be the actual user ID in a real app
+        conversationId,
       }, {
         headers: {
           'Content-Type': 'application/json'